@@ -0,0 +1,50 @@
+"""
+Generates synthetic image libraries for the benchmarks: small, distinct PNG files with json sidecars,
+spread over subfolders and tagged with keywords from a fixed pool.
+"""
+import json
+import os
+import random
+import struct
+import zlib
+
+KEYWORDS = ["portraits", "landscape", "people", "background", "profile image", "blogging", "travel", "food", "city", "nature"]
+FILES_PER_FOLDER = 500
+
+
+def png(width: int, height: int, seed: int) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    # One grey scanline repeated, with the seed in the first pixels so every file has distinct contents.
+    row = b"\x00" + seed.to_bytes(4, "big") + bytes(width * 3 - 4)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(row * height)) + chunk(b"IEND", b"")
+
+
+def generate(folder: str, count: int, seed: int = 0) -> list[str]:
+    """
+    Creates count images with sidecars in folder, unless it already holds a library of that size. Returns the filenames.
+    """
+    rng = random.Random(seed)
+    filenames = []
+    for i in range(count):
+        subfolder = os.path.join(folder, f"folder_{i // FILES_PER_FOLDER:04d}")
+        filename = os.path.join(subfolder, f"image_{i:06d}.png")
+        filenames.append(filename)
+        if os.path.exists(filename + ".json"):
+            continue
+
+        os.makedirs(subfolder, exist_ok=True)
+        width, height = rng.choice([(16, 9), (9, 16), (12, 12)])
+        with open(filename, "wb") as f:
+            f.write(png(width * 4, height * 4, seed * count + i))
+        metadata = {
+            "title": f"image-{i}",
+            "url": f"https://example.com/photos/{seed}/{i}",
+            "keywords": rng.sample(KEYWORDS, k=rng.randint(1, 3)),
+            "attribution": f"Photo by user {i % 97} on Example",
+        }
+        with open(filename + ".json", "w") as f:
+            f.write(json.dumps(metadata))
+    return filenames
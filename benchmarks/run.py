@@ -0,0 +1,205 @@
+"""
+Benchmarks the hot paths of demoprovider against synthetic libraries, writing the results as json.
+
+Run from the folder containing manage.py, like:
+
+    $ python ../benchmarks/run.py --settings mysite.settings.dev --sizes 1000,10000 --output results.json
+
+Pass --compare with an earlier results file to exit with an error if any benchmark got slower than the tolerance allows.
+Generated libraries are kept in --data, so later runs only have to generate them once.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from library import KEYWORDS, generate
+
+
+def measure(name: str, size: int, fn: Callable[[], object], repeat: int, setup: Callable[[], object] | None = None, operations: int = 1) -> dict:
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    result = {
+        "name": name,
+        "size": size,
+        "operations": operations,
+        "repeat": repeat,
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "per_operation": statistics.median(times) / operations,
+    }
+    print(f"{name:<32} {size:>7} {result['median'] * 1000:>10.2f} ms {result['per_operation'] * 1e6:>10.2f} us/op", file=sys.stderr)
+    return result
+
+
+def library_benchmarks(folder: str, size: int, repeat: int) -> list[dict]:
+    from demoprovider.catalog import CATALOG_FILENAME
+    from demoprovider.manifest import fold_sidecars
+    from demoprovider.mapped import mapped_index_path
+    from demoprovider.services import ImageService
+
+    def remove_catalog():
+        for library in (folder, folder + "_manifest"):
+            if os.path.exists(catalog := os.path.join(library, CATALOG_FILENAME)):
+                os.remove(catalog)
+
+    def local_folder_files():
+        return list(ImageService(folder).local_folder_files(folder, skip_existing=False))
+
+    results = [
+        measure("scan.cold", size, lambda: ImageService(folder, scan_on_creation=True), repeat, setup=remove_catalog),
+        measure("scan.warm", size, lambda: ImageService(folder, scan_on_creation=True), repeat),
+        measure("scan.no_catalog", size, lambda: ImageService(folder, scan_on_creation=True, use_catalog=False), repeat),
+        # Reading the sidecars costs about the same with or without a catalog, the gain is in not hashing and probing
+        # the images again, which is what importing a folder has to do.
+        measure("local_folder_files.cold", size, local_folder_files, repeat, setup=remove_catalog),
+        measure("local_folder_files.warm", size, local_folder_files, repeat),
+        measure("scan.shared_index", size, lambda: ImageService(folder, shared_index=True).scan(), repeat),
+        measure("load.shared_index", size, lambda: ImageService(folder, scan_on_creation=True, shared_index=True), repeat),
+    ]
+    os.remove(mapped_index_path(folder))
+
+    # The same library with its sidecars folded into manifests.
+    manifest_folder = folder + "_manifest"
+    if not os.path.exists(manifest_folder):
+        shutil.copytree(folder, manifest_folder, ignore=shutil.ignore_patterns(CATALOG_FILENAME))
+        fold_sidecars(manifest_folder, remove=True)
+    results += [
+        measure("scan.manifest.cold", size, lambda: ImageService(manifest_folder, scan_on_creation=True), repeat, setup=remove_catalog),
+        measure("scan.manifest.no_catalog", size, lambda: ImageService(manifest_folder, scan_on_creation=True, use_catalog=False), repeat),
+    ]
+
+    service = ImageService(folder, scan_on_creation=True, seed=0)
+    rng = random.Random(0)
+    queries = [rng.sample(KEYWORDS, k=2) for _ in range(1000)]
+    filenames = [os.path.join(folder, f"folder_{i // 500:04d}", f"image_{i:06d}.png") for i in rng.choices(range(size * 2), k=10000)]
+
+    results += [
+        measure("get_images_by_keywords", size, lambda: [service.get_images_by_keywords(*q, limit=10) for q in queries], repeat, operations=len(queries)),
+        measure("get_random_images", size, lambda: [service.get_random_images(*q, count=10) for q in queries], repeat, operations=len(queries)),
+        measure("get_random_images.unique", size, lambda: [service.get_random_images(*q, count=10, unique=True) for q in queries], repeat, operations=len(queries)),
+        measure("file_exists", size, lambda: [service.file_exists(f) for f in filenames], repeat, operations=len(filenames)),
+    ]
+    return results
+
+
+def database_benchmarks(folder: str, size: int, repeat: int) -> list[dict]:
+    from wagtail.images import get_image_model
+    from wagtail.models import Collection
+
+    from demoprovider.services import ImageService
+
+    Image = get_image_model()
+    filenames = generate(folder, size, seed=1)
+
+    def clear():
+        Image.objects.all().delete()
+        Collection.objects.filter(depth__gt=1).delete()
+
+    return [
+        measure("create_wagtail_image", size, lambda: [ImageService.create_wagtail_image(f) for f in filenames], repeat, setup=clear, operations=size),
+        measure("add_local_folder", size, lambda: ImageService().add_local_folder(folder), repeat, setup=clear, operations=size),
+        measure("add_local_folder.bulk", size, lambda: ImageService().add_local_folder(folder, workers=8), repeat, setup=clear, operations=size),
+        measure("add_local_folder.repeat", size, lambda: ImageService().add_local_folder(folder), repeat, operations=size),
+    ]
+
+
+def download_benchmarks(folder: str, size: int, repeat: int) -> list[dict]:
+    from demoprovider.image_providers.downloader import Downloader
+    from demoprovider.image_providers.fake import FakeImageServer
+
+    server = FakeImageServer(seed=0)
+    server.start()
+    # Unique photo ids, so downloads aren't discarded as duplicates.
+    jobs = [(f"{server.url}/photos/benchmark-{i}.png", os.path.join(folder, f"photo_{i:06d}.png"), None) for i in range(size)]
+
+    def clear():
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder)
+
+    try:
+        return [
+            measure(f"download.workers_{workers}", size, lambda: Downloader(workers=workers, verbose=False).download_all(jobs), repeat, setup=clear, operations=size)
+            for workers in (1, 8)
+        ]
+    finally:
+        server.stop()
+
+
+def setup_django(settings: str, media_root: str) -> None:
+    sys.path.insert(0, os.getcwd())
+    os.environ["DJANGO_SETTINGS_MODULE"] = settings
+
+    import django
+    from django.conf import settings as django_settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    django_settings.MEDIA_ROOT = media_root
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def compare(results: list[dict], baseline_filename: str, tolerance: float) -> list[str]:
+    with open(baseline_filename) as f:
+        baseline = {(r["name"], r["size"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        if (previous := baseline.get((result["name"], result["size"]))) and result["median"] > previous["median"] * (1 + tolerance):
+            regressions.append(f"{result['name']} ({result['size']}): {previous['median'] * 1000:.2f} ms -> {result['median'] * 1000:.2f} ms")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--settings", default=os.environ.get("DJANGO_SETTINGS_MODULE", "mysite.settings.dev"))
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated library sizes.")
+    parser.add_argument("--import-limit", type=int, default=1000, help="Max number of files imported into the database per size.")
+    parser.add_argument("--download-limit", type=int, default=500, help="Max number of files downloaded per size.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data", default=os.path.join(tempfile.gettempdir(), "demoprovider-benchmarks"))
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="Earlier results to compare with.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown compared to --compare, 0.2 being 20%%.")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="demoprovider-")
+    setup_django(args.settings, os.path.join(work, "media"))
+
+    results = []
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            folder = os.path.join(args.data, f"library_{size}")
+            generate(folder, size)
+            results += library_benchmarks(folder, size, args.repeat)
+            results += database_benchmarks(os.path.join(args.data, f"import_{min(size, args.import_limit)}"), min(size, args.import_limit), args.repeat)
+            results += download_benchmarks(os.path.join(work, "downloads"), min(size, args.download_limit), args.repeat)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump({"python": platform.python_version(), "platform": platform.platform(), "created": time.time(), "results": results}, f, indent=2)
+
+    if args.compare and (regressions := compare(results, args.compare, args.tolerance)):
+        print("Regressions:\n" + "\n".join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
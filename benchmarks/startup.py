@@ -0,0 +1,42 @@
+"""
+Measures how much importing demoprovider adds to the startup of a Django process, failing if it's over budget.
+
+Run from the folder containing manage.py, like:
+
+    $ python ../benchmarks/startup.py --settings mysite.settings.dev --budget 50
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SETUP = "import django; django.setup()"
+MODULES = ["demoprovider.services", "demoprovider.image_providers", "demoprovider.registry"]
+
+
+def timed(code: str, settings: str) -> float:
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings}
+    script = f"import time; start = time.perf_counter(); {code}; print(time.perf_counter() - start)"
+    output = subprocess.run([sys.executable, "-c", script], env=env, check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--settings", default=os.environ.get("DJANGO_SETTINGS_MODULE", "mysite.settings.dev"))
+    parser.add_argument("--budget", type=float, default=50, help="Allowed overhead in milliseconds.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    imports = "; ".join(f"import {module}" for module in MODULES)
+    baseline = statistics.median(timed(SETUP, args.settings) for _ in range(args.runs))
+    with_app = statistics.median(timed(f"{SETUP}; {imports}", args.settings) for _ in range(args.runs))
+    overhead = (with_app - baseline) * 1000
+
+    print(f"django.setup(): {baseline * 1000:.1f} ms, with demoprovider: {with_app * 1000:.1f} ms, overhead: {overhead:.1f} ms (budget {args.budget:.0f} ms)")
+    return 0 if overhead <= args.budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Iterable, Iterator
+
+from .config import get_bool_setting, get_state_folder
+from .manifest import MANIFEST_FILENAME, Manifest, Manifests
+from .metrics import metrics
+from .probe import image_size
+from .utils import chunked
+
+CATALOG_FILENAME = ".catalog.sqlite3"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    filename TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    metadata_mtime REAL NOT NULL,
+    keywords TEXT NOT NULL,
+    metadata TEXT NOT NULL
+)
+"""
+
+
+# The wagtail image created from each file when a folder is imported, with the hash of the file at the time.
+IMPORTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS imports (
+    filename TEXT PRIMARY KEY,
+    image_id INTEGER NOT NULL,
+    sha1 TEXT NOT NULL
+)
+"""
+
+
+def read_metadata(filename: str, manifests: Manifests | None = None) -> dict:
+    """
+    Reads the metadata of an image from the manifest of its folder or, if it isn't in there, from the json sidecar
+    stored next to it, returning an empty dict if both are missing or broken. Pass manifests when reading many images.
+    """
+    manifest, name = (manifests if manifests is not None else Manifests()).of(filename)
+    if (metadata := manifest.get(name)) is not None:
+        return dict(metadata)
+    try:
+        with open(filename + ".json") as f:
+            return json.loads(f.read())
+    except (OSError, json.decoder.JSONDecodeError):
+        return {}
+
+
+def write_metadata(filename: str, metadata: dict, manifest: bool | None = None) -> None:
+    """
+    Saves the metadata of an image, appending it to the manifest of its folder, or writing a json sidecar next to it.
+    Unless told otherwise, manifests are used if the DEMO-PROVIDER-MANIFEST setting is on, or the folder already has one.
+    """
+    folder, name = os.path.split(filename)
+    if manifest is None:
+        manifest = get_bool_setting("DEMO-PROVIDER-MANIFEST") or os.path.exists(os.path.join(folder, MANIFEST_FILENAME))
+    if manifest:
+        Manifest.for_folder(folder).append(name, metadata)
+        return
+    with open(filename + ".json", "w") as f:
+        f.write(json.dumps(metadata))
+
+
+def file_signature(filename: str, manifests: Manifests | None = None) -> tuple[float, int, float]:
+    """
+    Returns the mtime and size of an image and the revision of its metadata, the mtime of its sidecar or the revision
+    of its manifest entry, used to detect changes between scans.
+    """
+    stat = os.stat(filename)
+    manifest, name = (manifests if manifests is not None else Manifests()).of(filename)
+    if (revision := manifest.revision(name)) is not None:
+        # Negative, so a revision can't be mistaken for a sidecar mtime when an image moves from one to the other.
+        return stat.st_mtime, stat.st_size, -1.0 - revision
+    try:
+        metadata_mtime = os.stat(filename + ".json").st_mtime
+    except OSError:
+        metadata_mtime = 0.0
+    return stat.st_mtime, stat.st_size, metadata_mtime
+
+
+def file_hash(filename: str) -> str:
+    """
+    Returns the SHA1 digest of a file, the same digest wagtail stores in Image.file_hash, reading it in chunks.
+    """
+    digest = hashlib.sha1()
+    with open(filename, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+            metrics.count("bytes.read", len(chunk))
+    return digest.hexdigest()
+
+
+class ImageCatalog:
+    """
+    A persistent index of the images in a folder, stored as a sqlite database inside it, so
+    a scan only has to re-read the metadata of files that changed since the previous scan.
+    A catalog is meant for a single pass over the folder, and reads each manifest in it once.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.manifests = Manifests()
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(SCHEMA)
+        self.connection.execute(IMPORTS_SCHEMA)
+
+    @classmethod
+    def for_folder(cls, folder: str) -> "ImageCatalog":
+        return cls(os.path.join(get_state_folder(folder), CATALOG_FILENAME))
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "ImageCatalog":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def entries(self, filenames: Iterable[str] | None = None) -> dict[str, tuple[float, int, float, str]]:
+        """
+        Returns the entries of all files, or of the given files, by filename.
+        """
+        query = "SELECT filename, mtime, size, metadata_mtime, metadata FROM images"
+        if filenames is None:
+            rows = list(self.connection.execute(query))
+        else:
+            rows = []
+            for batch in chunked(filenames, 500):
+                rows += self.connection.execute(f"{query} WHERE filename IN ({', '.join('?' * len(batch))})", batch)
+        return {filename: (mtime, size, metadata_mtime, metadata) for filename, mtime, size, metadata_mtime, metadata in rows}
+
+    def lookup(self, filename: str) -> dict | None:
+        """
+        Returns the cached metadata of a file, or None if it's unknown or changed since it was cataloged.
+        """
+        row = self.connection.execute("SELECT mtime, size, metadata_mtime, metadata FROM images WHERE filename = ?", (filename,)).fetchone()
+        try:
+            if row is None or tuple(row[:3]) != file_signature(filename, self.manifests):
+                return None
+        except OSError:
+            return None
+        metrics.count("catalog.hits")
+        return json.loads(row[3])
+
+    def cached(self, filenames: Iterable[str]) -> dict[str, dict]:
+        """
+        Returns the metadata recorded for the files in the last sync, whether or not they changed since.
+        """
+        return {filename: json.loads(entry[3]) for filename, entry in self.entries(filenames).items()}
+
+    def forget(self, filenames: Iterable[str]) -> None:
+        with self.connection:
+            self.connection.executemany("DELETE FROM images WHERE filename = ?", [(filename,) for filename in filenames])
+
+    def prune(self, filenames: Iterable[str]) -> None:
+        """
+        Drops the files known to the catalog but not given, for callers syncing only part of a folder.
+        """
+        listed = set(filenames)
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM images WHERE filename = ?", [(filename,) for (filename,) in self.connection.execute("SELECT filename FROM images") if filename not in listed]
+            )
+
+    def files_with_hash(self, sha1: str) -> list[str]:
+        """
+        Returns the files recorded in the last sync with the given contents.
+        """
+        return [filename for (filename,) in self.connection.execute("SELECT filename FROM images WHERE json_extract(metadata, '$.sha1') = ?", (sha1,))]
+
+    def imported(self, filenames: Iterable[str] | None = None) -> dict[str, tuple[int, str]]:
+        """
+        Returns the id of the wagtail image imported from each file, of all files or of the given files, that has one,
+        together with the hash of the file when it was imported.
+        """
+        query = "SELECT filename, image_id, sha1 FROM imports"
+        if filenames is None:
+            rows = list(self.connection.execute(query))
+        else:
+            rows = []
+            for batch in chunked(filenames, 500):
+                rows += self.connection.execute(f"{query} WHERE filename IN ({', '.join('?' * len(batch))})", batch)
+        return {filename: (image_id, sha1) for filename, image_id, sha1 in rows}
+
+    def record_imports(self, imports: Iterable[tuple[str, int, str]]) -> None:
+        """
+        Records the (filename, image id, hash) of files imported as wagtail images.
+        """
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO imports VALUES (?, ?, ?)", imports)
+
+    def forget_imports(self, filenames: Iterable[str]) -> None:
+        with self.connection:
+            self.connection.executemany("DELETE FROM imports WHERE filename = ?", [(filename,) for filename in filenames])
+
+    def sync(self, filenames: Iterable[str], prune: bool = True) -> Iterator[tuple[str, dict]]:
+        """
+        Yields (filename, metadata) for every file given, only reading the metadata of new or changed files,
+        and only hashing the contents of files that are new or whose contents changed. With prune, files known
+        to the catalog but not given are dropped from it, otherwise only the files given are looked at.
+        """
+        filenames = filenames if prune else list(filenames)
+        known = self.entries(None if prune else filenames)
+        changed = []
+        for filename in filenames:
+            try:
+                signature = file_signature(filename, self.manifests)
+            except OSError:
+                continue
+
+            entry = known.pop(filename, None)
+            if entry and entry[:3] == signature:
+                metadata = json.loads(entry[3])
+                # Entries from catalogs written before hashes were recorded are treated as changed.
+                if "sha1" in metadata:
+                    metrics.count("catalog.hits")
+                    yield filename, metadata
+                    continue
+
+            metrics.count("catalog.misses")
+            metadata = read_metadata(filename, self.manifests)
+            # If only the metadata changed, the size and hash of the image are still good.
+            cached = entry and entry[:2] == signature[:2] and json.loads(entry[3]) or {}
+            for key in ("width", "height", "sha1"):
+                if cached.get(key):
+                    metadata[key] = cached[key]
+            if not (metadata.get("width") and metadata.get("height")):
+                try:
+                    metadata["width"], metadata["height"] = image_size(filename)
+                except Exception:
+                    pass
+            if not cached.get("sha1"):
+                try:
+                    metadata["sha1"] = file_hash(filename)
+                except OSError:
+                    pass
+            changed.append((filename, *signature, json.dumps(metadata.get("keywords", [])), json.dumps(metadata)))
+            yield filename, metadata
+
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?)", changed)
+            if prune:
+                self.connection.executemany("DELETE FROM images WHERE filename = ?", [(filename,) for filename in known])
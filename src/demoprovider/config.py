@@ -1,3 +1,4 @@
+import hashlib
 import os
 from typing import Any
 
@@ -13,3 +14,25 @@ SUPPORTED_IMAGE_FORMATS = [".jpg", ".png", ".avif", ".webp"]
 
 def get_setting(key: str, default: Any | None = None) -> Any:
     return hasattr(settings, key) and getattr(settings, key) or os.environ.get(key, default)
+
+
+def get_bool_setting(key: str, default: bool = False) -> bool:
+    value = get_setting(key, default)
+    return value if isinstance(value, bool) else str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_target_folder() -> str:
+    return get_setting("DEMO-PROVIDER-TARGET-FOLDER", os.path.join(os.getcwd(), "demo-images"))
+
+
+def get_state_folder(folder: str) -> str:
+    """
+    Returns the folder to keep the catalog and journal of a folder in, the folder itself if it's writable, otherwise a
+    folder named after its path in DEMO-PROVIDER-CACHE-FOLDER, or demoprovider in the user's cache folder.
+    """
+    if os.access(folder, os.W_OK):
+        return folder
+    cache_folder = get_setting("DEMO-PROVIDER-CACHE-FOLDER") or os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "demoprovider")
+    path = os.path.join(cache_folder, hashlib.sha1(os.path.abspath(folder).encode()).hexdigest()[:16])
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -1,15 +1,123 @@
-from typing import Protocol
+import importlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Protocol, Sequence
 
-from .unsplash import UnsplashImageProvider
+from demoprovider.config import get_setting, get_target_folder
+from demoprovider.metrics import metrics
+
+if TYPE_CHECKING:
+    from demoprovider.services import ImageService
 
 
 class ImageProvider(Protocol):
-    def query(self, query, image_count):
+    """
+    Adds count images matching a keyword to the library. rate_limit is the number of queries per second
+    the provider may be sent, None for no limit.
+    """
+
+    name: str
+    rate_limit: float | None
+
+    def query(self, query: str, count: int = 1) -> None:
         ...
 
 
-def init_providers(image_count=10, *keywords):
-    for provider in [UnsplashImageProvider.factory()]:
-        if provider:
-            for keyword in keywords:
-                provider.query(query=keyword, count=image_count)
+# Factories by provider name, called with resume and the shared ImageService and returning None if the provider
+# isn't configured. Given as "module:attribute" and imported on use, so loading this package doesn't pull in
+# requests and the provider client libraries.
+PROVIDERS: dict[str, str | Callable[..., ImageProvider | None]] = {
+    "unsplash": "demoprovider.image_providers.unsplash:UnsplashImageProvider.factory",
+    "local": "demoprovider.image_providers.local:LocalFolderProvider.factory",
+    "synthetic": "demoprovider.image_providers.synthetic:SyntheticImageProvider.factory",
+    "fake": "demoprovider.image_providers.fake:FakeHTTPImageProvider.factory",
+}
+
+
+def register_provider(name: str, factory: str | Callable[..., ImageProvider | None]) -> None:
+    PROVIDERS[name] = factory
+
+
+def get_provider_factory(name: str) -> Callable[..., ImageProvider | None]:
+    if (factory := PROVIDERS.get(name)) is None:
+        raise ValueError(f"Unknown image provider {name!r}, expected one of {', '.join(PROVIDERS)}")
+    if isinstance(factory, str):
+        module, _, attribute = factory.partition(":")
+        factory = importlib.import_module(module)
+        for part in attribute.split("."):
+            factory = getattr(factory, part)
+    return factory  # type: ignore NOQA
+
+
+def default_providers() -> list[str]:
+    """
+    Returns the providers set in IMAGE_PROVIDERS, a comma-separated list like "unsplash,synthetic".
+    """
+    return [name.strip() for name in get_setting("IMAGE_PROVIDERS", "unsplash").split(",") if name.strip()]
+
+
+class RateLimiter:
+    """
+    Spaces calls evenly, at most rate per second, across threads. Does nothing without a rate.
+    """
+
+    def __init__(self, rate: float | str | None = None):
+        rate = float(rate or 0)
+        self.interval = rate and 1 / rate or 0
+        self.next = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start, self.next = max(now, self.next), max(now, self.next) + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def init_providers(
+    image_count=10,
+    *keywords,
+    resume: bool = False,
+    providers: Sequence[str] | None = None,
+    workers: int | None = None,
+    service: "ImageService | None" = None,
+) -> dict[tuple[str, str], Exception]:
+    """
+    Queries every provider for image_count images for every keyword. The keyword and provider jobs run concurrently,
+    at most workers, or IMAGE_PROVIDER_CONCURRENCY (default 4), at a time, and each provider is sent at most its
+    rate_limit queries per second, which can be set with IMAGE_PROVIDER_<NAME>_RATE_LIMIT.
+    Returns the exceptions raised by the jobs that failed, by provider name and keyword.
+    """
+    from demoprovider.services import ImageService
+
+    service = service or ImageService(folder=get_target_folder(), scan_on_creation=True)
+    instances = []
+    for name in providers or default_providers():
+        if provider := get_provider_factory(name)(resume=resume, service=service):
+            instances.append(provider)
+    limiters = {provider.name: RateLimiter(get_setting(f"IMAGE_PROVIDER_{provider.name.upper()}_RATE_LIMIT", provider.rate_limit)) for provider in instances}
+
+    def run(provider: ImageProvider, keyword: str) -> None:
+        limiters[provider.name].wait()
+        with metrics.timer(f"provider.{provider.name}"):
+            provider.query(query=keyword, count=int(image_count))
+
+    errors: dict[tuple[str, str], Exception] = {}
+    jobs = [(provider, keyword) for keyword in keywords for provider in instances]
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers or int(get_setting("IMAGE_PROVIDER_CONCURRENCY", 4)))) as executor:
+            futures = {executor.submit(run, provider, keyword): (provider.name, keyword) for provider, keyword in jobs}
+            for future, job in futures.items():
+                if (ex := future.exception()) is not None:
+                    errors[job] = ex  # type: ignore NOQA
+                    logging.error(f"Getting {job[1]} images from {job[0]} failed: {ex}")
+    finally:
+        for provider in instances:
+            if close := getattr(provider, "close", None):
+                close()
+    return errors
@@ -0,0 +1,76 @@
+import logging
+import os
+import tempfile
+import threading
+
+from demoprovider.catalog import write_metadata
+from demoprovider.journal import remove_partial_files
+from demoprovider.metrics import metrics
+from demoprovider.services import ImageService
+from demoprovider.utils import filename_from_slug
+
+
+class FolderImageProvider:
+    """
+    Base for providers saving images, with their metadata, to a subfolder of the target folder named after the
+    provider, and adding them to an ImageService for that folder. Providers run side by side share the service,
+    so an image saved by one is known to all of them.
+    """
+
+    name = ""
+    # Queries per second the provider may be sent, None for no limit.
+    rate_limit: float | None = None
+    # Shared by all providers, as they add to the same service from several threads.
+    lock = threading.Lock()
+
+    def __init__(self, target_folder: str, verbose: bool = True, service: ImageService | None = None) -> None:
+        self.target_folder = target_folder
+        self.verbose = verbose
+        os.makedirs(target_folder, exist_ok=True)
+        if count := remove_partial_files(os.path.join(target_folder, self.name)):
+            self.log(f"Removed {count} partial files left by an interrupted run")
+        self.service = service or ImageService(folder=target_folder, scan_on_creation=True)
+
+    def log(self, msg: str) -> None:
+        if self.verbose:
+            logging.info(msg)
+
+    def is_duplicate(self, digest: str) -> bool:
+        return self.service.index.find(content_hash=digest) is not None
+
+    def target_filename(self, metadata: dict[str, str], folder: str | None, extension: str = ".png") -> str:
+        base_folder = folder and os.path.join(self.target_folder, self.name, folder) or os.path.join(self.target_folder, self.name)
+        os.makedirs(base_folder, exist_ok=True)
+        return os.path.join(base_folder, filename_from_slug(metadata.get("title"), extension))
+
+    def write_file(self, filename: str, data: bytes) -> None:
+        """
+        Writes data to a temporary file next to filename and renames it into place, so no partial files are left behind.
+        """
+        fd, temp_filename = tempfile.mkstemp(dir=os.path.dirname(filename) or ".", prefix=".", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_filename, filename)
+        except BaseException:
+            os.remove(temp_filename)
+            raise
+        metrics.count("bytes.written", len(data))
+
+    def save_metadata(self, metadata: dict[str, str], filename: str, digest: str | None = None) -> bool:
+        """
+        Writes the metadata of a saved image and adds it to the service, returning True if successful.
+        """
+        metadata = {"provider": self.name, **metadata}
+        if digest:
+            metadata = {**metadata, "sha1": digest}
+        try:
+            with metrics.timer("save_metadata"):
+                write_metadata(filename, metadata)
+                self.log(f"Saved {filename}")
+                with self.lock:
+                    self.service.add_file(filename, metadata)
+            return True
+        except Exception as ex:
+            self.log(f"Error saving {filename}: {ex}")
+            return False
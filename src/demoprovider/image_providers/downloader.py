@@ -0,0 +1,192 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from demoprovider.config import get_setting
+from demoprovider.metrics import metrics
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+@dataclass
+class DownloadStats:
+    files: int = 0
+    failed: int = 0
+    duplicates: int = 0
+    bytes: int = 0
+    started: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, size: int | None, duplicate: bool = False) -> None:
+        with self.lock:
+            if size is None:
+                self.failed += 1
+            elif duplicate:
+                self.duplicates += 1
+            else:
+                self.files += 1
+                self.bytes += size
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def summary(self) -> str:
+        elapsed = max(self.elapsed, 0.001)
+        return (
+            f"Downloaded {self.files} files ({self.failed} failed, {self.duplicates} duplicates), {self.bytes / 1024 / 1024:.1f} MB "
+            f"in {elapsed:.1f}s, {self.files / elapsed:.1f} files/s, {self.bytes / 1024 / 1024 / elapsed:.1f} MB/s"
+        )
+
+
+class DownloadPool:
+    """
+    A pooled session and a pool of as many threads as it has connections. Downloaders sharing a pool never have more
+    downloads in flight than connections, however many of them run at the same time.
+    """
+
+    def __init__(self, workers: int = 8):
+        self.workers = max(1, workers)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="download")
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+
+_shared_pool: DownloadPool | None = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_download_pool() -> DownloadPool:
+    """
+    Returns the download pool shared by the whole process, with IMAGE_PROVIDER_DOWNLOAD_WORKERS (default 8) connections.
+    """
+    global _shared_pool
+    if _shared_pool is None:
+        with _shared_pool_lock:
+            if _shared_pool is None:
+                _shared_pool = DownloadPool(int(get_setting("IMAGE_PROVIDER_DOWNLOAD_WORKERS", 8)))
+    return _shared_pool
+
+
+class Downloader:
+    """
+    Downloads files concurrently over a pooled session. Each file is streamed to a temporary
+    file next to its target and renamed into place when complete, so no partial files are left behind.
+    Failed requests are retried with exponential backoff.
+
+    Downloaders given the same pool, like the providers queried side by side, share its session and threads,
+    otherwise each gets a pool of workers connections of its own.
+
+    The SHA1 digest of each file is computed while it's streamed. If is_duplicate returns True for it,
+    the file is discarded instead of being moved into place.
+    """
+
+    def __init__(
+        self,
+        workers: int = 8,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 30,
+        chunk_size: int = 64 * 1024,
+        verbose: bool = True,
+        is_duplicate: Callable[[str], bool] | None = None,
+        pool: DownloadPool | None = None,
+    ):
+        self.pool = pool or DownloadPool(workers)
+        self.workers = self.pool.workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.verbose = verbose
+        self.is_duplicate = is_duplicate
+        self.session = self.pool.session
+        self.stats = DownloadStats()
+
+    def log(self, msg: str) -> None:
+        if self.verbose:
+            logging.info(msg)
+
+    def reset_stats(self) -> DownloadStats:
+        stats, self.stats = self.stats, DownloadStats()
+        return stats
+
+    def fetch(self, url: str, filename: str) -> tuple[int, str | None]:
+        """
+        Streams url to filename, returning the number of bytes read and the digest of the file,
+        or None as digest if it was discarded as a duplicate.
+        """
+        folder = os.path.dirname(filename) or "."
+        with self.session.get(url, stream=True, allow_redirects=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            fd, temp_filename = tempfile.mkstemp(dir=folder, prefix=".", suffix=".part")
+            try:
+                size, digest = 0, hashlib.sha1()
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                metrics.count("bytes.downloaded", size)
+                if self.is_duplicate and self.is_duplicate(digest.hexdigest()):
+                    os.remove(temp_filename)
+                    return size, None
+                os.replace(temp_filename, filename)
+                metrics.count("bytes.written", size)
+            except BaseException:
+                os.remove(temp_filename)
+                raise
+        return size, digest.hexdigest()
+
+    def download(self, url: str, filename: str) -> str | None:
+        """
+        Downloads url to filename, returning the digest of the file, or None if it failed or was a duplicate.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                with metrics.timer("download"):
+                    size, digest = self.fetch(url, filename)
+                self.stats.add(size, duplicate=digest is None)
+                self.log(digest and f"Downloaded {url}" or f"Skipped {url}, duplicate of an existing image")
+                return digest
+            except requests.HTTPError as ex:
+                if ex.response is None or ex.response.status_code not in RETRY_STATUS_CODES or attempt == self.retries:
+                    self.log(f"Error downloading {url}: {ex}")
+                    break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as ex:
+                if attempt == self.retries:
+                    self.log(f"Error downloading {url}: {ex}")
+                    break
+            time.sleep(self.backoff * 2**attempt)
+        self.stats.add(None)
+        return None
+
+    def download_all(self, jobs: Iterable[tuple[str, str, Callable[[str, str], None] | None]]) -> DownloadStats:
+        """
+        Downloads (url, filename, on_complete) jobs on the threads of the pool. on_complete is called
+        with the filename and digest once a file has been saved.
+        """
+
+        def run(job):
+            url, filename, on_complete = job
+            if (digest := self.download(url, filename)) and on_complete:
+                on_complete(filename, digest)
+
+        for _ in self.pool.executor.map(run, jobs):
+            pass
+        return self.stats
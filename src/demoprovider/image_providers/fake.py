@@ -0,0 +1,151 @@
+import json
+import random
+import threading
+import time
+import zlib
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+from demoprovider.config import get_setting, get_target_folder
+from demoprovider.services import ImageService
+
+from .base import FolderImageProvider
+from .downloader import Downloader, get_download_pool
+from .synthetic import parse_size, render_png
+
+PHOTOS_PER_KEYWORD = 10000
+
+
+class FakeImageServer:
+    """
+    A stock photo service on localhost for tests, serving a search api and generated images. Each search for a keyword
+    returns count of its PHOTOS_PER_KEYWORD photos picked at random, like a random query would. Responses can be delayed
+    by latency seconds, and a share of the image requests, error_rate, answered with 503, to exercise timeouts and retries.
+
+        GET /search?query=<keyword>&count=<count>   {"results": [{"id", "title", "url", "download"}, ...]}
+        GET /photos/<id>.png                         the image
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, size: tuple[int, int] = (320, 240), seed: int | None = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.size = size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.httpd: ThreadingHTTPServer | None = None
+
+    @property
+    def url(self) -> str:
+        if self.httpd is None:
+            self.start()
+        host, port = self.httpd.server_address[:2]  # type: ignore NOQA
+        return f"http://{host}:{port}"
+
+    def start(self) -> None:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                server.handle(self)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def search(self, query: str, count: int) -> list[dict]:
+        with self.lock:
+            numbers = self.random.sample(range(1, PHOTOS_PER_KEYWORD + 1), min(count, PHOTOS_PER_KEYWORD))
+        return [
+            {
+                "id": f"{query}-{number}",
+                "title": f"{query}-{number}",
+                "url": f"https://fake.example.com/photos/{query}-{number}",
+                "download": f"{self.url}/photos/{quote(query)}-{number}.png",
+            }
+            for number in numbers
+        ]
+
+    def handle(self, request: BaseHTTPRequestHandler) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(request.path)
+        if url.path == "/search":
+            params = parse_qs(url.query)
+            body, content_type = json.dumps({"results": self.search(params.get("query", ["default"])[0], int(params.get("count", [1])[0]))}).encode(), "application/json"
+        elif url.path.startswith("/photos/") and url.path.endswith(".png"):
+            with self.lock:
+                failed = self.random.random() < self.error_rate
+            if failed:
+                request.send_error(503)
+                return
+            photo_id = unquote(url.path[len("/photos/") : -len(".png")])
+            body, content_type = render_png(*self.size, seed=zlib.crc32(photo_id.encode())), "image/png"
+        else:
+            request.send_error(404)
+            return
+
+        request.send_response(200)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+class FakeHTTPImageProvider(FolderImageProvider):
+    """
+    Gets images over HTTP from a FakeImageServer, started on localhost unless IMAGE_PROVIDER_FAKE_URL points to one,
+    so the download path, with its connection pool, retries, streaming and duplicate checks, can be tested
+    without a real service. IMAGE_PROVIDER_FAKE_LATENCY and IMAGE_PROVIDER_FAKE_ERROR_RATE slow down and break the server.
+    """
+
+    name = "fake"
+
+    @classmethod
+    def factory(cls, resume: bool = False, service: ImageService | None = None):
+        server = None
+        if not (base_url := get_setting("IMAGE_PROVIDER_FAKE_URL")):
+            server = FakeImageServer(
+                latency=float(get_setting("IMAGE_PROVIDER_FAKE_LATENCY", 0)),
+                error_rate=float(get_setting("IMAGE_PROVIDER_FAKE_ERROR_RATE", 0)),
+                size=parse_size(get_setting("IMAGE_PROVIDER_FAKE_SIZE", "320x240")),
+            )
+        return cls(target_folder=get_target_folder(), base_url=base_url, server=server, service=service)
+
+    def __init__(
+        self,
+        target_folder: str,
+        base_url: str | None = None,
+        server: FakeImageServer | None = None,
+        verbose: bool = True,
+        service: ImageService | None = None,
+    ) -> None:
+        super().__init__(target_folder, verbose=verbose, service=service)
+        self.server = server or (base_url is None and FakeImageServer() or None)
+        self.base_url = base_url or self.server.url  # type: ignore NOQA
+        self.downloader = Downloader(backoff=0.05, verbose=verbose, is_duplicate=self.is_duplicate, pool=get_download_pool())
+
+    def close(self) -> None:
+        if self.server is not None:
+            self.server.stop()
+
+    def query(self, query: str, count: int = 1) -> None:
+        response = self.downloader.session.get(f"{self.base_url}/search", params={"query": query, "count": count}, timeout=self.downloader.timeout)
+        response.raise_for_status()
+        jobs = []
+        for photo in response.json()["results"]:
+            metadata = {"title": photo["title"], "url": photo["url"], "keywords": [query], "attribution": "Photo by the fake image server"}
+            filename = self.target_filename(metadata, query)
+            if self.service.file_exists(filename, metadata["url"]):
+                continue
+            jobs.append((photo["download"], filename, partial(self.save_metadata, metadata)))
+        self.downloader.download_all(jobs)
@@ -0,0 +1,70 @@
+import logging
+import os
+import shutil
+import tempfile
+
+from demoprovider.catalog import file_hash
+from demoprovider.config import get_setting, get_target_folder
+from demoprovider.index import normalize_path
+from demoprovider.metrics import metrics
+from demoprovider.services import DemoImage, ImageService
+
+from .base import FolderImageProvider
+
+
+class LocalFolderProvider(FolderImageProvider):
+    """
+    Mirrors images from a local folder, like a shared drive holding the team's stock photos, set with
+    IMAGE_PROVIDER_LOCAL_SOURCE. Images match a keyword if tagged with it in their sidecar, or if it's part
+    of their path, and are copied with their metadata. Images already in the library, from any provider, are skipped.
+    """
+
+    name = "local"
+
+    @classmethod
+    def factory(cls, resume: bool = False, service: ImageService | None = None):
+        if not (source_folder := get_setting("IMAGE_PROVIDER_LOCAL_SOURCE")) or not os.path.isdir(source_folder):
+            logging.warning("IMAGE_PROVIDER_LOCAL_SOURCE not set or not a folder. Local image provider not available.")
+            return None
+        return cls(source_folder=source_folder, target_folder=get_target_folder(), service=service)
+
+    def __init__(self, source_folder: str, target_folder: str, verbose: bool = True, service: ImageService | None = None) -> None:
+        if os.path.commonpath([normalize_path(source_folder), normalize_path(target_folder)]) == normalize_path(source_folder):
+            raise ValueError(f"Can't mirror {source_folder} into {target_folder}, which is inside it")
+        super().__init__(target_folder, verbose=verbose, service=service)
+        self.source = ImageService(folder=source_folder, scan_on_creation=True)
+
+    def matches(self, query: str) -> list[DemoImage]:
+        images = self.source.index.resolve(sorted(self.source.index.all_ids()))
+        needle = query.lower()
+        return [image for image in images if query in image.keywords or needle in os.path.relpath(image.filename, self.source.folder).lower()]
+
+    def query(self, query: str, count: int = 1) -> None:
+        images = self.matches(query)
+        self.source.random.shuffle(images)
+        created = 0
+        for image in images:
+            if created >= count:
+                break
+
+            name, extension = os.path.splitext(os.path.basename(image.filename))
+            filename = self.target_filename({"title": name}, query, extension=extension.lower())
+            digest = image.content_hash or file_hash(image.filename)
+            if self.service.file_exists(filename, image.url, digest):
+                continue
+
+            keywords = [keyword for keyword in image.keywords if keyword != "default"]
+            metadata = {**image.metadata, "title": image.get("title") or name, "keywords": keywords + [query] * (query not in keywords)}
+            with metrics.timer("mirror"):
+                fd, temp_filename = tempfile.mkstemp(dir=os.path.dirname(filename), prefix=".", suffix=".part")
+                os.close(fd)
+                try:
+                    shutil.copyfile(image.filename, temp_filename)
+                    os.replace(temp_filename, filename)
+                except BaseException:
+                    os.remove(temp_filename)
+                    raise
+            metrics.count("bytes.written", os.path.getsize(filename))
+            if not self.save_metadata(metadata, filename, digest):
+                break
+            created += 1
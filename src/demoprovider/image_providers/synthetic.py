@@ -0,0 +1,90 @@
+import hashlib
+import random
+import struct
+import zlib
+
+from demoprovider.config import get_setting, get_target_folder
+from demoprovider.metrics import metrics
+from demoprovider.services import ImageService
+
+from .base import FolderImageProvider
+
+
+def render_png(width: int, height: int, seed: int) -> bytes:
+    """
+    Renders a PNG of diagonal bands blending between two colors picked by seed, using nothing but zlib.
+    A single gradient row is computed and every scanline is a rotation of it, so even large images are cheap.
+    """
+    rng = random.Random(seed)
+    start, end = [rng.randrange(256) for _ in range(3)], [rng.randrange(256) for _ in range(3)]
+    bands = rng.randint(1, 4)
+    row = bytearray()
+    for x in range(width):
+        t = abs((x * 2 * bands / width) % 2 - 1)
+        row += bytes(round(a + (b - a) * t) for a, b in zip(start, end))
+    row = bytes(row)
+    step = rng.choice((-1, 1)) * 3 * max(1, width // max(1, height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    compressor = zlib.compressobj(6)
+    data = b"".join(compressor.compress(b"\x00" + row[(y * step) % len(row) :] + row[: (y * step) % len(row)]) for y in range(height))
+    data += compressor.flush()
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", data) + chunk(b"IEND", b"")
+
+
+def parse_size(value: str) -> tuple[int, int]:
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height or width)
+
+
+class SyntheticImageProvider(FolderImageProvider):
+    """
+    Generates images instead of getting them from anywhere, so a demo site can be filled without network access or
+    an API key. Images are landscape, portrait or square variations of IMAGE_PROVIDER_SYNTHETIC_SIZE (default 1200x800),
+    and the same keyword always gives the same images, numbered on from the ones already in the folder.
+    """
+
+    name = "synthetic"
+
+    @classmethod
+    def factory(cls, resume: bool = False, service: ImageService | None = None):
+        return cls(target_folder=get_target_folder(), size=parse_size(get_setting("IMAGE_PROVIDER_SYNTHETIC_SIZE", "1200x800")), service=service)
+
+    def __init__(self, target_folder: str, size: tuple[int, int] = (1200, 800), verbose: bool = True, service: ImageService | None = None) -> None:
+        super().__init__(target_folder, verbose=verbose, service=service)
+        self.size = size
+
+    def image(self, query: str, number: int) -> tuple[dict, bytes]:
+        seed = zlib.crc32(f"{query}:{number}".encode())
+        long_side, short_side = max(self.size), min(self.size)
+        width, height = random.Random(seed).choice(((long_side, short_side), (short_side, long_side), (short_side, short_side)))
+        metadata = {
+            "title": f"{query}-{number}",
+            "keywords": [query],
+            "attribution": "Generated image",
+            "width": width,
+            "height": height,
+        }
+        return metadata, render_png(width, height, seed)
+
+    def query(self, query: str, count: int = 1) -> None:
+        number = created = 0
+        while created < count:
+            number += 1
+            filename = self.target_filename({"title": f"{query}-{number}"}, query)
+            if self.service.file_exists(filename):
+                continue
+
+            with metrics.timer("generate"):
+                metadata, data = self.image(query, number)
+            digest = hashlib.sha1(data).hexdigest()
+            if self.is_duplicate(digest):
+                continue
+
+            self.write_file(filename, data)
+            if not self.save_metadata(metadata, filename, digest):
+                break
+            created += 1
@@ -1,40 +1,51 @@
-import json
 import logging
-import os
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Callable, Iterator
 
-import requests
+from django.utils.text import slugify
 from pyunsplash import PyUnsplash
 
-from demoprovider.config import get_setting
+from demoprovider.config import get_setting, get_target_folder
+from demoprovider.ingest import IngestPipeline
+from demoprovider.journal import Journal
 from demoprovider.services import ImageService
-from demoprovider.utils import filename_from_slug
 
-logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.DEBUG)
+from . import RateLimiter
+from .base import FolderImageProvider
+from .downloader import Downloader, get_download_pool
 
-TARGET_FOLDER = get_setting("DEMO-PROVIDER-TARGET-FOLDER", os.path.join(os.getcwd(), "demo-images"))
-UNSPLASH_ACCESS_KEY = get_setting("UNSPLASH_ACCESS_KEY")
 
-if not UNSPLASH_ACCESS_KEY:
-    logging.warning("Unsplash API-KEY not found in .env. Unsplash image provider not available.")
+class UnsplashImageProvider(FolderImageProvider):
+    name = "unsplash"
+    rate_limit = 1.0
 
-
-class UnsplashImageProvider:
     @classmethod
-    def factory(cls):
-        return UNSPLASH_ACCESS_KEY and UnsplashImageProvider(api_key=UNSPLASH_ACCESS_KEY, target_folder=TARGET_FOLDER)
-
-    def __init__(self, api_key: str, target_folder: str, verbose: bool = True) -> None:
+    def factory(cls, resume: bool = False, service: ImageService | None = None):
+        if not (api_key := get_setting("UNSPLASH_ACCESS_KEY")):
+            logging.warning("Unsplash API-KEY not found in .env. Unsplash image provider not available.")
+            return None
+        return UnsplashImageProvider(api_key=api_key, target_folder=get_target_folder(), resume=resume, service=service)
+
+    def __init__(self, api_key: str, target_folder: str, verbose: bool = True, resume: bool = False, service: ImageService | None = None) -> None:
+        super().__init__(target_folder, verbose=verbose, service=service)
         self.api_key = api_key
-        self.target_folder = target_folder
-        self.verbose = verbose
         self.api = PyUnsplash(api_key=self.api_key)
-        self.service = ImageService()
-
-    def log(self, msg: str) -> None:
-        if self.verbose:
-            logging.info(msg)
-
-    def process_photos(self, photos, keywords: list[str] | None, folder: str | None):
+        # When mirroring collections, every request to the API is spaced by this, not only the queries.
+        self.limiter = RateLimiter(get_setting("IMAGE_PROVIDER_UNSPLASH_RATE_LIMIT", self.rate_limit))
+        self.downloader = Downloader(verbose=verbose, is_duplicate=self.is_duplicate, pool=get_download_pool())
+        self.pipeline = IngestPipeline(verbose=verbose)
+        # Photos saved are recorded in a journal, so an interrupted run can be resumed without asking for them again.
+        self.journal = Journal.for_folder(target_folder, "unsplash", resume=resume)
+
+    def close(self) -> None:
+        self.pipeline.close()
+        self.journal.close()
+
+    def photo_jobs(self, photos, keywords: list[str] | None, folder: str | None, saved: list[Future], queued: set[str]) -> Iterator[tuple]:
+        """
+        Yields a download job for every photo not saved before, skipping photos in the journal, in the library, or already in queued.
+        """
         for photo in photos:
             metadata = {
                 "title": photo.body.get("slug"),
@@ -43,42 +54,121 @@ class UnsplashImageProvider:
                 "attribution": photo.get_attribution(),
                 "unsplash-user": photo.body.get("user", {}).get("username"),
                 "portfolio_url": photo.body.get("user", {}).get("portfolio_url"),
+                "unsplash-id": photo.id,
             }
+            if photo.id in self.journal:
+                continue
 
-            if self.service.file_exists(filename_from_slug(metadata.get("title")), metadata.get("url")):
+            filename = self.target_filename(metadata, folder)
+            if filename in queued or self.service.file_exists(filename, metadata.get("url")):
                 continue
 
-            if data := self.download_photo(photo):
-                self.save_file(metadata, data, folder)
-
-    def download_photo(self, photo) -> None | bytes:
-        try:
-            response = requests.get(photo.link_download, allow_redirects=True)
-            self.log(f"Downloaded {photo.link_download}")
-            return response.content
-        except Exception as ex:
-            self.log(f"Error downloading {photo.link_download}: {ex}")
-
-    def save_file(self, metadata: dict[str, str], data: bytes, folder: str | None) -> None:
-        base_folder = folder and os.path.join(self.target_folder, "unsplash", folder) or os.path.join(self.target_folder, "unsplash")
-        if not os.path.exists(base_folder):
-            os.makedirs(base_folder)
-
-        filename = os.path.join(base_folder, filename_from_slug(metadata.get("title")))
-        try:
-            open(filename, "wb").write(data)
-            open(filename + ".json", "w").write(json.dumps(metadata))
-            self.log(f"Saved {filename}")
-            self.service.add_file(filename)
-        except Exception as ex:
-            self.log(f"Error saving {filename}: {ex}")
+            queued.add(filename)
+            yield photo.link_download, filename, partial(self.ingest, metadata, saved)
+
+    def process_photos(self, photos, keywords: list[str] | None, folder: str | None):
+        saved: list[Future] = []
+        self.downloader.download_all(self.photo_jobs(photos, keywords, folder, saved, set()))
+        wait(saved)
+        self.journal.commit()
+        self.log(self.downloader.reset_stats().summary())
+
+    def ingest(self, metadata: dict[str, str], saved: list[Future], filename: str, digest: str | None = None) -> None:
+        """
+        Passes a downloaded file through the ingest pipeline, which fixes its extension and optionally
+        downscales and transcodes it, saving its metadata when done. The pipeline is shared by queries running
+        side by side, so each waits for the futures added to saved rather than closing it.
+        """
+        saved.append(self.pipeline.submit(filename, partial(self.save_metadata, metadata), digest))
+
+    def save_metadata(self, metadata: dict[str, str], filename: str, digest: str | None = None) -> bool:
+        if saved := super().save_metadata(metadata, filename, digest):
+            if photo_id := metadata.get("unsplash-id"):
+                self.journal.finish(photo_id)
+        return saved
 
     def query(self, query, count=1) -> None:
         self.process_photos(self.api.photos(type_="random", count=count, featured=True, query=query).entries, keywords=[query], folder=query)
 
-    def collections(self, per_page=30) -> None:
-        collections = self.api.collections(per_page)
-        while collections.has_next:
-            for collection in collections.entries:
-                self.process_photos(collection.photos())
-            collections = collections.get_next_page()
+    def call(self, function: Callable, *args, **kwargs):
+        """
+        Calls a function sending a request to the API, once the rate limit allows it.
+        """
+        self.limiter.wait()
+        return function(*args, **kwargs)
+
+    def collection_pages(self, per_page: int) -> Iterator:
+        """
+        Yields the pages of collections, fetching the next page while the current one is processed.
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            page = self.call(self.api.collections, per_page=per_page)
+            while page is not None and page.body:
+                next_page = page.has_next and executor.submit(self.call, page.get_next_page) or None
+                yield page
+                page = next_page and next_page.result()
+
+    def collection_photos(self, collection, per_page: int, limit: int | None = None) -> list:
+        """
+        Returns the photos in a collection, following its pages until at least limit photos have been found.
+        """
+        photos, page = [], self.call(collection.photos, per_page=per_page)
+        while page is not None and page.body:
+            photos.extend(page.entries)
+            if not page.has_next or (limit is not None and len(photos) >= limit):
+                break
+            page = self.call(page.get_next_page)
+        return photos
+
+    def collections(self, per_page: int = 30, max_items: int | None = None, workers: int = 8) -> int:
+        """
+        Mirrors Unsplash collections, each into a folder named after it and tagged with its title, until max_items
+        photos have been queued. The next page of collections is fetched while the current one is processed, the photo
+        lists of up to workers collections are fetched at once, and photos are downloaded as soon as their list
+        arrives, so crawling is bound by bandwidth rather than round trips. Every request to the API is rate limited.
+
+        Each collection whose photos are being fetched reserves part of max_items, as many photos as it holds, and
+        no more collections are fetched while the reservations cover what is left, so no more photo lists are
+        fetched than needed. Returns the number of photos queued.
+        """
+        saved: list[Future] = []
+        queued: set[str] = set()
+
+        def jobs() -> Iterator[tuple]:
+            executor = ThreadPoolExecutor(max_workers=max(1, workers))
+            collections = (collection for page in self.collection_pages(per_page) for collection in page.entries)
+            fetching: dict[Future, tuple] = {}
+            try:
+                while True:
+                    while len(fetching) < max(1, workers):
+                        budget = None if max_items is None else max_items - len(queued) - sum(limit for _, limit in fetching.values())
+                        if (budget is not None and budget <= 0) or (collection := next(collections, None)) is None:
+                            break
+                        limit = budget and min(budget, collection.body.get("total_photos") or budget)
+                        fetching[executor.submit(self.collection_photos, collection, per_page, limit)] = (collection, limit or 0)
+                    if not fetching:
+                        return
+
+                    done, _ = wait(fetching, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collection, _ = fetching.pop(future)
+                        try:
+                            photos = future.result()
+                        except Exception as ex:
+                            self.log(f"Error getting photos of collection {collection.title}: {ex}")
+                            continue
+                        self.log(f"Found {len(photos)} photos in collection {collection.title}")
+                        folder = slugify(collection.title or "") or str(collection.id)
+                        for job in self.photo_jobs(photos, [collection.title or folder], folder, saved, queued):
+                            yield job
+                            if max_items is not None and len(queued) >= max_items:
+                                return
+            finally:
+                collections.close()
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        self.downloader.download_all(jobs())
+        wait(saved)
+        self.journal.commit()
+        self.log(self.downloader.reset_stats().summary())
+        return len(queued)
@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import posixpath
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Iterable
+
+from django.db import transaction
+from wagtail.images import get_image_model
+from wagtail.models import Collection
+from wagtail.search.backends import get_search_backends
+
+from .catalog import file_hash
+from .journal import Journal
+from .metrics import metrics
+from .probe import image_size
+from .transfer import store_in_field
+from .utils import chunked
+
+if TYPE_CHECKING:
+    from wagtail.images.models import AbstractImage
+
+
+def existing_file_hashes(hashes: Iterable[str] | None = None) -> set[str]:
+    """
+    Returns the file hashes of all wagtail images, or the ones among the given hashes, in a single query.
+    """
+    images = get_image_model().objects.exclude(file_hash="")
+    if hashes is not None:
+        images = images.filter(file_hash__in=list(hashes))
+    return set(images.values_list("file_hash", flat=True))
+
+
+class BulkImporter:
+    """
+    Imports local files as wagtail images in bulk. A pool of threads reads the image headers and copies
+    the files into media storage, while the rows are inserted with bulk_create, one transaction per batch.
+
+    With a journal, the files of a batch are recorded as pending, and the journal committed, before any of them
+    is copied into storage, and they're recorded as done once the batch is committed. If the import is interrupted
+    in between, recover_journal removes the copies, or keeps them if their rows made it into the database.
+    If on_saved is given, it's called with the (filename, image) of the images saved, once per batch.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        batch_size: int = 100,
+        verbose: bool = False,
+        journal: Journal | None = None,
+        on_saved: "Callable[[list[tuple[str, AbstractImage]]], None] | None" = None,
+    ):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.verbose = verbose
+        self.journal = journal
+        self.on_saved = on_saved
+        self.root_collection_id: int | None = None
+
+    def log(self, msg: str) -> None:
+        if self.verbose:
+            logging.info(msg)
+
+    def prepare(self, filename: str, collection: Collection | None = None, metadata: dict | None = None) -> "AbstractImage":
+        """
+        Builds an unsaved image for the file, storing a copy of the file in media storage in the process.
+        Dimensions and file hash are taken from metadata when available. This runs in the worker threads, so it
+        mustn't touch the database, which would open a connection per thread that is never closed. The root
+        collection is looked up here only if prepare is called on its own, run looks it up beforehand.
+        """
+        from .services import ImageService
+
+        metadata = metadata or {}
+        title = ImageService.pretty_title_from_filename(os.path.basename(filename))
+        width, height = metadata.get("width") and (metadata["width"], metadata["height"]) or image_size(filename)
+        content_hash = metadata.get("sha1") or file_hash(filename)
+        if not collection and self.root_collection_id is None:
+            self.root_collection_id = Collection.get_first_root_node().pk
+        collection_id = collection and collection.pk or self.root_collection_id
+        image = get_image_model()(title=title, width=width, height=height, file_size=os.path.getsize(filename), file_hash=content_hash, collection_id=collection_id)
+        store_in_field(image.file, filename)
+        return image
+
+    def _prepare(self, item: tuple) -> "AbstractImage | None":
+        filename = item[0]
+        try:
+            with metrics.timer("import.prepare"):
+                return self.prepare(*item)
+        except Exception as ex:
+            self.log(f"Error adding {filename}: {ex}")
+            return None
+
+    def save_batch(self, images: list) -> list:
+        with metrics.timer("import.save_batch"):
+            return self._save_batch(images)
+
+    def _save_batch(self, images: list) -> list:
+        """
+        Inserts the images in one transaction, returning the ones saved. If that fails, the images are inserted one at a
+        time, so a bad file only loses its own image. Files of images that couldn't be saved are removed from storage.
+        """
+        try:
+            with transaction.atomic():
+                get_image_model().objects.bulk_create(images)
+            saved = images
+        except Exception as ex:
+            self.log(f"Error saving a batch of {len(images)} images, saving them one at a time: {ex}")
+            saved = []
+            for image in images:
+                try:
+                    with transaction.atomic():
+                        get_image_model().objects.bulk_create([image])
+                    saved.append(image)
+                except Exception as ex:
+                    self.log(f"Error adding {image.file.name}: {ex}")
+                    image.file.storage.delete(image.file.name)
+
+        if saved:
+            for backend in get_search_backends(with_auto_update=True):
+                backend.add_bulk(get_image_model(), saved)
+        return saved
+
+    def run(self, items: Iterable[tuple]) -> int:
+        """
+        Imports (filename, collection) or (filename, collection, metadata) items, returning the number of images created.
+        """
+        count = 0
+        self.root_collection_id = Collection.get_first_root_node().pk
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for chunk in chunked(items, self.batch_size):
+                if self.journal:
+                    for item in chunk:
+                        collection_id = item[1] and item[1].pk or self.root_collection_id
+                        metadata = len(item) > 2 and item[2] or {}
+                        self.journal.start(item[0], json.dumps({"name": upload_name(item[0], collection_id), "sha1": metadata.get("sha1")}))
+                    self.journal.commit()
+                prepared = [(item[0], image) for item, image in zip(chunk, executor.map(self._prepare, chunk)) if image]
+                if not prepared:
+                    continue
+                saved = {id(image) for image in self.save_batch([image for _, image in prepared])}
+                if self.on_saved and saved:
+                    self.on_saved([(filename, image) for filename, image in prepared if id(image) in saved])
+                if self.journal:
+                    for filename, image in prepared:
+                        if id(image) in saved:
+                            self.journal.finish(filename)
+                    self.journal.commit()
+                count += len(saved)
+                self.log(f"+ Added {len(saved)} images ({count} in total)")
+        return count
+
+
+def upload_name(filename: str, collection_id: int) -> str:
+    """
+    Returns the name a file is stored under in media storage, before a suffix is added if the name is taken.
+    The collection is passed so building the image doesn't look up the default collection for every file.
+    """
+    Image = get_image_model()
+    return Image._meta.get_field("file").generate_filename(Image(collection_id=collection_id), os.path.basename(filename))
+
+
+def recover_journal(journal: Journal) -> int:
+    """
+    Cleans up after an interrupted import, returning the number of files it left unfinished. Copies of those files in
+    media storage, under their upload name with or without the random suffix storages add, are removed unless a
+    wagtail image refers to them. Files whose image was saved with the same hash are recorded as done instead.
+    Media storage mustn't be written by another import meanwhile.
+    """
+    Image = get_image_model()
+    storage = Image._meta.get_field("file").storage
+
+    def cleanup(data: str) -> bool:
+        entry = json.loads(data)
+        folder, basename = posixpath.split(entry["name"])
+        root, extension = os.path.splitext(basename)
+        pattern = re.compile(re.escape(root) + r"(_[a-zA-Z0-9]{7})?" + re.escape(extension))
+        try:
+            names = [posixpath.join(folder, name) for name in storage.listdir(folder)[1] if pattern.fullmatch(name)]
+        except FileNotFoundError:
+            return False
+        images = Image.objects.filter(file__in=names)
+        for name in set(names) - set(images.values_list("file", flat=True)):
+            storage.delete(name)
+        return bool(entry["sha1"]) and images.filter(file_hash=entry["sha1"]).exists()
+
+    return journal.recover(cleanup)
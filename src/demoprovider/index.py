@@ -0,0 +1,201 @@
+import os
+import sys
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from .services import DemoImage
+
+ORIENTATIONS = ("landscape", "portrait", "square")
+# Number of removed images the index keeps empty slots for before it's compacted, when they're also the majority.
+COMPACT_THRESHOLD = 1024
+
+# Shared keyword table, so images with the same keywords share one tuple of interned strings.
+KEYWORD_TUPLES: dict[tuple[str, ...], tuple[str, ...]] = {}
+
+
+def image_keywords(metadata: dict) -> list[str]:
+    return metadata.get("keywords") or ["default"]
+
+
+def intern_keywords(keywords: Iterable[str]) -> tuple[str, ...]:
+    key = tuple(sys.intern(keyword) for keyword in keywords)
+    return KEYWORD_TUPLES.setdefault(key, key)
+
+
+def image_provider(metadata: dict) -> str:
+    return metadata.get("provider") or ("unsplash-user" in metadata and "unsplash") or "local"
+
+
+def normalize_path(filename: str) -> str:
+    return os.path.normcase(os.path.abspath(filename))
+
+
+def image_orientation(width: int, height: int) -> str:
+    return width > height and "landscape" or width < height and "portrait" or "square"
+
+
+def link(lookup: dict[str, int], shared: dict[str, list[int]], key: str, image_id: int) -> None:
+    if lookup.setdefault(key, image_id) != image_id:
+        shared.setdefault(key, []).append(image_id)
+
+
+def unlink(lookup: dict[str, int], shared: dict[str, list[int]], key: str, image_id: int) -> None:
+    others = shared.get(key)
+    if lookup.get(key) == image_id:
+        if others:
+            lookup[key] = others.pop(0)
+        else:
+            lookup.pop(key, None)
+    elif others and image_id in others:
+        others.remove(image_id)
+    if others == []:
+        del shared[key]
+
+
+class ImageIndex:
+    """
+    An inverted index of the images in a library. Every image is stored once under an integer id,
+    and each keyword maps to the set of ids tagged with it, so keyword queries are plain set operations.
+
+    Images are keyed on their normalized path, and looked up by source url and content hash as well,
+    so checking whether a file is already in the library is O(1). A url or hash shared by several images
+    points to the first one, and moves on to the next when that one is removed.
+
+    Removed images leave an empty slot, so ids stay valid, until they outnumber the images left and the
+    index is compacted.
+    """
+
+    def __init__(self):
+        self.images: list["DemoImage | None"] = []
+        self.ids: dict[str, int] = {}
+        self.keywords: dict[str, set[int]] = {}
+        self.urls: dict[str, int] = {}
+        self.hashes: dict[str, int] = {}
+        # The other images with a url or hash already in urls or hashes, which are rare, so only they get a list.
+        self.shared_urls: dict[str, list[int]] = {}
+        self.shared_hashes: dict[str, list[int]] = {}
+        # Bumped on every change, so samplers and other derived structures know when to rebuild.
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, filename: str) -> bool:
+        return normalize_path(filename) in self.ids
+
+    def add(self, image: "DemoImage") -> int:
+        key = normalize_path(image.filename)
+        if key in self.ids:
+            self.remove(key)
+
+        image_id = len(self.images)
+        self.version += 1
+        self.images.append(image)
+        self.ids[key] = image_id
+        for keyword in image.keywords:
+            self.keywords.setdefault(keyword, set()).add(image_id)
+        if image.url:
+            link(self.urls, self.shared_urls, image.url, image_id)
+        if image.content_hash:
+            link(self.hashes, self.shared_hashes, image.content_hash, image_id)
+        return image_id
+
+    def remove(self, filename: str) -> "DemoImage | None":
+        if (image_id := self.ids.pop(normalize_path(filename), None)) is None:
+            return None
+
+        self.version += 1
+        image, self.images[image_id] = self.images[image_id], None
+        for keyword in image.keywords:  # type: ignore NOQA
+            ids = self.keywords.get(keyword)
+            if ids is not None:
+                ids.discard(image_id)
+                if not ids:
+                    del self.keywords[keyword]
+        if image.url:  # type: ignore NOQA
+            unlink(self.urls, self.shared_urls, image.url, image_id)  # type: ignore NOQA
+        if image.content_hash:  # type: ignore NOQA
+            unlink(self.hashes, self.shared_hashes, image.content_hash, image_id)  # type: ignore NOQA
+        if len(self.images) - len(self.ids) > max(COMPACT_THRESHOLD, len(self.ids)):
+            self.compact()
+        return image
+
+    def compact(self) -> None:
+        """
+        Drops the slots of removed images, renumbering the others in the order they were added.
+        """
+        images, version = [image for image in self.images if image is not None], self.version
+        ImageIndex.__init__(self)
+        for image in images:
+            ImageIndex.add(self, image)
+        self.version = version + 1
+
+    def get(self, filename: str) -> "DemoImage | None":
+        image_id = self.ids.get(normalize_path(filename))
+        return None if image_id is None else self.images[image_id]
+
+    def find(self, filename: str | None = None, url: str | None = None, content_hash: str | None = None) -> "DemoImage | None":
+        """
+        Returns the image matching the path, source url or content hash, if any.
+        """
+        for key, lookup in ((filename and normalize_path(filename), self.ids), (url, self.urls), (content_hash, self.hashes)):
+            if key and (image_id := lookup.get(key)) is not None:
+                return self.images[image_id]
+        return None
+
+    def count(self, keyword: str | None = None) -> int:
+        if keyword is None:
+            return len(self.ids)
+        return len(self.keywords.get(keyword, ()))
+
+    def counts(self) -> dict[str, int]:
+        return {keyword: len(ids) for keyword, ids in self.keywords.items()}
+
+    def all_ids(self) -> set[int]:
+        return set(self.ids.values())
+
+    def query(
+        self,
+        all_of: Iterable[str] = (),
+        any_of: Iterable[str] = (),
+        none_of: Iterable[str] = (),
+        orientation: str | None = None,
+        min_width: int | None = None,
+        min_height: int | None = None,
+        provider: str | None = None,
+    ) -> list[int]:
+        """
+        Returns the ids of the images tagged with all keywords in all_of, at least one keyword in any_of
+        and none of the keywords in none_of, optionally filtered on metadata, in the order they were added.
+        """
+        all_of, any_of = list(all_of), list(any_of)
+        result: set[int] | None = None
+        if any_of:
+            result = set().union(*(self.keywords.get(keyword, ()) for keyword in any_of))
+        for keyword in sorted(all_of, key=self.count):
+            ids = self.keywords.get(keyword, set())
+            result = set(ids) if result is None else result & ids
+        if result is None:
+            result = self.all_ids()
+        for keyword in none_of:
+            result -= self.keywords.get(keyword, set())
+
+        if orientation or min_width or min_height or provider:
+            result = {image_id for image_id in result if self.matches(self.images[image_id], orientation, min_width, min_height, provider)}  # type: ignore NOQA
+        return sorted(result)
+
+    def matches(self, image: "DemoImage", orientation: str | None, min_width: int | None, min_height: int | None, provider: str | None) -> bool:
+        if provider and image.provider != provider:
+            return False
+        if not (orientation or min_width or min_height):
+            return True
+        try:
+            width, height = image.size
+        except Exception:
+            return False
+        if orientation and image_orientation(width, height) != orientation:
+            return False
+        return width >= (min_width or 0) and height >= (min_height or 0)
+
+    def resolve(self, ids: Iterable[int]) -> list["DemoImage"]:
+        return [self.images[image_id] for image_id in ids]  # type: ignore NOQA
@@ -0,0 +1,176 @@
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+from .catalog import file_hash
+from .config import get_setting
+from .metrics import metrics
+from .probe import probe_format, probe_size
+
+FORMAT_EXTENSIONS = {"jpeg": ".jpg", "png": ".png", "webp": ".webp", "avif": ".avif"}
+
+
+@dataclass(frozen=True)
+class IngestOptions:
+    """
+    How images are stored when added to the library. Images larger than max_size in either dimension are
+    downscaled, keeping their aspect ratio, and format, "webp" or "avif", transcodes them. Zero and None leave
+    the size and format alone.
+    """
+
+    max_size: int = 0
+    format: str | None = None
+    quality: int = 80
+
+    @classmethod
+    def from_settings(cls) -> "IngestOptions":
+        return cls(
+            max_size=int(get_setting("IMAGE_PROVIDER_MAX_SIZE", 0)),
+            format=get_setting("IMAGE_PROVIDER_FORMAT") or None,
+            quality=int(get_setting("IMAGE_PROVIDER_QUALITY", 80)),
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.max_size or self.format)
+
+
+def replace_extension(filename: str, format: str) -> str:
+    return os.path.splitext(filename)[0] + FORMAT_EXTENSIONS[format]
+
+
+def available_filename(filename: str) -> str:
+    """
+    Returns filename, or filename with a counter added if it's taken, claiming it with an empty file so that
+    processes ingesting files side by side can't pick the same name. The caller replaces the empty file.
+    """
+    base, extension = os.path.splitext(filename)
+    candidate, i = filename, 0
+    while True:
+        try:
+            os.close(os.open(candidate, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+            return candidate
+        except FileExistsError:
+            i += 1
+            candidate = f"{base}_{i}{extension}"
+
+
+def ingest(filename: str, options: IngestOptions, digest: str | None = None) -> tuple[str, str]:
+    """
+    Gives the file the extension of its actual format, downscaling and transcoding it according to the options.
+    Returns the new filename and the SHA1 digest of the stored file, reusing digest if the contents are unchanged.
+    The image is only decoded if it has to be converted.
+    """
+    with open(filename, "rb") as f:
+        format = probe_format(f)
+        size = probe_size(f)
+
+    target_format = options.format or format
+    too_large = options.max_size and size and max(size) > options.max_size
+    if format is None or target_format not in FORMAT_EXTENSIONS:
+        return filename, digest or file_hash(filename)
+
+    target = replace_extension(filename, target_format)
+    if target != filename:
+        # Never overwrite another image that already has the name.
+        target = available_filename(target)
+    if not too_large and target_format == format:
+        if target != filename:
+            os.replace(filename, target)
+        return target, digest or file_hash(target)
+
+    import willow
+
+    with metrics.timer("transcode"), open(filename, "rb") as f:
+        image = willow.Image.open(f)
+        if too_large:
+            scale = options.max_size / max(size)  # type: ignore NOQA
+            image = image.resize((max(1, round(size[0] * scale)), max(1, round(size[1] * scale))))  # type: ignore NOQA
+
+        fd, temp_filename = tempfile.mkstemp(dir=os.path.dirname(filename) or ".", prefix=".", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as output:
+                save = getattr(image, f"save_as_{target_format}")
+                if target_format in ("jpeg", "webp", "avif"):
+                    save(output, quality=options.quality)
+                else:
+                    save(output)
+            os.replace(temp_filename, target)
+        except BaseException:
+            os.remove(temp_filename)
+            if target != filename:
+                os.remove(target)
+            raise
+
+    if target != filename:
+        os.remove(filename)
+    metrics.count("bytes.transcoded", os.path.getsize(target))
+    return target, file_hash(target)
+
+
+class IngestPipeline:
+    """
+    Runs ingest on a pool of processes, as decoding and encoding images is CPU bound. Callbacks are called
+    with the new filename and digest from a thread of the calling process. Files can be submitted from several threads.
+    """
+
+    def __init__(self, options: IngestOptions | None = None, workers: int | None = None, verbose: bool = False):
+        self.options = options if options is not None else IngestOptions.from_settings()
+        self.workers = workers or int(get_setting("IMAGE_PROVIDER_INGEST_WORKERS", 0)) or os.cpu_count() or 1
+        self.verbose = verbose
+        self.executor: ProcessPoolExecutor | None = None
+        self.lock = threading.Lock()
+
+    def log(self, msg: str) -> None:
+        if self.verbose:
+            logging.info(msg)
+
+    def submit(self, filename: str, callback: Callable[[str, str], None], digest: str | None = None) -> Future:
+        """
+        Processes a file, returning a future that's done once callback has been called with the result.
+        """
+        done: Future = Future()
+        if not self.options:
+            # Only the extension might change, which just needs the headers, so there's no point in a process.
+            self.finish(filename, callback, done, lambda: ingest(filename, self.options, digest))
+            return done
+
+        def finish(future: Future) -> None:
+            self.finish(filename, callback, done, future.result)
+
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            future = self.executor.submit(ingest, filename, self.options, digest)
+        future.add_done_callback(finish)
+        return done
+
+    def finish(self, filename: str, callback: Callable[[str, str], None], done: Future, result: Callable[[], tuple[str, str]]) -> None:
+        """
+        Calls callback with the result of processing a file, logging errors rather than raising them, so one bad file
+        doesn't stop the others.
+        """
+        try:
+            callback(*result())
+        except Exception as ex:
+            self.log(f"Error processing {filename}: {ex}")
+        finally:
+            done.set_result(None)
+
+    def close(self) -> None:
+        """
+        Waits for all submitted files to be processed.
+        """
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def __enter__(self) -> "IngestPipeline":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
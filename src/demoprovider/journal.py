@@ -0,0 +1,125 @@
+import glob
+import logging
+import os
+import sqlite3
+import threading
+from typing import Callable
+
+from .config import get_state_folder
+
+JOURNAL_FILENAME = ".journal.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    job TEXT NOT NULL,
+    key TEXT NOT NULL,
+    done INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job, key)
+)
+"""
+
+
+def remove_partial_files(folder: str) -> int:
+    """
+    Removes the temporary files left in a folder by downloads or conversions that were interrupted, returning how many were removed.
+    """
+    count = 0
+    for filename in glob.glob(os.path.join(glob.escape(folder), "**", ".*.part"), recursive=True):
+        try:
+            os.remove(filename)
+            count += 1
+        except OSError:
+            pass
+    return count
+
+
+class Journal:
+    """
+    A checkpoint journal for long running jobs, like imports and downloads, stored as a sqlite database.
+    Items are recorded as pending when work on them has started, with any data needed to clean up after them,
+    and as done when completed, so an interrupted job can be resumed, skipping done items in O(1).
+
+    Unless resuming, done items from earlier runs are forgotten, while pending items are kept until recovered.
+    Writes are buffered and committed every commit_every items and on close. It's safe to use from several threads.
+    """
+
+    def __init__(self, path: str, job: str, resume: bool = False, commit_every: int = 100):
+        self.path = path
+        self.job = job
+        self.commit_every = commit_every
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(SCHEMA)
+        self.uncommitted = 0
+        if not resume:
+            with self.connection:
+                self.connection.execute("DELETE FROM journal WHERE job = ? AND done = 1", (job,))
+        self.done = {key for (key,) in self.connection.execute("SELECT key FROM journal WHERE job = ? AND done = 1", (job,))}
+
+    @classmethod
+    def for_folder(cls, folder: str, job: str, resume: bool = False) -> "Journal":
+        return cls(os.path.join(get_state_folder(folder), JOURNAL_FILENAME), job, resume=resume)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.done
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def clear(self) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM journal WHERE job = ?", (self.job,))
+        self.done = set()
+
+    def pending(self) -> list[tuple[str, str]]:
+        """
+        Returns the (key, data) of the items that were started but never completed.
+        """
+        with self.lock:
+            return list(self.connection.execute("SELECT key, data FROM journal WHERE job = ? AND done = 0", (self.job,)))
+
+    def start(self, key: str, data: str = "") -> None:
+        self._write(key, 0, data)
+
+    def finish(self, key: str) -> None:
+        self.done.add(key)
+        self._write(key, 1, "")
+
+    def _write(self, key: str, done: int, data: str) -> None:
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO journal VALUES (?, ?, ?, ?)", (self.job, key, done, data))
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_every:
+                self.connection.commit()
+                self.uncommitted = 0
+
+    def commit(self) -> None:
+        with self.lock:
+            self.connection.commit()
+            self.uncommitted = 0
+
+    def close(self) -> None:
+        self.commit()
+        self.connection.close()
+
+    def recover(self, cleanup: Callable[[str], bool | None]) -> int:
+        """
+        Calls cleanup with the data of every pending item and forgets about them, returning how many were cleaned up.
+        Items for which cleanup returns True turned out to be completed after all, and are recorded as done instead.
+        """
+        pending, completed = self.pending(), []
+        for key, data in pending:
+            try:
+                if cleanup(data):
+                    completed.append(key)
+            except Exception as ex:
+                logging.warning(f"Error cleaning up after {key}: {ex}")
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM journal WHERE job = ? AND key = ?", [(self.job, key) for key, _ in pending])
+            self.connection.executemany("INSERT INTO journal VALUES (?, ?, 1, '')", [(self.job, key) for key in completed])
+        self.done.update(completed)
+        return len(pending) - len(completed)
@@ -3,13 +3,44 @@ import os
 import djclick as click
 
 from demoprovider.config import get_setting
+from demoprovider.metrics import REPORT_FORMATS, collect
+from demoprovider.renditions import RenditionWarmer
 from demoprovider.services import ImageService
+from demoprovider.utils import configure_logging
 
 LOCAL_IMAGES_FOLDER = get_setting("local-images", os.path.join(os.getcwd(), "local-images"))
 
 
 @click.command()
 @click.option("--verbose", "-v", is_flag=True, help="Print more output.")
-def add_local_images(verbose: bool = False):
+@click.option("--workers", "-w", default=0, help="Import in bulk using this many worker threads.")
+@click.option("--batch-size", "-b", default=100, help="Number of images saved per transaction when importing in bulk.")
+@click.option("--resume", is_flag=True, help="Skip files imported by an earlier, interrupted run.")
+@click.option("--renditions", "-r", default=None, help="Comma-separated filter specs to pre-generate renditions for, like fill-300x200,width-800.")
+@click.option("--rendition-workers", default=0, help="Generate renditions using this many processes.")
+@click.option("--metrics", type=click.Choice(REPORT_FORMATS), help="Print timings and counters when done, as text, json or prometheus.")
+@click.option("--watch", is_flag=True, help="Keep running, adding, updating and removing images as files change in the folder.")
+@click.option("--interval", default=1.0, help="Seconds between checks for changes when watching.")
+def add_local_images(
+    verbose: bool = False,
+    workers: int = 0,
+    batch_size: int = 100,
+    resume: bool = False,
+    metrics: str | None = None,
+    renditions: str | None = None,
+    rendition_workers: int = 0,
+    watch: bool = False,
+    interval: float = 1.0,
+):
+    configure_logging(verbose)
     if os.path.exists(LOCAL_IMAGES_FOLDER):
-        ImageService().add_local_folder(LOCAL_IMAGES_FOLDER)
+        warmer = RenditionWarmer(renditions, workers=rendition_workers, verbose=verbose)
+        with collect(metrics):
+            service = ImageService(verbose=verbose)
+            if not watch:
+                service.add_local_folder(LOCAL_IMAGES_FOLDER, workers=workers, batch_size=batch_size, renditions=warmer, resume=resume)
+                return
+            try:
+                service.watch_local_folder(LOCAL_IMAGES_FOLDER, interval=interval, workers=workers, batch_size=batch_size, renditions=warmer, resume=resume)
+            except KeyboardInterrupt:
+                pass
@@ -1,10 +1,28 @@
 import djclick as click
 
 from demoprovider.config import get_setting
-from demoprovider.image_providers import init_providers
+from demoprovider.image_providers import PROVIDERS, init_providers
+from demoprovider.metrics import REPORT_FORMATS, collect
+from demoprovider.utils import configure_logging
 
 
 @click.command()
-def download_images():
+@click.option("--metrics", type=click.Choice(REPORT_FORMATS), help="Print timings and counters when done, as text, json or prometheus.")
+@click.option("--resume", is_flag=True, help="Skip photos saved by an earlier, interrupted run.")
+@click.option("--provider", "providers", multiple=True, type=click.Choice(list(PROVIDERS)), help="Provider to get images from, can be repeated. Defaults to IMAGE_PROVIDERS.")
+@click.option("--workers", type=int, default=None, help="Number of keyword and provider queries to run at the same time.")
+@click.option("--collections", type=int, default=0, help="Mirror up to this many photos from Unsplash collections instead of querying keywords.")
+def download_images(metrics: str | None = None, resume: bool = False, providers: tuple[str, ...] = (), workers: int | None = None, collections: int = 0):
+    configure_logging()
     keywords = [p.strip() for p in get_setting("IMAGE_PROVIDER_DEFAULT_KEYWORDS").split(",")]
-    init_providers(get_setting("IMAGE_PROVIDER_IMAGE_COUNT_PER_KEYWORD", 10), *keywords)
+    with collect(metrics):
+        if collections:
+            from demoprovider.image_providers.unsplash import UnsplashImageProvider
+
+            if provider := UnsplashImageProvider.factory(resume=resume):
+                try:
+                    provider.collections(max_items=collections, workers=workers or 8)
+                finally:
+                    provider.close()
+            return
+        init_providers(get_setting("IMAGE_PROVIDER_IMAGE_COUNT_PER_KEYWORD", 10), *keywords, resume=resume, providers=providers, workers=workers)
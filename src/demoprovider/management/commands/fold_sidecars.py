@@ -0,0 +1,20 @@
+import logging
+
+import djclick as click
+
+from demoprovider.config import get_target_folder
+from demoprovider.manifest import fold_sidecars as fold
+from demoprovider.utils import configure_logging
+
+
+@click.command()
+@click.argument("folder", required=False)
+@click.option("--remove-sidecars", is_flag=True, help="Delete the sidecars once they are in a manifest.")
+def fold_sidecars(folder: str | None = None, remove_sidecars: bool = False):
+    """
+    Folds the json sidecars of the images in a folder, by default the target folder, into one manifest per folder.
+    """
+    configure_logging()
+    folder = folder or get_target_folder()
+    count = fold(folder, remove=remove_sidecars)
+    logging.info(f"Folded {count} sidecars in {folder} into manifests")
@@ -0,0 +1,23 @@
+import logging
+
+import djclick as click
+
+from demoprovider.config import get_bool_setting
+from demoprovider.metrics import REPORT_FORMATS, collect
+from demoprovider.snapshot import get_snapshot_folder, restore_snapshot
+from demoprovider.utils import configure_logging
+
+
+@click.command()
+@click.argument("folder", required=False)
+@click.option("--link/--copy", default=None, help="Hard link media files from the snapshot instead of copying them. Defaults to DEMO-PROVIDER-HARDLINKS.")
+@click.option("--metrics", type=click.Choice(REPORT_FORMATS), help="Print timings and counters when done, as text, json or prometheus.")
+def restore_demo(folder: str | None = None, link: bool | None = None, metrics: str | None = None):
+    """
+    Seeds the database and media storage from a snapshot taken with snapshot_demo, by default in DEMO-PROVIDER-SNAPSHOT-FOLDER.
+    """
+    configure_logging()
+    folder = folder or get_snapshot_folder()
+    with collect(metrics):
+        rows, files = restore_snapshot(folder, link=get_bool_setting("DEMO-PROVIDER-HARDLINKS") if link is None else link)
+    logging.info(f"Restored {rows} rows and {files} media files from {folder}")
@@ -1,20 +1,42 @@
-import os
-
 import djclick as click
-from django.apps import apps
 from django.db import DatabaseError, transaction
 
+from demoprovider.metrics import REPORT_FORMATS, collect
+from demoprovider.registry import DemoScheduler, discover_providers
+from demoprovider.renditions import RenditionWarmer
+from demoprovider.utils import configure_logging
+
 
 @click.command()
-def run_demo_providers():
-    with transaction.atomic():
-        try:
-            for app in [app for app in apps.get_app_configs()]:
-                app_folder = os.path.split(app.module.__file__)[0]
-                if os.path.exists(os.path.join(app_folder, "demo.py")):
-                    try:
-                        getattr(__import__("%s.%s" % (app.name, "demo")).demo, "run")()
-                    except ImportError as ex:
-                        print(f"Skipping demo from {app.name}: {ex}")
-        except DatabaseError as ex:
-            print(f"Demo process aborted: {ex}")
+@click.option("--verbose", "-v", is_flag=True, help="Print more output.")
+@click.option("--workers", "-w", default=1, help="Run independent demo providers concurrently using this many threads.")
+@click.option("--metrics", type=click.Choice(REPORT_FORMATS), help="Print timings and counters when done, as text, json or prometheus.")
+@click.option("--renditions", "-r", default=None, help="Comma-separated filter specs to pre-generate renditions for, like fill-300x200,width-800.")
+@click.option("--rendition-workers", default=0, help="Generate renditions using this many processes.")
+@click.option("--atomic", is_flag=True, help="Run all demo providers in a single transaction, rolling everything back if one fails.")
+def run_demo_providers(
+    verbose: bool = False,
+    workers: int = 1,
+    metrics: str | None = None,
+    renditions: str | None = None,
+    rendition_workers: int = 0,
+    atomic: bool = False,
+):
+    configure_logging(verbose)
+    scheduler = DemoScheduler(discover_providers(), workers=atomic and 1 or workers, verbose=verbose)
+    warmer = RenditionWarmer(renditions, workers=rendition_workers, verbose=verbose)
+    last_image_id = warmer and RenditionWarmer.last_image_id()
+    with collect(metrics):
+        if not atomic:
+            if errors := scheduler.run():
+                raise click.ClickException(f"Demo from {', '.join(errors)} failed")
+        else:
+            try:
+                with transaction.atomic():
+                    if errors := scheduler.run():
+                        raise DatabaseError(f"{', '.join(errors)} failed")
+            except DatabaseError as ex:
+                raise click.ClickException(f"Demo process aborted: {ex}")
+
+        if warmer:
+            warmer.warm_new(last_image_id)
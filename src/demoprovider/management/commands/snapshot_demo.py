@@ -0,0 +1,25 @@
+import logging
+
+import djclick as click
+
+from demoprovider.config import get_bool_setting
+from demoprovider.metrics import REPORT_FORMATS, collect
+from demoprovider.snapshot import get_snapshot_folder, take_snapshot
+from demoprovider.utils import configure_logging
+
+
+@click.command()
+@click.argument("folder", required=False)
+@click.option("--model", "models", multiple=True, help="Also save the rows of this model, as app_label.ModelName, can be repeated.")
+@click.option("--link/--copy", default=None, help="Hard link media files into the snapshot instead of copying them. Defaults to DEMO-PROVIDER-HARDLINKS.")
+@click.option("--metrics", type=click.Choice(REPORT_FORMATS), help="Print timings and counters when done, as text, json or prometheus.")
+def snapshot_demo(folder: str | None = None, models: tuple[str, ...] = (), link: bool | None = None, metrics: str | None = None):
+    """
+    Saves the collections, pages, images and renditions of the site, with their media files, in a folder, by default
+    DEMO-PROVIDER-SNAPSHOT-FOLDER, so restore_demo can seed another database with them.
+    """
+    configure_logging()
+    folder = folder or get_snapshot_folder()
+    with collect(metrics):
+        rows, files = take_snapshot(folder, extra_models=models, link=get_bool_setting("DEMO-PROVIDER-HARDLINKS") if link is None else link)
+    logging.info(f"Saved {rows} rows and {files} media files in {folder}")
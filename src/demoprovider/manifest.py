@@ -0,0 +1,194 @@
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .config import SUPPORTED_IMAGE_FORMATS
+from .metrics import metrics
+
+MANIFEST_FILENAME = ".manifest.jsonl"
+MANIFEST_CACHE_SIZE = 64
+
+
+class Manifest:
+    """
+    The metadata of the images in one folder, kept in a single JSON Lines file instead of a sidecar per image.
+    Every line is an entry, {"file": "photo.jpg", "metadata": {...}}, and the file is only ever appended to, so
+    later entries replace earlier ones and a null metadata removes an image. Appends are single writes, so an entry
+    is either written completely or not at all, and a broken last line left by a crash is ignored.
+
+    Each image's revision is the offset of its latest entry, which changes whenever its metadata does.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.path = os.path.join(folder, MANIFEST_FILENAME)
+        self.lock = threading.Lock()
+        self.entries: dict[str, dict] = {}
+        self.revisions: dict[str, int] = {}
+        self.offset = 0
+        self.inode = None
+        self.refresh()
+
+    @classmethod
+    def for_folder(cls, folder: str) -> "Manifest":
+        """
+        Returns the manifest of a folder, shared by all callers and brought up to date with what other processes appended.
+        Only the MANIFEST_CACHE_SIZE manifests used last are kept, the others are read again when next needed.
+        """
+        with MANIFESTS_LOCK:
+            if (manifest := MANIFESTS.get(folder)) is None:
+                manifest = MANIFESTS[folder] = cls(folder)
+                if len(MANIFESTS) > MANIFEST_CACHE_SIZE:
+                    MANIFESTS.popitem(last=False)
+                return manifest
+            MANIFESTS.move_to_end(folder)
+        manifest.refresh()
+        return manifest
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, name: str) -> dict | None:
+        return self.entries.get(name)
+
+    def revision(self, name: str) -> int | None:
+        return self.revisions.get(name)
+
+    def refresh(self) -> None:
+        """
+        Reads what was appended since the last refresh, or the whole file if it was replaced, in one sequential pass.
+        """
+        with self.lock:
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                self.entries, self.revisions, self.offset, self.inode = {}, {}, 0, None
+                return
+
+            if stat.st_ino != self.inode or stat.st_size < self.offset:
+                self.entries, self.revisions, self.offset, self.inode = {}, {}, 0, stat.st_ino
+            if stat.st_size == self.offset:
+                return
+
+            with metrics.timer("manifest.read"), open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read()
+            metrics.count("bytes.read", len(data))
+            # An unterminated last line is an append in progress, or a broken one, so it's left for the next refresh.
+            end = data.rfind(b"\n") + 1
+            offset = self.offset
+            for line in data[:end].splitlines(keepends=True):
+                self.parse(line, offset)
+                offset += len(line)
+            self.offset += end
+
+    def parse(self, line: bytes, offset: int) -> None:
+        try:
+            entry = json.loads(line)
+            name, metadata = entry["file"], entry.get("metadata")
+        except (ValueError, KeyError, TypeError):
+            return
+        if metadata is None:
+            self.entries.pop(name, None)
+            self.revisions.pop(name, None)
+        else:
+            self.entries[name] = metadata
+            self.revisions[name] = offset
+
+    @staticmethod
+    def line(name: str, metadata: dict | None) -> bytes:
+        return (json.dumps({"file": name, "metadata": metadata}) + "\n").encode()
+
+    def append(self, name: str, metadata: dict | None) -> None:
+        """
+        Records the metadata of an image, or its removal if metadata is None, with a single append.
+        """
+        line = self.line(name, metadata)
+        with self.lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o666)
+            try:
+                size = os.fstat(fd).st_size
+                # Don't glue the entry onto a broken last line left by a crash.
+                if size and os.pread(fd, 1, size - 1) != b"\n":
+                    line = b"\n" + line
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            metrics.count("bytes.written", len(line))
+        self.refresh()
+
+    def remove(self, name: str) -> None:
+        if name in self.entries:
+            self.append(name, None)
+
+    def compact(self, entries: dict[str, dict] | None = None) -> None:
+        """
+        Rewrites the manifest with one line per image, replacing it atomically. With entries given, those become its contents.
+        """
+        with self.lock:
+            entries = self.entries if entries is None else entries
+            fd, temp_filename = tempfile.mkstemp(dir=self.folder, prefix=".", suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for name, metadata in sorted(entries.items()):
+                        f.write(self.line(name, metadata))
+                os.replace(temp_filename, self.path)
+            except BaseException:
+                os.remove(temp_filename)
+                raise
+            self.inode = None
+        self.refresh()
+
+
+MANIFESTS: OrderedDict[str, Manifest] = OrderedDict()
+MANIFESTS_LOCK = threading.Lock()
+
+
+def fold_sidecars(folder: str, remove: bool = False) -> int:
+    """
+    Folds the json sidecars of the images in a folder and its subfolders into a manifest per folder, dropping entries
+    of images that no longer exist. Entries already in a manifest win over sidecars. With remove, the sidecars are
+    deleted once their manifest has been written. Returns the number of sidecars folded.
+    """
+    count = 0
+    for path, folders, filenames in os.walk(folder):
+        folders[:] = [name for name in folders if not name.startswith(".")]
+        images = {name for name in filenames if os.path.splitext(name)[1].lower() in SUPPORTED_IMAGE_FORMATS}
+        sidecars = [name for name in filenames if name.endswith(".json") and name[: -len(".json")] in images]
+        if not sidecars:
+            continue
+
+        manifest = Manifest.for_folder(path)
+        entries = {name: metadata for name, metadata in manifest.entries.items() if name in images}
+        for sidecar in sidecars:
+            try:
+                with open(os.path.join(path, sidecar)) as f:
+                    entries.setdefault(sidecar[: -len(".json")], json.loads(f.read()))
+            except (OSError, ValueError):
+                continue
+            count += 1
+        manifest.compact(entries)
+
+        if remove:
+            for sidecar in sidecars:
+                if sidecar[: -len(".json")] in manifest:
+                    os.remove(os.path.join(path, sidecar))
+    return count
+
+
+class Manifests(dict):
+    """
+    The manifests of the folders met during a single pass over a library, so each is refreshed only once.
+    """
+
+    def __missing__(self, folder: str) -> Manifest:
+        manifest = self[folder] = Manifest.for_folder(folder)
+        return manifest
+
+    def of(self, filename: str) -> tuple[Manifest, str]:
+        return self[os.path.dirname(filename)], os.path.basename(filename)
@@ -0,0 +1,341 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Iterator
+
+from .config import SUPPORTED_IMAGE_FORMATS, get_state_folder
+from .index import ImageIndex, intern_keywords, normalize_path
+from .manifest import MANIFEST_FILENAME
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from .services import DemoImage
+
+MAPPED_INDEX_FILENAME = ".index.mmap"
+MAGIC = b"DPINDEX2"
+SECTIONS = ("records", "keywords", "image_keywords", "postings", "paths", "urls", "hashes", "strings")
+
+# Magic, byte order, signature of the folder, image and keyword count, then the offset and size of every section.
+HEADER = struct.Struct("=8s8s16sQQ" + "QQ" * len(SECTIONS))
+# Path, url, content hash, provider and metadata as (offset, length) into the strings, then width, height and keyword ids.
+RECORD = struct.Struct("=QIQIQIQIQIIIII")
+# Name as (offset, length) into the strings, then the position and length of its ids in the postings.
+KEYWORD = struct.Struct("=QIII")
+
+
+def key_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "little")
+
+
+def folder_signature(folder: str) -> bytes:
+    """
+    Returns a digest of the path, mtime and size of every image in a folder, and of the sidecars and manifests holding
+    their metadata, which changes whenever scanning the folder could give a different index. Files are only stat'ed.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with metrics.timer("mapped.signature"):
+        for path, folders, filenames in os.walk(folder):
+            folders.sort()
+            for name in sorted(filenames):
+                image_name = name[: -len(".json")] if name.endswith(".json") else name
+                if name != MANIFEST_FILENAME and os.path.splitext(image_name)[1].lower() not in SUPPORTED_IMAGE_FORMATS:
+                    continue
+                try:
+                    stat = os.stat(os.path.join(path, name))
+                except OSError:
+                    continue
+                digest.update(f"{os.path.relpath(os.path.join(path, name), folder)}\0{stat.st_mtime_ns}\0{stat.st_size}\n".encode())
+    return digest.digest()
+
+
+def mapped_index_path(folder: str) -> str:
+    return os.path.join(get_state_folder(folder), MAPPED_INDEX_FILENAME)
+
+
+def write_mapped_index(folder: str, index: ImageIndex, blobs: dict[int, bytes] | None = None, signature: bytes | None = None) -> str:
+    """
+    Writes the images in an index to a file that other processes can map into memory with MappedIndex, replacing
+    it atomically. The metadata of each image is taken from blobs, by image id, or read from the image's manifest or sidecar.
+    The file is stamped with the signature of the folder, see folder_signature(), which should be taken before the folder
+    was read, so changes made while it was being read make the file stale. Without one it's taken now.
+    """
+    blobs = blobs or {}
+    signature = signature or folder_signature(folder)
+    strings = bytearray()
+
+    def string(value: str | bytes | None) -> tuple[int, int]:
+        data = value.encode() if isinstance(value, str) else value or b""
+        offset = len(strings)
+        strings.extend(data)
+        return offset, len(data)
+
+    with metrics.timer("mapped.write"):
+        ids = sorted(index.all_ids())
+        keywords = sorted(index.keywords)
+        keyword_ids = {keyword: i for i, keyword in enumerate(keywords)}
+        records, image_keywords = bytearray(), bytearray()
+        lookups: dict[str, list[tuple[int, int]]] = {"paths": [], "urls": [], "hashes": []}
+        urls, hashes = set(), set()
+        postings: dict[str, list[int]] = {keyword: [] for keyword in keywords}
+        for new_id, image_id in enumerate(ids):
+            image = index.images[image_id]
+            blob = blobs.get(image_id) or json.dumps(image.metadata).encode()  # type: ignore NOQA
+            start = len(image_keywords) // 4
+            for keyword in image.keywords:  # type: ignore NOQA
+                image_keywords += struct.pack("=I", keyword_ids[keyword])
+                postings[keyword].append(new_id)
+            fields = (image.filename, image.url, image.content_hash, image.provider, blob)  # type: ignore NOQA
+            records += RECORD.pack(*(part for field in fields for part in string(field)), image.width, image.height, start, len(image.keywords))  # type: ignore NOQA
+            lookups["paths"].append((key_hash(normalize_path(image.filename)), new_id))  # type: ignore NOQA
+            # Like the index, a url or hash shared by several images points to the first one.
+            if image.url and image.url not in urls:  # type: ignore NOQA
+                urls.add(image.url)  # type: ignore NOQA
+                lookups["urls"].append((key_hash(image.url), new_id))  # type: ignore NOQA
+            if image.content_hash and image.content_hash not in hashes:  # type: ignore NOQA
+                hashes.add(image.content_hash)  # type: ignore NOQA
+                lookups["hashes"].append((key_hash(image.content_hash), new_id))  # type: ignore NOQA
+
+        sections = {"records": records, "image_keywords": image_keywords, "keywords": bytearray(), "postings": bytearray()}
+        for keyword in keywords:
+            sections["keywords"] += KEYWORD.pack(*string(keyword), len(sections["postings"]) // 4, len(postings[keyword]))
+            sections["postings"] += struct.pack(f"={len(postings[keyword])}I", *postings[keyword])
+        for name, entries in lookups.items():
+            entries.sort()
+            sections[name] = bytearray(struct.pack(f"={len(entries)}Q", *(key for key, _ in entries)))
+            sections[name] += struct.pack(f"={len(entries)}I", *(image_id for _, image_id in entries))
+        sections["strings"] = strings
+
+        layout, offset = [], HEADER.size
+        for name in SECTIONS:
+            offset += -offset % 8
+            layout += [offset, len(sections[name])]
+            offset += len(sections[name])
+
+        path = mapped_index_path(folder)
+        fd, temp_filename = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(HEADER.pack(MAGIC, sys.byteorder.encode(), signature, len(ids), len(keywords), *layout))
+                for name, section_offset in zip(SECTIONS, layout[::2]):
+                    f.write(bytes(section_offset - f.tell()))
+                    f.write(sections[name])
+                metrics.count("bytes.written", f.tell())
+            os.replace(temp_filename, path)
+        except BaseException:
+            os.remove(temp_filename)
+            raise
+    return path
+
+
+class MappedImages:
+    """
+    The images of a mapped index by id. Images are created from their record on every access and not kept.
+    """
+
+    def __init__(self, index: "MappedIndex"):
+        self.index = index
+
+    def __len__(self) -> int:
+        return self.index.image_count
+
+    def __getitem__(self, image_id: int) -> "DemoImage":
+        if not 0 <= image_id < self.index.image_count:
+            raise IndexError(image_id)
+        return self.index.image(image_id)
+
+
+class MappedLookup:
+    """
+    Finds images by path, url or content hash, with a binary search over the sorted hashes of the keys.
+    """
+
+    def __init__(self, index: "MappedIndex", name: str, field: int, normalize=None):
+        self.index = index
+        self.field = field
+        self.normalize = normalize
+        offset, size = index.sections[name]
+        count = size // 12
+        self.keys = index.buffer[offset : offset + count * 8].cast("Q")
+        self.ids = index.buffer[offset + count * 8 : offset + count * 12].cast("I")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: str, default: int | None = None) -> int | None:
+        target = key_hash(key)
+        i = bisect_left(self.keys, target)  # type: ignore NOQA
+        while i < len(self.keys) and self.keys[i] == target:
+            image_id = self.ids[i]
+            value = self.index.string(self.index.record(image_id), self.field)
+            if (self.normalize(value) if self.normalize else value) == key:
+                return image_id
+            i += 1
+        return default
+
+    def values(self) -> Iterator[int]:
+        return iter(self.ids)
+
+
+class MappedKeywords:
+    """
+    The ids of the images tagged with each keyword, read from the postings of the mapped index.
+    """
+
+    def __init__(self, index: "MappedIndex"):
+        self.index = index
+
+    def __len__(self) -> int:
+        return len(self.index.keyword_table)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index.keyword_table)
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self.index.keyword_table
+
+    def keys(self):
+        return self.index.keyword_table.keys()
+
+    def get(self, keyword: str, default=None):
+        if (entry := self.index.keyword_table.get(keyword)) is None:
+            return default
+        start, count = entry
+        return frozenset(self.index.postings[start : start + count])
+
+    def items(self) -> Iterator[tuple[str, frozenset[int]]]:
+        return ((keyword, self.get(keyword)) for keyword in self.index.keyword_table)  # type: ignore NOQA
+
+
+class MappedIndex(ImageIndex):
+    """
+    An ImageIndex read from a file written by write_mapped_index, mapped into memory read-only. Opening it only reads
+    the header and the keyword table, and the pages holding the records, postings, paths and metadata are shared by
+    every process that maps the same file, instead of each process scanning the folder and keeping its own copy.
+
+    The first change to the index copies it into memory, so the process carries on with a private, writable index.
+    Changes to the folder aren't picked up, for_folder() only opens the file if the folder hasn't changed since.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, byteorder, self.signature, self.image_count, keyword_count, *layout = HEADER.unpack_from(self.map)
+        if magic != MAGIC or byteorder.rstrip(b"\0").decode() != sys.byteorder:
+            raise ValueError(f"{path} is not an image index written on this platform")
+
+        self.path = path
+        self.buffer = memoryview(self.map)
+        self.sections = {name: (layout[i * 2], layout[i * 2 + 1]) for i, name in enumerate(SECTIONS)}
+        self.strings = self.sections["strings"][0]
+        offset, size = self.sections["image_keywords"]
+        self.image_keywords = self.buffer[offset : offset + size].cast("I")
+        offset, size = self.sections["postings"]
+        self.postings = self.buffer[offset : offset + size].cast("I")
+        offset = self.sections["keywords"][0]
+        self.keyword_names: list[str] = []
+        self.keyword_table: dict[str, tuple[int, int]] = {}
+        for i in range(keyword_count):
+            name_offset, name_length, start, count = KEYWORD.unpack_from(self.map, offset + i * KEYWORD.size)
+            name = sys.intern(self.map[self.strings + name_offset : self.strings + name_offset + name_length].decode())
+            self.keyword_names.append(name)
+            self.keyword_table[name] = (start, count)
+
+        self.images = MappedImages(self)  # type: ignore NOQA
+        self.ids = MappedLookup(self, "paths", 0, normalize_path)  # type: ignore NOQA
+        self.urls = MappedLookup(self, "urls", 1)  # type: ignore NOQA
+        self.hashes = MappedLookup(self, "hashes", 2)  # type: ignore NOQA
+        self.keywords = MappedKeywords(self)  # type: ignore NOQA
+        self.version = 0
+        self.mapped = True
+
+    @classmethod
+    def for_folder(cls, folder: str) -> "MappedIndex | None":
+        """
+        Returns the mapped index of a folder, or None if it has none, it can't be read, or it's stale because images
+        or their metadata changed since it was written.
+        """
+        try:
+            with metrics.timer("mapped.open"):
+                index = cls(mapped_index_path(folder))
+        except (OSError, ValueError, struct.error):
+            return None
+        if index.signature != folder_signature(folder):
+            metrics.count("mapped.stale")
+            return None
+        return index
+
+    def record(self, image_id: int) -> tuple:
+        return RECORD.unpack_from(self.map, self.sections["records"][0] + image_id * RECORD.size)
+
+    def string(self, record: tuple, field: int) -> str:
+        offset, length = record[field * 2], record[field * 2 + 1]
+        return self.map[self.strings + offset : self.strings + offset + length].decode()
+
+    def image(self, image_id: int) -> "DemoImage":
+        from .services import DemoImage
+
+        record = self.record(image_id)
+        filename, url, content_hash, provider = (self.string(record, field) for field in range(4))
+        width, height, start, count = record[10:]
+        offset, length = record[8:10]
+        return DemoImage.from_record(
+            filename,
+            intern_keywords(self.keyword_names[keyword_id] for keyword_id in self.image_keywords[start : start + count]),
+            provider,
+            url or None,
+            content_hash or None,
+            width,
+            height,
+            self.map[self.strings + offset : self.strings + offset + length],
+        )
+
+    def thaw(self) -> None:
+        """
+        Copies the images into a regular, writable index, leaving the ids as they were.
+        """
+        if not self.mapped:
+            return
+        with metrics.timer("mapped.thaw"):
+            images = [self.image(image_id) for image_id in range(self.image_count)]
+            version = self.version
+            ImageIndex.__init__(self)
+            self.mapped = False
+            for image in images:
+                image.metadata = None  # type: ignore NOQA
+                ImageIndex.add(self, image)
+            self.version = version + 1
+
+    def add(self, image: "DemoImage") -> int:
+        self.thaw()
+        return super().add(image)
+
+    def remove(self, filename: str) -> "DemoImage | None":
+        if self.mapped and filename not in self:
+            return None
+        self.thaw()
+        return super().remove(filename)
+
+    def count(self, keyword: str | None = None) -> int:
+        if not self.mapped:
+            return super().count(keyword)
+        if keyword is None:
+            return self.image_count
+        return self.keyword_table.get(keyword, (0, 0))[1]
+
+    def counts(self) -> dict[str, int]:
+        if not self.mapped:
+            return super().counts()
+        return {keyword: count for keyword, (_, count) in self.keyword_table.items()}
+
+    def all_ids(self) -> set[int]:
+        if not self.mapped:
+            return super().all_ids()
+        return set(range(self.image_count))
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+REPORT_FORMATS = ("text", "json", "prometheus")
+
+
+class Metrics:
+    """
+    Thread-safe timers and counters for the hot paths, like scanning, importing and downloading.
+    Timers record how many times an operation ran and the total time spent, counters track things
+    like bytes read and written, database queries and cache hits and misses.
+    """
+
+    def __init__(self, prefix: str = "demoprovider"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters: dict[str, float] = {}
+            self.timers: dict[str, list[float]] = {}
+            self.started = time.monotonic()
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, name: str, seconds: float) -> None:
+        with self.lock:
+            timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "elapsed": time.monotonic() - self.started,
+                "counters": dict(self.counters),
+                "timers": {name: {"count": int(count), "total": total, "max": longest} for name, (count, total, longest) in self.timers.items()},
+            }
+
+    def summary(self) -> str:
+        snapshot = self.snapshot()
+        lines = [f"Run took {snapshot['elapsed']:.2f}s"]
+        for name, timer in sorted(snapshot["timers"].items(), key=lambda item: -item[1]["total"]):
+            lines.append(f"  {name:<28} {timer['count']:>8} calls {timer['total']:>10.3f}s total {timer['total'] / timer['count'] * 1000:>10.3f}ms avg")
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"  {name:<28} {value:>12g}")
+        return "\n".join(lines)
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = self.metric_name(name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value:g}"]
+        for name, timer in sorted(snapshot["timers"].items()):
+            metric = self.metric_name(name) + "_seconds"
+            lines += [f"# TYPE {metric} summary", f"{metric}_count {timer['count']}", f"{metric}_sum {timer['total']:.6f}"]
+        return "\n".join(lines) + "\n"
+
+    def metric_name(self, name: str) -> str:
+        return f"{self.prefix}_{name}".replace(".", "_").replace("-", "_")
+
+    def report(self, format: str = "text") -> str:
+        return {"text": self.summary, "json": self.to_json, "prometheus": self.to_prometheus}[format]()
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def track_queries() -> Iterator[None]:
+    """
+    Counts database queries, and the time spent on them, on every connection while active, including connections opened by worker threads.
+    """
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    def wrapper(execute, sql, params, many, context):
+        with metrics.timer("db.query"):
+            return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+    for connection in connections.all(initialized_only=True):
+        install(None, connection)
+    connection_created.connect(install, weak=False)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(install)
+        for connection in connections.all(initialized_only=True):
+            if wrapper in connection.execute_wrappers:
+                connection.execute_wrappers.remove(wrapper)
+
+
+@contextmanager
+def collect(format: str | None = None) -> Iterator[None]:
+    """
+    Resets the metrics, tracks database queries and prints a report in the given format when done. Does nothing without a format.
+    """
+    if not format:
+        yield
+        return
+
+    metrics.reset()
+    try:
+        with track_queries():
+            yield
+    finally:
+        print(metrics.report(format))
@@ -0,0 +1,131 @@
+import struct
+from typing import BinaryIO
+
+# JPEG start-of-frame markers, which carry the image dimensions.
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# ISOBMFF boxes to descend into when looking for the AVIF 'ispe' (image spatial extents) property.
+AVIF_CONTAINER_BOXES = {b"meta": 4, b"iprp": 0, b"ipco": 0}
+
+
+def _png_size(f: BinaryIO) -> tuple[int, int] | None:
+    header = f.read(24)
+    if len(header) == 24 and header[12:16] == b"IHDR":
+        return struct.unpack(">II", header[16:24])
+    return None
+
+
+def _jpeg_size(f: BinaryIO) -> tuple[int, int] | None:
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) != 2 or marker[0] != 0xFF:
+            return None
+        # Skip fill bytes.
+        while marker[1] == 0xFF:
+            marker = marker[1:] + f.read(1)
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        length = f.read(2)
+        if len(length) != 2:
+            return None
+        (length,) = struct.unpack(">H", length)
+        if marker[1] in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) != 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            return width, height
+        f.seek(length - 2, 1)
+
+
+def _webp_size(f: BinaryIO) -> tuple[int, int] | None:
+    f.seek(12)
+    chunk = f.read(4)
+    data = f.read(26)
+    if chunk == b"VP8 " and len(data) >= 14 and data[7:10] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", data[10:14])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(data) >= 9 and data[4] == 0x2F:
+        bits = int.from_bytes(data[5:9], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(data) >= 14:
+        return int.from_bytes(data[8:11], "little") + 1, int.from_bytes(data[11:14], "little") + 1
+    return None
+
+
+def _avif_size(f: BinaryIO, end: int | None = None) -> tuple[int, int] | None:
+    while end is None or f.tell() < end:
+        header = f.read(8)
+        if len(header) != 8:
+            return None
+        start = f.tell() - 8
+        size, box = struct.unpack(">I4s", header)
+        if size == 1:
+            (size,) = struct.unpack(">Q", f.read(8))
+        elif size == 0:
+            return None
+        if box == b"ispe":
+            data = f.read(12)
+            return struct.unpack(">II", data[4:12]) if len(data) == 12 else None
+        if box in AVIF_CONTAINER_BOXES:
+            f.seek(AVIF_CONTAINER_BOXES[box], 1)
+            if result := _avif_size(f, start + size):
+                return result
+        f.seek(start + size)
+    return None
+
+
+def probe_format(f: BinaryIO) -> str | None:
+    """
+    Returns the format of an image from its signature, "jpeg", "png", "webp", "avif" or "gif", or None if it isn't recognized.
+    """
+    f.seek(0)
+    head = f.read(12)
+    f.seek(0)
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith(b"\xff\xd8"):
+        return "jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+        return "avif"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return None
+
+
+def probe_size(f: BinaryIO) -> tuple[int, int] | None:
+    """
+    Reads the dimensions of a JPEG, PNG, WebP or AVIF image from its headers only,
+    returning None if the format isn't recognized.
+    """
+    f.seek(0)
+    head = f.read(12)
+    f.seek(0)
+    try:
+        if head.startswith(b"\x89PNG\r\n\x1a\n"):
+            return _png_size(f)
+        if head.startswith(b"\xff\xd8"):
+            return _jpeg_size(f)
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            return _webp_size(f)
+        if head[4:8] == b"ftyp":
+            return _avif_size(f)
+    except struct.error:
+        pass
+    return None
+
+
+def image_size(filename: str) -> tuple[int, int]:
+    """
+    Returns the width and height of an image, reading only its headers when possible and falling back to willow.
+    """
+    with open(filename, "rb") as f:
+        if size := probe_size(f):
+            return size
+        f.seek(0)
+        import willow
+
+        return willow.Image.open(f).get_size()
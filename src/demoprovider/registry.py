@@ -0,0 +1,172 @@
+import importlib
+import importlib.util
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from graphlib import TopologicalSorter
+from types import ModuleType
+from typing import Any, Callable
+
+from django.apps import apps
+from django.db import connections, transaction
+
+from .metrics import metrics
+
+DEMO_MODULE = "demo"
+
+
+@dataclass
+class DemoProvider:
+    """
+    The demo module of an app. A demo module defines a run function, and can optionally declare the apps
+    whose demo data it needs, DEPENDS_ON = ["home"], and a relative cost, COST = 10, used to start
+    expensive providers first.
+
+    A module can also define a prepare function for work that doesn't touch the database, like picking and
+    converting image files. It's started right away, alongside the other demos, and whatever it returns is
+    passed to run.
+    """
+
+    app_label: str
+    module: ModuleType
+    depends_on: tuple[str, ...] = ()
+    cost: float = 1
+
+    @classmethod
+    def from_module(cls, app_label: str, module: ModuleType) -> "DemoProvider":
+        return cls(app_label=app_label, module=module, depends_on=tuple(getattr(module, "DEPENDS_ON", ())), cost=getattr(module, "COST", 1))
+
+    @property
+    def prepares(self) -> bool:
+        return callable(getattr(self.module, "prepare", None))
+
+    def prepare(self) -> Any:
+        try:
+            with metrics.timer(f"demo.{self.app_label}.prepare"):
+                return getattr(self.module, "prepare")()
+        finally:
+            connections.close_all()
+
+    def run(self, prepared: Any = None) -> None:
+        if self.prepares:
+            getattr(self.module, "run")(prepared)
+        else:
+            getattr(self.module, "run")()
+
+
+def discover_providers(log: Callable[[str], None] = print) -> dict[str, DemoProvider]:
+    """
+    Returns the demo providers of all installed apps by label. Only apps that actually have a demo module are imported.
+    """
+    providers = {}
+    for app in apps.get_app_configs():
+        name = f"{app.name}.{DEMO_MODULE}"
+        try:
+            if importlib.util.find_spec(name) is None:
+                continue
+            providers[app.label] = DemoProvider.from_module(app.label, importlib.import_module(name))
+        except ImportError as ex:
+            log(f"Skipping demo from {app.name}: {ex}")
+    return providers
+
+
+@dataclass
+class DemoScheduler:
+    """
+    Runs demo providers in dependency order, each in its own transaction. With more than one worker, providers
+    that don't depend on each other run concurrently in threads, each thread using its own database connection.
+    SQLite only allows one writer at a time, so on SQLite the providers still only write one at a time, and only
+    their prepare functions overlap. A provider is skipped if any provider it depends on failed.
+
+    The prepare functions of all providers are started first, in a pool of as many threads as there are workers,
+    so they overlap with the providers creating pages, even with a single worker.
+    """
+
+    providers: dict[str, DemoProvider]
+    workers: int = 1
+    verbose: bool = False
+    errors: dict[str, Exception] = field(default_factory=dict)
+    skipped: set[str] = field(default_factory=set)
+    prepared: dict[str, Future] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.write_lock = threading.Lock() if self.workers > 1 and connections["default"].vendor == "sqlite" else nullcontext()
+
+    def log(self, msg: str) -> None:
+        if self.verbose:
+            logging.info(msg)
+
+    def graph(self) -> TopologicalSorter:
+        # Dependencies on apps without a demo module are satisfied by definition.
+        return TopologicalSorter({label: [d for d in provider.depends_on if d in self.providers] for label, provider in self.providers.items()})
+
+    def order(self) -> list[str]:
+        """
+        Returns the labels of the providers in the order they'd run with a single worker. Raises graphlib.CycleError on cyclic dependencies.
+        """
+        return list(self.graph().static_order())
+
+    def execute(self, label: str) -> None:
+        self.log(f"Running demo from {label}")
+        try:
+            prepared = (future := self.prepared.get(label)) and future.result()
+            with self.write_lock, metrics.timer(f"demo.{label}"), transaction.atomic():
+                self.providers[label].run(prepared)
+        finally:
+            if self.workers > 1:
+                connections.close_all()
+
+    def runnable(self, label: str) -> bool:
+        failed = [d for d in self.providers[label].depends_on if d in self.errors or d in self.skipped]
+        if failed:
+            self.skipped.add(label)
+            logging.warning(f"Skipping demo from {label}, depends on failed {', '.join(failed)}")
+        return not failed
+
+    def run(self) -> dict[str, Exception]:
+        """
+        Runs all providers, returning the exceptions raised by the ones that failed.
+        """
+        with ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="prepare") as preparer:
+            self.prepared = {label: preparer.submit(provider.prepare) for label, provider in self.providers.items() if provider.prepares}
+            try:
+                return self.run_providers()
+            finally:
+                for future in self.prepared.values():
+                    future.cancel()
+
+    def run_providers(self) -> dict[str, Exception]:
+        if self.workers <= 1:
+            for label in self.order():
+                if self.runnable(label):
+                    try:
+                        self.execute(label)
+                    except Exception as ex:
+                        self.errors[label] = ex
+                        logging.error(f"Demo from {label} failed: {ex}")
+            return self.errors
+
+        graph = self.graph()
+        graph.prepare()
+        running: dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while graph.is_active():
+                ready = sorted(graph.get_ready(), key=lambda label: -self.providers[label].cost)
+                for label in ready:
+                    if self.runnable(label):
+                        running[executor.submit(self.execute, label)] = label
+                    else:
+                        graph.done(label)
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    label = running.pop(future)
+                    if (ex := future.exception()) is not None:
+                        self.errors[label] = ex  # type: ignore NOQA
+                        logging.error(f"Demo from {label} failed: {ex}")
+                    graph.done(label)
+        return self.errors
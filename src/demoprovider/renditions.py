@@ -0,0 +1,103 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Sequence
+
+from django.db import connection, connections
+from wagtail.images import get_image_model
+
+from .config import get_setting
+from .metrics import metrics
+from .utils import chunked
+
+
+def default_filter_specs() -> list[str]:
+    """
+    Returns the filter specs set in DEMO-PROVIDER-RENDITIONS, a comma-separated list like "fill-300x200,width-800".
+    """
+    return parse_filter_specs(get_setting("DEMO-PROVIDER-RENDITIONS", ""))
+
+
+def parse_filter_specs(value: str | Sequence[str] | None) -> list[str]:
+    if isinstance(value, str):
+        value = value.split(",")
+    return [spec.strip() for spec in value or () if spec.strip()]
+
+
+def warm_images(image_ids: Sequence[int], filter_specs: Sequence[str]) -> int:
+    """
+    Creates the missing renditions of the images, returning the number of images handled. Existing renditions
+    are prefetched, and wagtail creates all missing renditions of an image with a single bulk insert.
+    """
+    count = 0
+    for image in get_image_model().objects.filter(pk__in=image_ids).prefetch_related("renditions"):
+        try:
+            with metrics.timer("rendition"):
+                if hasattr(image, "get_renditions"):
+                    image.get_renditions(*filter_specs)
+                else:
+                    for spec in filter_specs:
+                        image.get_rendition(spec)
+            count += 1
+        except Exception as ex:
+            logging.warning(f"Error creating renditions for {image}: {ex}")
+    return count
+
+
+def _init_worker() -> None:
+    import django
+    from django.apps import apps
+
+    # Spawned workers start without django, forked workers must not share the parent's database connections.
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+class RenditionWarmer:
+    """
+    Pre-generates renditions for freshly imported images, so the first page views don't have to.
+    With workers set, batches of images are handled by a pool of processes, except inside a transaction, where the
+    workers' own connections couldn't see the new images and closing the connections would break the transaction.
+    """
+
+    def __init__(self, filter_specs: Sequence[str] | str | None = None, workers: int = 0, batch_size: int = 50, verbose: bool = False):
+        self.filter_specs = parse_filter_specs(filter_specs) if filter_specs is not None else default_filter_specs()
+        self.workers = workers
+        self.batch_size = max(1, batch_size)
+        self.verbose = verbose
+
+    def log(self, msg: str) -> None:
+        if self.verbose:
+            logging.info(msg)
+
+    def __bool__(self) -> bool:
+        return bool(self.filter_specs)
+
+    def warm(self, image_ids: Iterable[int]) -> int:
+        """
+        Creates the renditions for the images, returning the number of images handled.
+        """
+        if not self.filter_specs:
+            return 0
+
+        batches = list(chunked(image_ids, self.batch_size))
+        if self.workers <= 1 or connection.in_atomic_block:
+            count = sum(warm_images(batch, self.filter_specs) for batch in batches)
+        else:
+            connections.close_all()
+            context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker) as executor:
+                count = sum(executor.map(warm_images, batches, [self.filter_specs] * len(batches)))
+        self.log(f"+ Created {', '.join(self.filter_specs)} renditions for {count} images")
+        return count
+
+    def warm_new(self, after_id: int) -> int:
+        """
+        Creates the renditions for all images added after the image with the given id.
+        """
+        return self.warm(get_image_model().objects.filter(pk__gt=after_id).order_by("pk").values_list("pk", flat=True).iterator())
+
+    @classmethod
+    def last_image_id(cls) -> int:
+        return get_image_model().objects.order_by("-pk").values_list("pk", flat=True).first() or 0
@@ -0,0 +1,90 @@
+import logging
+from typing import Sequence
+
+from wagtail.models import Collection
+
+from .metrics import metrics
+
+
+class CollectionResolver:
+    """
+    Resolves paths of collection names, like ("Travel", "Norway"), to collections below the root collection.
+
+    The existing collection tree is loaded with a single query the first time it's needed and every lookup
+    is memoized, so only collections that are missing cost any further queries, once each.
+    """
+
+    def __init__(self, verbose: bool = False):
+        self.verbose = verbose
+        self.paths: dict[tuple[str, ...], Collection] | None = None
+        self.names: dict[str, Collection] = {}
+        self.keys: dict[int, tuple[str, ...]] = {}
+
+    def log(self, msg: str) -> None:
+        if self.verbose:
+            logging.info(msg)
+
+    def load(self) -> None:
+        with metrics.timer("load_collections"):
+            self._load()
+
+    def _load(self) -> None:
+        root = Collection.get_first_root_node()
+        self.paths = {(): root}
+        self.names = {}
+        self.keys = {root.pk: ()}
+        keys = {root.path: ()}
+        # Ordering by the materialized path gives us every parent before its children.
+        for collection in Collection.objects.filter(path__startswith=root.path, depth__gt=root.depth).order_by("path"):
+            parent_key = keys.get(collection.path[: -Collection.steplen])
+            if parent_key is None:
+                continue
+            key = parent_key + (collection.name,)
+            keys[collection.path] = key
+            self.paths.setdefault(key, collection)
+            self.keys[collection.pk] = key
+            self.names.setdefault(collection.name, collection)
+
+    def resolve(self, names: Sequence[str]) -> Collection:
+        """
+        Returns the collection for the given path of names, creating any missing collections along the way.
+        """
+        if self.paths is None:
+            self.load()
+
+        key = tuple(names)
+        if (collection := self.paths.get(key)) is not None:  # type: ignore NOQA
+            metrics.count("collections.hits")
+            return collection
+
+        metrics.count("collections.misses")
+        parent = self.resolve(key[:-1])
+        with metrics.timer("create_collection"):
+            collection = parent.add_child(name=key[-1])
+        self.paths[key] = collection  # type: ignore NOQA
+        self.keys[collection.pk] = key
+        self.names.setdefault(collection.name, collection)
+        self.log(f"Adding collection '{collection}'")
+        return collection
+
+    def key(self, collection: Collection) -> tuple[str, ...]:
+        """
+        Returns the path of names leading to a collection.
+        """
+        if self.paths is None:
+            self.load()
+
+        if (key := self.keys.get(collection.pk)) is None:
+            key = self.keys[collection.pk] = tuple(c.name for c in collection.get_ancestors()[1:]) + (collection.name,)
+        return key
+
+    def get(self, name: str) -> Collection:
+        """
+        Returns a collection by name, wherever it is in the tree.
+        """
+        if self.paths is None:
+            self.load()
+
+        if (collection := self.names.get(name)) is None:
+            collection = self.names[name] = Collection.objects.get(name=name)
+        return collection
@@ -0,0 +1,141 @@
+import random
+from typing import TYPE_CHECKING, Sequence
+
+if TYPE_CHECKING:
+    from .index import ImageIndex
+    from .services import DemoImage
+
+
+class AliasTable:
+    """
+    Walker's alias method for drawing from a discrete distribution in O(1) per draw, after O(n) setup.
+    """
+
+    def __init__(self, weights: Sequence[float]):
+        count = len(weights)
+        total = float(sum(weights))
+        if not count or total <= 0:
+            raise ValueError("At least one positive weight is required")
+
+        self.probabilities = [0.0] * count
+        self.aliases = [0] * count
+        scaled = [weight * count / total for weight in weights]
+        small = [i for i, weight in enumerate(scaled) if weight < 1]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+        for i in small + large:
+            self.probabilities[i] = 1.0
+
+    def draw(self, rng: random.Random) -> int:
+        i = rng.randrange(len(self.probabilities))
+        return i if rng.random() < self.probabilities[i] else self.aliases[i]
+
+
+class Pool:
+    """
+    An array of image ids drawn without replacement using a partial Fisher-Yates shuffle, so each draw is O(1).
+    """
+
+    def __init__(self, ids: list[int]):
+        self.ids = ids
+        self.remaining = len(ids)
+
+    def __bool__(self) -> bool:
+        return self.remaining > 0
+
+    def draw(self, rng: random.Random) -> int:
+        i = rng.randrange(self.remaining)
+        self.remaining -= 1
+        self.ids[i], self.ids[self.remaining] = self.ids[self.remaining], self.ids[i]
+        return self.ids[self.remaining]
+
+    def refill(self) -> None:
+        self.remaining = len(self.ids)
+
+
+class ImageSampler:
+    """
+    Draws random images from an ImageIndex. The id arrays and alias table are built once, so each draw is O(1).
+
+    With replace set to False every image is returned once before any image is repeated. With weights, a keyword
+    is first picked according to its weight and then an image tagged with it. Passing a seed makes the draws repeatable.
+    """
+
+    def __init__(
+        self,
+        index: "ImageIndex",
+        keywords: Sequence[str] = (),
+        weights: dict[str, float] | None = None,
+        replace: bool = True,
+        seed: int | None = None,
+        rng: random.Random | None = None,
+    ):
+        self.index = index
+        self.keywords = tuple(weights or keywords)
+        self.weights = weights
+        self.replace = replace
+        self.random = rng or random.Random(seed)
+        self.build()
+
+    def build(self) -> None:
+        self.version = self.index.version
+        self.used: set[int] = set()
+        if self.weights:
+            self.keywords = tuple(keyword for keyword in self.weights if self.weights[keyword] > 0 and self.index.count(keyword))
+            self.pools = [Pool(self.index.query(any_of=(keyword,))) for keyword in self.keywords]
+            self.table = self.keywords and AliasTable([self.weights[keyword] for keyword in self.keywords]) or None
+        else:
+            self.pools = [Pool(self.index.query(any_of=self.keywords))]
+            self.table = None
+
+    def __len__(self) -> int:
+        if self.version != self.index.version:
+            self.build()
+        return len(set().union(*(pool.ids for pool in self.pools)))
+
+    def draw_id(self) -> int:
+        if self.version != self.index.version:
+            self.build()
+        if not any(pool.ids for pool in self.pools):
+            raise IndexError("Cannot draw from an empty set of images")
+
+        if self.table is None:
+            pool = self.pools[0]
+            if self.replace:
+                return pool.ids[self.random.randrange(len(pool.ids))]
+            if not pool:
+                pool.refill()
+            return pool.draw(self.random)
+
+        while True:
+            i = self.table.draw(self.random)
+            pool = self.pools[i]
+            if self.replace:
+                return pool.ids[self.random.randrange(len(pool.ids))]
+            # An image can be tagged with several of the weighted keywords, so skip any already drawn through another.
+            while pool:
+                image_id = pool.draw(self.random)
+                if image_id not in self.used:
+                    self.used.add(image_id)
+                    return image_id
+            self.exhausted(i)
+
+    def exhausted(self, i: int) -> None:
+        weights = [0.0 if not pool else self.weights[keyword] for keyword, pool in zip(self.keywords, self.pools)]  # type: ignore NOQA
+        if not any(weights):
+            self.used.clear()
+            for pool in self.pools:
+                pool.refill()
+            weights = [self.weights[keyword] for keyword in self.keywords]  # type: ignore NOQA
+        self.table = AliasTable(weights)
+
+    def draw(self) -> "DemoImage":
+        return self.index.images[self.draw_id()]  # type: ignore NOQA
+
+    def sample(self, count: int) -> list["DemoImage"]:
+        return [self.draw() for _ in range(count)]
@@ -2,29 +2,92 @@ import json
 import logging
 import os
 import random
-from dataclasses import dataclass
-from io import BytesIO
-from typing import Union
-
-import willow
-from django.core.files import File
-from django.core.files.images import ImageFile
-from wagtail.images import get_image_model
-from wagtail.models import Collection
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Union
 
-from .config import SUPPORTED_IMAGE_FORMATS, get_setting
+from django.db import close_old_connections, transaction
 from redtoolbox.files import find_files
+from wagtail.models import Collection
 
-
-Image = get_image_model()
-TARGET_FOLDER = get_setting("DEMO-PROVIDER-TARGET-FOLDER", os.path.join(os.getcwd(), "demo-images"))
-logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.DEBUG)
+from .catalog import ImageCatalog, file_hash, read_metadata
+from .config import SUPPORTED_IMAGE_FORMATS, get_bool_setting, get_setting, get_target_folder
+from .importer import BulkImporter, existing_file_hashes, recover_journal
+from .index import ImageIndex, image_keywords, image_provider, intern_keywords, normalize_path
+from .journal import Journal
+from .manifest import Manifests
+from .mapped import MappedIndex, folder_signature, write_mapped_index
+from .metrics import metrics
+from .probe import image_size
+from .renditions import RenditionWarmer
+from .resolvers import CollectionResolver
+from .sampling import ImageSampler
+from .transfer import store_in_field
+from .utils import chunked
+from .watcher import Changes, FolderWatcher
+
+if TYPE_CHECKING:
+    from wagtail.images.models import AbstractImage
+
+# Samplers kept by a service, the least recently used being dropped first.
+SAMPLER_CACHE_SIZE = 64
 
 
-@dataclass
 class DemoImage:
-    filename: str
-    metadata: dict
+    """
+    An image in the library. Only the fields used for querying are kept in memory, in slots and with keywords
+    shared through an interned keyword table. The full metadata is read from the manifest or sidecar the first time it's needed.
+    """
+
+    __slots__ = ("filename", "keywords", "provider", "url", "content_hash", "width", "height", "_metadata")
+
+    def __init__(self, filename: str, metadata: dict | None = None):
+        self.filename = filename
+        self._metadata = metadata
+        metadata = metadata or {}
+        self.keywords = intern_keywords(image_keywords(metadata))
+        self.provider = image_provider(metadata)
+        self.url = metadata.get("url") or None
+        self.content_hash = metadata.get("sha1") or None
+        self.width = metadata.get("width") or 0
+        self.height = metadata.get("height") or 0
+
+    @classmethod
+    def compact(cls, filename: str, metadata: dict) -> "DemoImage":
+        """
+        Returns an image holding only the fields used for querying, leaving the metadata to be loaded on demand.
+        """
+        image = cls(filename, metadata)
+        image._metadata = None
+        return image
+
+    @classmethod
+    def from_record(
+        cls, filename: str, keywords: tuple[str, ...], provider: str, url: str | None, content_hash: str | None, width: int, height: int, metadata: bytes | None = None
+    ) -> "DemoImage":
+        """
+        Returns an image from the fields stored in a mapped index, with its metadata as the json it's decoded from when first needed.
+        """
+        image = cls.__new__(cls)
+        image.filename, image.keywords, image.provider, image.url, image.content_hash = filename, keywords, provider, url, content_hash
+        image.width, image.height, image._metadata = width, height, metadata
+        return image
+
+    def __repr__(self) -> str:
+        return f"DemoImage(filename={self.filename!r}, keywords={self.keywords!r})"
+
+    @property
+    def metadata(self) -> dict:
+        if self._metadata is None:
+            self._metadata = read_metadata(self.filename)
+        elif isinstance(self._metadata, bytes):
+            self._metadata = json.loads(self._metadata)
+        return self._metadata  # type: ignore NOQA
+
+    @metadata.setter
+    def metadata(self, metadata: dict) -> None:
+        self._metadata = metadata
 
     def get(self, key: str) -> str:
         return self.metadata.get(key, "")
@@ -33,6 +96,12 @@ class DemoImage:
     def is_valid(self) -> bool:
         return os.path.exists(self.filename)
 
+    @property
+    def size(self) -> tuple[int, int]:
+        if not (self.width and self.height):
+            self.width, self.height = image_size(self.filename)
+        return self.width, self.height
+
 
 class ImageService:
     """
@@ -40,139 +109,585 @@ class ImageService:
     or save an image to a django Image-field.
     """
 
-    def __init__(self, folder: str = TARGET_FOLDER, scan_on_creation: bool = False, verbose: bool = False):
-        self.folder = folder
+    def __init__(
+        self,
+        folder: str | None = None,
+        scan_on_creation: bool = False,
+        verbose: bool = False,
+        use_catalog: bool = True,
+        seed: int | None = None,
+        shared_index: bool | None = None,
+    ):
+        self.folder = folder or get_target_folder()
+        if seed is None and (setting := get_setting("DEMO-PROVIDER-SEED")) not in (None, ""):
+            seed = int(setting)
+        self.random = random.Random(seed)
         self.verbose = verbose
-        if scan_on_creation:
+        self.use_catalog = use_catalog
+        self.shared_index = get_bool_setting("DEMO-PROVIDER-SHARED-INDEX") if shared_index is None else shared_index
+        if scan_on_creation and not (self.shared_index and self.load()):
             self.scan()
-        else:
+        elif not scan_on_creation:
             self.reset()
 
     def info(self):
-        return {keyword: len(items) for keyword, items in self.images.items()}
+        return self.index.counts()
+
+    @property
+    def images(self) -> dict[str, list[DemoImage]]:
+        return {keyword: self.index.resolve(sorted(ids)) for keyword, ids in self.index.keywords.items()}
 
     def log(self, msg: str) -> None:
         if self.verbose:
             logging.info(msg)
 
     def reset(self) -> None:
-        self.images: dict = {}
-        self.filename_cache: Union[dict[str, None], None] = None
-        self.url_cache: Union[dict[str, None], None] = None
+        self.index = ImageIndex()
+        self.samplers: OrderedDict[tuple, ImageSampler] = OrderedDict()
+
+    def load(self) -> bool:
+        """
+        Opens the shared index written by the last scan of the folder, mapping it into memory instead of scanning.
+        Returns False if the folder has no shared index yet, or images or their metadata changed since it was written.
+        """
+        if (index := MappedIndex.for_folder(self.folder)) is None:
+            return False
+        self.reset()
+        self.index = index
+        self.log(f"* Mapped {len(index)} images from {index.path}")
+        return True
 
     def scan(self) -> None:
         self.reset()
-        for file in find_files(self.folder, extensions=SUPPORTED_IMAGE_FORMATS):
-            self.add_file(file)
+        with metrics.timer("scan"):
+            shared_index = self.shared_index and os.path.isdir(self.folder)
+            # Taken before anything is read, so files changing during the scan leave the shared index stale.
+            signature = shared_index and folder_signature(self.folder) or None
+            blobs: dict[int, bytes] = {}
+            for filename, metadata in self.read_folder():
+                image_id = self.add_file(filename, metadata)
+                if shared_index:
+                    blobs[image_id] = json.dumps(metadata).encode()
+            if shared_index:
+                write_mapped_index(self.folder, self.index, blobs, signature)
+
+    def read_folder(self) -> Iterator[tuple[str, dict]]:
+        """
+        Yields the images in the folder with their metadata, taken from the catalog for files that haven't changed.
+        """
+        files = find_files(self.folder, extensions=SUPPORTED_IMAGE_FORMATS)
+        if not self.use_catalog or not os.path.isdir(self.folder):
+            manifests = Manifests()
+            for filename in files:
+                yield filename, read_metadata(filename, manifests)
+            return
 
-    def add_file(self, filename: str) -> None:
-        metadata = {}
-        try:
-            if os.path.exists(filename + ".json"):
-                metadata = json.loads(open(filename + ".json").read())
-        except json.decoder.JSONDecodeError:
-            pass
+        with ImageCatalog.for_folder(self.folder) as catalog:
+            yield from catalog.sync(files)
+
+    def add_file(self, filename: str, metadata: dict | None = None) -> int:
+        with metrics.timer("add_file"):
+            if metadata is None:
+                metadata = read_metadata(filename)
+
+            return self.index.add(DemoImage.compact(filename, metadata))
+
+    def apply_changes(self, changes: Changes) -> None:
+        """
+        Applies changes to the folder to the index, only reading the metadata of the files added or modified.
+        """
+        for filename in changes.removed:
+            self.remove_file(filename)
+        changed = changes.added + changes.modified
+        if not self.use_catalog or not os.path.isdir(self.folder):
+            manifests = Manifests()
+            for filename in changed:
+                self.add_file(filename, read_metadata(filename, manifests))
+            return
 
-        for keyword in metadata.get("keywords", ["default"]):
-            self.images.setdefault(keyword, []).append(DemoImage(filename=filename, metadata=metadata))
+        with ImageCatalog.for_folder(self.folder) as catalog:
+            catalog.forget(changes.removed)
+            for filename, metadata in catalog.sync(changed, prune=False):
+                self.add_file(filename, metadata)
+
+    def watch(self, interval: float = 1.0, stop: threading.Event | None = None) -> Iterator[Changes]:
+        """
+        Keeps the index in sync with the folder, applying files being added, modified and removed as they happen,
+        and yielding the changes once applied, until stop is set. Files that changed since the last scan are
+        picked up first, so a long-running process can scan once and then watch. Files modified since the last
+        scan are only noticed when the folder has a catalog.
+        """
+        watcher = FolderWatcher(self.folder, interval=interval)
+        watcher.start()
+        snapshot = watcher.snapshot or {}
+        current = {normalize_path(filename) for filename in snapshot}
+        indexed = [image.filename for image in self.index.resolve(sorted(self.index.all_ids()))]
+        changes = Changes(
+            added=[filename for filename in snapshot if filename not in self.index],
+            removed=[filename for filename in indexed if normalize_path(filename) not in current],
+        )
+        if self.use_catalog and os.path.isdir(self.folder):
+            with ImageCatalog.for_folder(self.folder) as catalog:
+                entries = catalog.entries(filename for filename in snapshot if filename in self.index)
+            changes.modified = [filename for filename, entry in entries.items() if entry[:3] != snapshot[filename]]
+        if changes:
+            self.apply_changes(changes)
+            yield changes
+        for changes in watcher.watch(stop):
+            self.log(f"* {changes} in {self.folder}")
+            self.apply_changes(changes)
+            yield changes
+
+    def watch_in_background(self, interval: float = 1.0) -> threading.Event:
+        """
+        Watches the folder from a daemon thread, see watch(), returning an event that stops it when set.
+        """
+        stop = threading.Event()
+
+        def run() -> None:
+            for _ in self.watch(interval=interval, stop=stop):
+                pass
+
+        threading.Thread(target=run, name=f"watch {self.folder}", daemon=True).start()
+        return stop
+
+    def iter_images(self, *keywords: str, filter: Callable[[DemoImage], bool] | None = None) -> Iterator[DemoImage]:
+        """
+        Streams the images in the folder tagged with any of the keywords, and accepted by filter if given, without
+        adding them to the service. Metadata is taken from the catalog for files that haven't changed since the
+        last scan, so memory use stays constant no matter how large the library is.
+        """
+        catalog = self.use_catalog and os.path.isdir(self.folder) and ImageCatalog.for_folder(self.folder) or None
+        manifests = catalog.manifests if catalog else Manifests()
+        try:
+            for filename in find_files(self.folder, extensions=SUPPORTED_IMAGE_FORMATS):
+                metadata = catalog and catalog.lookup(filename)
+                if metadata is None:
+                    metadata = read_metadata(filename, manifests)
+                image = DemoImage.compact(filename, metadata)
+                if keywords and not set(keywords).intersection(image.keywords):
+                    continue
+                if filter is None or filter(image):
+                    yield image
+        finally:
+            if catalog:
+                catalog.close()
 
     def get_images_by_keywords(self, *keywords: str, limit: int | None = None) -> list[DemoImage]:
         if not keywords:
             keywords = self.get_random_keywords()
 
-        result = []
-        for keyword in keywords:
-            result.extend(self.images.get(keyword, []))
-        return limit and result[:limit] or result
+        ids = self.index.query(any_of=keywords)
+        return self.index.resolve(limit and ids[:limit] or ids)
+
+    def query(
+        self,
+        all_of: Iterable[str] = (),
+        any_of: Iterable[str] = (),
+        none_of: Iterable[str] = (),
+        orientation: str | None = None,
+        min_width: int | None = None,
+        min_height: int | None = None,
+        provider: str | None = None,
+        limit: int | None = None,
+    ) -> list[DemoImage]:
+        """
+        Returns the images tagged with all keywords in all_of, at least one keyword in any_of and none of the keywords
+        in none_of, optionally filtered on orientation ("landscape", "portrait" or "square"), minimum size and provider.
+        Each image is returned once, no matter how many of the keywords it's tagged with.
+        """
+        ids = self.index.query(all_of, any_of, none_of, orientation=orientation, min_width=min_width, min_height=min_height, provider=provider)
+        return self.index.resolve(limit and ids[:limit] or ids)
+
+    def count(self, keyword: str | None = None) -> int:
+        """
+        Returns the number of images tagged with keyword, or the number of images in total.
+        """
+        return self.index.count(keyword)
 
     @classmethod
     def assign_filename_to_image_field(cls, filename, image_field) -> None:
-        image_field.save(os.path.basename(filename), File(open(filename, "rb")))
+        store_in_field(image_field, filename)
+        image_field.instance.save()
 
     @classmethod
-    def create_wagtail_image(cls, filename, name: str | None = None) -> Image:  # type: ignore NOQA
-        name = name or ImageService.pretty_title_from_filename(os.path.basename(filename))
-        img_bytes = open(filename, "rb").read()
-        img_file = ImageFile(BytesIO(img_bytes), name=name)
-
-        im = willow.Image.open(img_file)
-        width, height = im.get_size()
-
-        img_obj = Image(title=name, file=img_file, width=width, height=height)
-        img_obj.save()
+    def create_wagtail_image(cls, filename, name: str | None = None, size: tuple[int, int] | None = None, content_hash: str | None = None) -> "AbstractImage":
+        from wagtail.images import get_image_model
+
+        Image = get_image_model()
+        with metrics.timer("create_wagtail_image"):
+            name = name or ImageService.pretty_title_from_filename(os.path.basename(filename))
+            width, height = size or image_size(filename)
+            content_hash = content_hash or file_hash(filename)
+
+            img_obj = Image(title=name, width=width, height=height, file_size=os.path.getsize(filename), file_hash=content_hash)
+            store_in_field(img_obj.file, filename)
+            img_obj.save()
         return img_obj
 
     @classmethod
-    def add_images_to_collection(cls, images: list[DemoImage], collection_name: str, root_collection_name: str | None = None) -> None:
-        root_collection = root_collection_name and Collection.objects.get(name=root_collection_name) or Collection.get_first_root_node()
-        background_collection = root_collection.add_child(name=collection_name)
+    def replace_image_file(cls, image: "AbstractImage", filename: str, size: tuple[int, int] | None = None, content_hash: str | None = None) -> None:
+        """
+        Replaces the file of a wagtail image, dropping its renditions. The old file is deleted once the change is committed.
+        """
+        old_name, storage = image.file.name, image.file.storage
+        with transaction.atomic():
+            image.renditions.all().delete()
+            store_in_field(image.file, filename)
+            image.width, image.height = size or image_size(filename)
+            image.file_size = os.path.getsize(filename)
+            image.file_hash = content_hash or file_hash(filename)
+            image.save()
+            if old_name and old_name != image.file.name:
+                transaction.on_commit(lambda: storage.delete(old_name))
+
+    @classmethod
+    def add_images_to_collection(
+        cls,
+        images: Iterable[DemoImage],
+        collection_name: str,
+        root_collection_name: str | None = None,
+        resolver: CollectionResolver | None = None,
+        renditions: RenditionWarmer | None = None,
+    ) -> None:
+        """
+        Adds the images to a new collection. If a CollectionResolver is given, collections are looked up
+        through it and an existing collection with the same name and parent is reused.
+        If a RenditionWarmer is given, its renditions are created for the new images.
+        """
+        if resolver:
+            root_collection = root_collection_name and resolver.get(root_collection_name) or resolver.resolve(())
+            background_collection = resolver.resolve(resolver.key(root_collection) + (collection_name,))
+        else:
+            root_collection = root_collection_name and Collection.objects.get(name=root_collection_name) or Collection.get_first_root_node()
+            background_collection = root_collection.add_child(name=collection_name)
+        created = []
         for image in images:
-            img = cls.create_wagtail_image(image.filename)
+            img = cls.create_wagtail_image(image.filename, size=image.size, content_hash=image.content_hash)
             img.collection = background_collection
             img.save()
+            created.append(img.pk)
+        if renditions:
+            renditions.warm(created)
 
     @classmethod
     def pretty_title_from_filename(cls, filename: str) -> str:
         return os.path.splitext(filename)[0].replace("_", " ").replace("-", " ").capitalize()
 
     def get_random_keywords(self, count: int = 10) -> tuple[str]:
-        return random.choices(tuple(self.images.keys()), k=count)  # type: ignore NOQA
+        return self.random.choices(tuple(self.index.keywords.keys()), k=count)  # type: ignore NOQA
+
+    def sampler(self, *keywords: str, weights: dict[str, float] | None = None, replace: bool = True, seed: int | None = None) -> ImageSampler:
+        """
+        Returns a sampler drawing images tagged with any of the keywords, or weighted by keyword, see ImageSampler.
+        Samplers are reused between calls with the same arguments, so drawing without replacement carries on
+        where the previous call left off. Without a seed the sampler is seeded from the service. Only the
+        SAMPLER_CACHE_SIZE samplers used last are kept.
+        """
+        key = (keywords, weights and tuple(weights.items()), replace, seed)
+        if (sampler := self.samplers.get(key)) is None:
+            rng = random.Random(self.random.getrandbits(64) if seed is None else seed)
+            sampler = self.samplers[key] = ImageSampler(self.index, keywords, weights=weights, replace=replace, rng=rng)
+            if len(self.samplers) > SAMPLER_CACHE_SIZE:
+                self.samplers.popitem(last=False)
+        else:
+            self.samplers.move_to_end(key)
+        return sampler
 
     def get_random_image(self, *keywords: str) -> DemoImage:
-        return random.choice(self.get_images_by_keywords(*keywords))
+        """
+        Returns a random image tagged with any of the keywords, or any image without keywords.
+        """
+        return self.sampler(*keywords).draw()
 
-    def get_random_images(self, *keywords: str, count: int = 10) -> list[DemoImage]:
-        if not keywords:
-            keywords = self.get_random_keywords()
-        return random.choices(self.get_images_by_keywords(*keywords), k=count)
+    def get_random_images(self, *keywords: str, count: int = 10, unique: bool = False, weights: dict[str, float] | None = None) -> list[DemoImage]:
+        """
+        Returns count random images, tagged with any of the keywords if given. With unique set no image is repeated until
+        every matching image has been used, also across calls. With weights, keywords are picked according to their weight instead.
+        """
+        return self.sampler(*keywords, weights=weights, replace=not unique).sample(count)
 
-    def init_cache(self):
-        if self.filename_cache:
-            return
+    def remove_file(self, filename: str) -> DemoImage | None:
+        return self.index.remove(filename)
+
+    def file_exists(self, filename: str, url: Union[str, None] = None, content_hash: Union[str, None] = None) -> bool:
+        """
+        Returns True if an image with the same path, source url or content hash is already in the library.
+        """
+        exists = self.index.find(filename, url, content_hash) is not None
+        metrics.count(exists and "file_exists.hits" or "file_exists.misses")
+        return exists
 
-        self.filename_cache: dict[str, None] = {}
-        self.url_cache: dict[str, None] = {}
+    def import_stream(self, images: Iterable[DemoImage], batch_size: int = 100, workers: int = 4, collection: Collection | None = None, skip_existing: bool = True) -> int:
+        """
+        Imports any iterable of images as wagtail images, like iter_images(), one batch at a time, so memory use
+        stays constant. With skip_existing, images with the same contents as an existing wagtail image, or as an
+        image imported before, are skipped, checked with one query per batch. Only the hashes of the last batch_size
+        images yielded are kept, as the images before them are in the database by the time the next batch is checked.
+        Returns the number of images created.
+        """
 
-        for keyword in self.images:
-            for image in self.images[keyword]:
-                self.filename_cache[image.filename] = None
-                if url := image.get("url"):
-                    self.url_cache[url] = None
+        def items() -> Iterator[tuple[str, Collection | None, dict]]:
+            # Hashes yielded to the importer but possibly not saved yet, as a bounded ordered set.
+            recent: OrderedDict[str, None] = OrderedDict()
+            for batch in chunked(images, batch_size):
+                hashes = [image.content_hash or file_hash(image.filename) for image in batch]
+                known_hashes = skip_existing and existing_file_hashes(hashes) or set()
+                for image, content_hash in zip(batch, hashes):
+                    if skip_existing and (content_hash in known_hashes or content_hash in recent):
+                        self.log(f"= Skipped {image.filename}, already added")
+                        continue
+                    recent[content_hash] = None
+                    if len(recent) > batch_size:
+                        recent.popitem(last=False)
+                    yield image.filename, collection, {"width": image.width, "height": image.height, "sha1": content_hash}
+
+        return BulkImporter(workers=workers, batch_size=batch_size, verbose=self.verbose).run(items())
 
-    def file_exists(self, filename: str, url: Union[str, None] = None) -> bool:
-        self.init_cache()
-        return filename in self.filename_cache or (url and url in self.url_cache)  # type: ignore NOQA
+    @classmethod
+    def is_local_folder_file(cls, folder: str, filename: str) -> bool:
+        # If the folder starts with an underscore we skip it. Simple way to control what gets
+        # add to the database.
+        parts = os.path.relpath(filename, folder).split(os.sep)
+        return not (len(parts) > 1 and parts[0].startswith("_"))
 
-    def add_local_folder(self, folder: str) -> None:
+    @classmethod
+    def local_folder_collection(cls, resolver: CollectionResolver, folder: str, filename: str) -> Collection | None:
+        # We turn subfolders into collections.
+        collections = [s.strip() for s in os.path.split(filename)[0].replace(folder, "").split(os.sep) if s.strip()]
+        return collections and resolver.resolve(collections) or None
+
+    def local_folder_files(
+        self, folder: str, skip_existing: bool = True, journal: Journal | None = None, catalog: ImageCatalog | None = None
+    ) -> Iterator[tuple[str, Collection | None, dict]]:
         """
-        Scans a local folder for supported files, adding them as wagtail images,
-        and using the folder structure to create collections in the process.
+        Yields the supported files in a local folder together with the collection matching
+        their subfolder, creating collections as needed, and their metadata.
+
+        Files are hashed through the folder's catalog, so only new or changed files are read. With skip_existing,
+        files with the same contents as an existing wagtail image, or as a file yielded before, are skipped.
+        Files recorded as done in the journal are skipped before anything is read. The folder's catalog is opened
+        unless one is given.
         """
-        for filename in find_files(folder, extensions=SUPPORTED_IMAGE_FORMATS):
-            try:
-                collections = [s.strip() for s in os.path.split(filename)[0].replace(folder, "").split(os.sep) if s.strip()]
+        if catalog is None:
+            with ImageCatalog.for_folder(folder) as catalog:
+                yield from self.local_folder_files(folder, skip_existing=skip_existing, journal=journal, catalog=catalog)
+            return
 
-                # If the folder starts with an underscore we skip it. Simple way to control what gets
-                # add to the database.
-                if collections and collections[0][0] == "_":
+        # Files skipped here stay in the catalog, only files gone from the folder are dropped.
+        filenames = list(find_files(folder, extensions=SUPPORTED_IMAGE_FORMATS))
+        catalog.prune(filenames)
+        included = [filename for filename in filenames if not (journal and filename in journal) and self.is_local_folder_file(folder, filename)]
+
+        resolver = CollectionResolver(verbose=self.verbose)
+        known_hashes = skip_existing and existing_file_hashes() or set()
+        for filename, metadata in catalog.sync(included, prune=False):
+            if content_hash := metadata.get("sha1"):
+                if content_hash in known_hashes:
+                    self.log(f"= Skipped {filename}, already added")
                     continue
+                known_hashes.add(content_hash)
 
-                # We turn subfolders into collections.
-                root_coll = None
-                if collections:
-                    root_coll = Collection.get_first_root_node()
-                    for collection in collections:
-                        children = [c for c in root_coll.get_children()]
-                        if collection not in [c.name for c in children]:
-                            root_coll = root_coll.add_child(name=collection)
-                            self.log(f"Adding collection '{root_coll}'")
-                        else:
-                            root_coll = [c for c in children if c.name == collection][0]
-
-                img = ImageService.create_wagtail_image(filename)
-                if root_coll:
-                    img.collection = root_coll
-                    img.save()
-                self.log(f"+ Added {filename}")
+            try:
+                collection = self.local_folder_collection(resolver, folder, filename)
             except Exception as ex:
                 self.log(f"Error adding {filename}: {ex}")
+                continue
+
+            yield filename, collection, metadata
+
+    def add_local_folder(
+        self,
+        folder: str,
+        workers: int = 0,
+        batch_size: int = 100,
+        skip_existing: bool = True,
+        renditions: RenditionWarmer | None = None,
+        resume: bool = False,
+    ) -> None:
+        """
+        Scans a local folder for supported files, adding them as wagtail images,
+        and using the folder structure to create collections in the process.
+        Files already added as wagtail images are skipped, so the import can be repeated safely.
+
+        With workers set the files are imported in bulk, see BulkImporter. If a RenditionWarmer
+        is given, its renditions are created for the new images once they're all added.
+
+        Completed files are recorded in a journal in the folder. With resume set, files completed by an earlier,
+        interrupted import are skipped. Files it left in media storage are removed in any case.
+        The image created from each file is recorded in the folder's catalog, see sync_local_changes.
+        """
+        if renditions:
+            last_image_id = RenditionWarmer.last_image_id()
+            self.add_local_folder(folder, workers=workers, batch_size=batch_size, skip_existing=skip_existing, resume=resume)
+            renditions.warm_new(last_image_id)
+            return
+
+        with Journal.for_folder(folder, "import", resume=resume) as journal, ImageCatalog.for_folder(folder) as catalog:
+            if count := recover_journal(journal):
+                self.log(f"- Removed {count} files left by an interrupted import")
+
+            files = self.local_folder_files(folder, skip_existing=skip_existing, journal=journal, catalog=catalog)
+            if workers:
+
+                def on_saved(saved: list) -> None:
+                    catalog.record_imports((filename, image.pk, image.file_hash) for filename, image in saved)
+
+                BulkImporter(workers=workers, batch_size=batch_size, verbose=self.verbose, journal=journal, on_saved=on_saved).run(files)
+                return
+
+            for filename, collection, metadata in files:
+                try:
+                    size = metadata.get("width") and (metadata["width"], metadata["height"]) or None
+                    img = ImageService.create_wagtail_image(filename, size=size, content_hash=metadata.get("sha1"))
+                    if collection:
+                        img.collection = collection
+                        img.save()
+                    catalog.record_imports([(filename, img.pk, img.file_hash)])
+                    journal.finish(filename)
+                    self.log(f"+ Added {filename}")
+                except Exception as ex:
+                    self.log(f"Error adding {filename}: {ex}")
+
+    def sync_local_changes(self, folder: str, changes: Changes, resolver: CollectionResolver | None = None) -> None:
+        """
+        Applies changes to a local folder to the wagtail images imported from it, as recorded in the folder's catalog, so
+        images imported from elsewhere are never touched. Added files are imported, unless an image with the same contents
+        exists, and files moved between subfolders change collection. Images whose file was modified get the new file,
+        while images whose file was removed are deleted. In both cases, if another file in the folder still has the
+        contents the image was imported from, that file keeps the image instead.
+        """
+        from wagtail.images import get_image_model
+
+        Image = get_image_model()
+        resolver = resolver or CollectionResolver(verbose=self.verbose)
+        with ImageCatalog.for_folder(folder) as catalog:
+            imported = catalog.imported(changes.modified + changes.removed)
+            catalog.forget(changes.removed)
+            new = dict(catalog.sync(changes.added + changes.modified, prune=False))
+            added = [filename for filename in changes.added if filename in new]
+
+            def release(filename: str) -> int | None:
+                """
+                Drops the image recorded for a file, handing it to a file with the contents it was imported from that has no
+                image of its own, preferring added files, which moved. Returns the id of the image if no file took it.
+                """
+                image_id, content_hash = imported[filename]
+                catalog.forget_imports([filename])
+                others = [other for other in catalog.files_with_hash(content_hash) if other != filename and self.is_local_folder_file(folder, other)]
+                taken = catalog.imported(others)
+                for other in sorted(others, key=lambda other: other not in added):
+                    if other not in taken:
+                        catalog.record_imports([(other, image_id, content_hash)])
+                        return None
+                return image_id
+
+            removed = {image_id: filename for filename in changes.removed if filename in imported and (image_id := release(filename))}
+            for filename in changes.modified:
+                metadata = new.get(filename)
+                if not metadata or filename in imported and imported[filename][1] == metadata.get("sha1"):
+                    continue
+                image = filename in imported and (image_id := release(filename)) and Image.objects.filter(pk=image_id).first()
+                if not image:
+                    added.append(filename)
+                    continue
+                try:
+                    size = metadata.get("width") and (metadata["width"], metadata["height"]) or None
+                    self.replace_image_file(image, filename, size=size, content_hash=metadata.get("sha1"))
+                    catalog.record_imports([(filename, image.pk, image.file_hash)])
+                    self.log(f"~ Updated {filename}")
+                except Exception as ex:
+                    self.log(f"Error updating {filename}: {ex}")
+
+            moved = catalog.imported(added)
+            known_hashes = existing_file_hashes(new[filename]["sha1"] for filename in added if new[filename].get("sha1"))
+            for filename in added:
+                metadata = new[filename]
+                content_hash = metadata.get("sha1")
+                try:
+                    collection = self.local_folder_collection(resolver, folder, filename) or Collection.get_first_root_node()
+                    if filename in moved:
+                        Image.objects.filter(pk=moved[filename][0]).update(collection=collection)
+                        self.log(f"> Moved {filename}")
+                        continue
+                    if content_hash in known_hashes:
+                        self.log(f"= Skipped {filename}, already added")
+                        continue
+
+                    size = metadata.get("width") and (metadata["width"], metadata["height"]) or None
+                    img = ImageService.create_wagtail_image(filename, size=size, content_hash=content_hash)
+                    img.collection = collection
+                    img.save()
+                    catalog.record_imports([(filename, img.pk, img.file_hash)])
+                    known_hashes.add(content_hash)
+                    self.log(f"+ Added {filename}")
+                except Exception as ex:
+                    self.log(f"Error adding {filename}: {ex}")
+
+        if removed:
+            for image in Image.objects.filter(pk__in=list(removed)):
+                filename = removed[image.pk]
+                image.delete()
+                self.log(f"- Removed {filename}")
+
+    @classmethod
+    def local_folder_changes(cls, folder: str, snapshot: dict[str, tuple[float, int, float]]) -> Changes:
+        """
+        Returns the files imported from a local folder that were modified or removed since, according to a FolderWatcher snapshot.
+        """
+        with ImageCatalog.for_folder(folder) as catalog:
+            imported = catalog.imported()
+            entries = catalog.entries(imported)
+        return Changes(
+            modified=[filename for filename in imported if filename in snapshot and entries.get(filename, ())[:3] != snapshot[filename]],
+            removed=[filename for filename in imported if filename not in snapshot],
+        )
+
+    def watch_local_folder(
+        self,
+        folder: str,
+        interval: float = 1.0,
+        stop: threading.Event | None = None,
+        workers: int = 0,
+        batch_size: int = 100,
+        renditions: RenditionWarmer | None = None,
+        resume: bool = False,
+    ) -> None:
+        """
+        Adds a local folder like add_local_folder, and then keeps the wagtail images in sync with it until stop is set,
+        applying only the files added, modified and removed, see sync_local_changes. Files imported before that were
+        modified or removed since are synced first.
+        """
+        watcher = FolderWatcher(folder, interval=interval, include=partial(self.is_local_folder_file, folder))
+        # Taken first, so files changing during the import are picked up afterwards.
+        watcher.start()
+        resolver = CollectionResolver(verbose=self.verbose)
+        if changes := self.local_folder_changes(folder, watcher.snapshot or {}):
+            self.log(f"* {changes} in {folder} since the last import")
+            self.sync_local_changes(folder, changes, resolver)
+        self.add_local_folder(folder, workers=workers, batch_size=batch_size, renditions=renditions, resume=resume)
+        for changes in watcher.watch(stop):
+            self.log(f"* {changes} in {folder}")
+            last_image_id = renditions and RenditionWarmer.last_image_id()
+            with metrics.timer("watch.sync"):
+                self.sync_local_changes(folder, changes, resolver)
+            if renditions:
+                renditions.warm_new(last_image_id)
+            close_old_connections()
+
+
+_shared_service: ImageService | None = None
+_shared_service_lock = threading.Lock()
+
+
+def get_image_service(seed: int | None = None) -> ImageService:
+    """
+    Returns an ImageService for the target folder shared by the whole process, scanning the folder the first time it's used.
+    The service is seeded with seed, or DEMO-PROVIDER-SEED if set, when it's created, so demo runs can be repeated.
+    """
+    global _shared_service
+    if _shared_service is None:
+        with _shared_service_lock:
+            if _shared_service is None:
+                _shared_service = ImageService(scan_on_creation=True, seed=seed)
+    return _shared_service
@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+from itertools import groupby
+from typing import Iterable, Iterator
+
+from django.apps import apps
+from django.core import serializers
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage, default_storage
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+
+from .config import get_setting
+from .metrics import metrics
+from .transfer import place_file
+from .utils import chunked
+
+ROWS_FILENAME = "rows.json"
+MEDIA_MANIFEST_FILENAME = "media.jsonl"
+MEDIA_FOLDER = "media"
+BATCH_SIZE = 500
+
+
+def get_snapshot_folder() -> str:
+    return get_setting("DEMO-PROVIDER-SNAPSHOT-FOLDER", os.path.join(os.getcwd(), "demo-snapshot"))
+
+
+def snapshot_models(extra: Iterable[str] = ()) -> list[type[models.Model]]:
+    """
+    Returns the models whose rows make up a demo site, collections, pages, revisions, sites, images and renditions,
+    and the models named in extra as "app_label.ModelName", in the order they're restored, with page types after Page.
+    References the other way, like the latest revision of a page, rely on foreign key checks being deferred to the end
+    of the transaction, as they are for the constraints Django creates.
+    """
+    from wagtail.images import get_image_model
+    from wagtail.models import Collection, Page, Revision, Site, get_page_models
+
+    image_model = get_image_model()
+    page_models = sorted((model for model in get_page_models() if model is not Page), key=lambda model: len(model._meta.get_parent_list()))
+    result = [Collection, Page, *page_models, Revision, Site, image_model, image_model.get_rendition_model()]
+    for label in extra:
+        if (model := apps.get_model(label)) not in result:
+            result.append(model)
+    return result
+
+
+def file_names(instance: models.Model) -> Iterator[str]:
+    for field in instance._meta.local_concrete_fields:
+        if isinstance(field, models.FileField) and (name := getattr(instance, field.attname).name):
+            yield name
+
+
+def snapshot_media(storage: Storage, name: str, folder: str, link: bool) -> int:
+    """
+    Puts a file from storage in the media folder of a snapshot, returning its size.
+    """
+    path = os.path.join(folder, MEDIA_FOLDER, name)
+    if os.path.exists(path):
+        os.remove(path)
+    if isinstance(storage, FileSystemStorage):
+        place_file(storage.path(name), path, link=link)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with storage.open(name, "rb") as source, open(path, "wb") as target:
+            for chunk in source.chunks():
+                target.write(chunk)
+    return os.path.getsize(path)
+
+
+def take_snapshot(folder: str, extra_models: Iterable[str] = (), link: bool = False, storage: Storage | None = None) -> tuple[int, int]:
+    """
+    Saves the rows of the demo site's models, see snapshot_models(), in a folder, with the media files they refer to
+    and a manifest of those files. Content types and other rows that differ between databases are referred to by
+    their natural keys. Returns the number of rows and files saved.
+    """
+    storage = storage or default_storage
+    os.makedirs(folder, exist_ok=True)
+    media: dict[str, int] = {}
+
+    def rows() -> Iterator[models.Model]:
+        for model in snapshot_models(extra_models):
+            for instance in model._base_manager.order_by("pk").iterator(chunk_size=BATCH_SIZE):
+                metrics.count("snapshot.rows")
+                for name in file_names(instance):
+                    if name not in media:
+                        try:
+                            media[name] = snapshot_media(storage, name, folder, link)
+                        except OSError as ex:
+                            logging.warning(f"Error saving {name} in the snapshot: {ex}")
+                yield instance
+
+    with metrics.timer("snapshot"):
+        count = 0
+        with open(os.path.join(folder, ROWS_FILENAME), "w") as f:
+            for chunk in chunked(rows(), BATCH_SIZE):
+                # One json array per line, so restoring never has to hold more than a batch of rows.
+                f.write(serializers.serialize("json", chunk, use_natural_foreign_keys=True) + "\n")
+                count += len(chunk)
+        with open(os.path.join(folder, MEDIA_MANIFEST_FILENAME), "w") as f:
+            for name, size in sorted(media.items()):
+                f.write(json.dumps({"name": name, "size": size}) + "\n")
+    metrics.count("snapshot.files", len(media))
+    return count, len(media)
+
+
+def read_rows(folder: str) -> Iterator:
+    with open(os.path.join(folder, ROWS_FILENAME)) as f:
+        for line in f:
+            if line.strip():
+                yield from serializers.deserialize("json", line)
+
+
+def restore_rows(folder: str) -> int:
+    """
+    Loads the rows of a snapshot, replacing rows with the same primary key. Rows of each model are inserted in bulk,
+    except for models inheriting from another concrete model, like page types, which are saved one at a time as
+    bulk inserts can't handle them. No signals are sent, so the search index is updated for the restored models
+    afterwards, see update_search_index(). Returns the number of rows restored.
+    """
+    count, restored = 0, []
+    for model, group in groupby(read_rows(folder), key=lambda row: type(row.object)):
+        restored.append(model)
+        for batch in chunked(group, BATCH_SIZE):
+            with metrics.timer("restore.rows"):
+                if model._meta.parents:
+                    for row in batch:
+                        row.save()
+                else:
+                    fields = [field.name for field in model._meta.local_concrete_fields if not field.primary_key]
+                    options = fields and {"update_conflicts": True, "update_fields": fields, "unique_fields": [model._meta.pk.name]} or {"ignore_conflicts": True}
+                    model._base_manager.bulk_create([row.object for row in batch], **options)
+                    for row in batch:
+                        for name, values in (row.m2m_data or {}).items():
+                            getattr(row.object, name).set(values)
+            count += len(batch)
+            metrics.count("restore.rows", len(batch))
+
+    # Rows were inserted with their primary keys, so sequences have to be moved past them, like loaddata does.
+    if statements := connection.ops.sequence_reset_sql(no_style(), restored):
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    update_search_index(restored)
+    return count
+
+
+def update_search_index(restored: Iterable[type[models.Model]]) -> None:
+    """
+    Adds the objects of the indexed models among restored to the search backends, like the update_index command.
+    """
+    from wagtail.search.backends import get_search_backends
+    from wagtail.search.index import class_is_indexed
+
+    indexed = [model for model in restored if class_is_indexed(model)]
+    for backend in get_search_backends(with_auto_update=True):
+        for model in indexed:
+            with metrics.timer("restore.search_index"):
+                for chunk in chunked(model.get_indexed_objects().order_by("pk").iterator(chunk_size=BATCH_SIZE), BATCH_SIZE):
+                    backend.add_bulk(model, chunk)
+
+
+def restore_media(folder: str, link: bool = False, storage: Storage | None = None) -> int:
+    """
+    Puts the media files of a snapshot in storage under their original names, skipping files that are already there
+    with the same size. On FileSystemStorage files are hard linked with link set, otherwise copied in the kernel,
+    which shares the blocks on filesystems supporting reflinks. Returns the number of files restored.
+    """
+    storage = storage or default_storage
+    count = 0
+    with open(os.path.join(folder, MEDIA_MANIFEST_FILENAME)) as f:
+        for line in f:
+            entry = json.loads(line)
+            name, filename = entry["name"], os.path.join(folder, MEDIA_FOLDER, entry["name"])
+            if storage.exists(name):
+                if storage.size(name) == entry["size"]:
+                    continue
+                storage.delete(name)
+            with metrics.timer("restore.media"):
+                if isinstance(storage, FileSystemStorage):
+                    if place_file(filename, path := storage.path(name), link=link) and storage.file_permissions_mode is not None:
+                        os.chmod(path, storage.file_permissions_mode)
+                else:
+                    with open(filename, "rb") as source:
+                        storage.save(name, File(source, name=os.path.basename(name)))
+            metrics.count("bytes.stored", entry["size"])
+            count += 1
+    return count
+
+
+def restore_snapshot(folder: str, link: bool = False, storage: Storage | None = None) -> tuple[int, int]:
+    """
+    Restores a snapshot taken with take_snapshot(), loading its rows in a single transaction and putting its media
+    files in storage. Meant for a freshly migrated database. Returns the number of rows and files restored.
+    """
+    with metrics.timer("restore"):
+        with transaction.atomic():
+            rows = restore_rows(folder)
+        files = restore_media(folder, link=link, storage=storage)
+    return rows, files
@@ -0,0 +1,109 @@
+import os
+import shutil
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.db.models.fields.files import FieldFile
+
+from .config import get_bool_setting
+from .metrics import metrics
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def copy_file(source: int, target: int, size: int) -> None:
+    """
+    Copies size bytes between two open file descriptors in the kernel, using copy_file_range or sendfile
+    when available, and falling back to reading and writing chunks.
+    """
+    copied = 0
+    for method in ("copy_file_range", "sendfile"):
+        if (fast_copy := getattr(os, method, None)) is None:
+            continue
+        try:
+            while copied < size:
+                if method == "sendfile":
+                    sent = fast_copy(target, source, copied, min(CHUNK_SIZE * 64, size - copied))
+                else:
+                    sent = fast_copy(source, target, min(CHUNK_SIZE * 64, size - copied), copied, copied)
+                if sent == 0:
+                    break
+                copied += sent
+            if copied >= size:
+                return
+        except OSError:
+            # Not supported between these files, try the next way of copying, continuing where this one stopped.
+            continue
+
+    os.lseek(source, copied, os.SEEK_SET)
+    os.lseek(target, copied, os.SEEK_SET)
+    with open(source, "rb", closefd=False) as src, open(target, "wb", closefd=False) as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+def store_file(storage: Storage, filename: str, name: str, link: bool = False) -> str:
+    """
+    Stores a local file in storage under name, or a similar available name, returning the name used.
+
+    On FileSystemStorage the file is hard linked if link is set and the media folder is on the same filesystem,
+    otherwise copied in the kernel. Other storages get the file streamed in chunks. File handles are always closed.
+    """
+    size = os.path.getsize(filename)
+    metrics.count("bytes.stored", size)
+    if not isinstance(storage, FileSystemStorage):
+        with open(filename, "rb") as f:
+            return storage.save(name, File(f, name=os.path.basename(name)))
+
+    while True:
+        available = storage.get_available_name(name)
+        path = storage.path(available)
+        try:
+            copied = place_file(filename, path, link=link)
+            break
+        except FileExistsError:
+            # Taken by another thread or process since get_available_name looked, like Storage.save, try again.
+            metrics.count("store.retries")
+    if copied and storage.file_permissions_mode is not None:
+        os.chmod(path, storage.file_permissions_mode)
+    return available
+
+
+def place_file(filename: str, path: str, link: bool = False) -> bool:
+    """
+    Puts a local file at path, creating its folder. The file is hard linked if link is set and both are on the same
+    filesystem, otherwise copied in the kernel, which shares the blocks on filesystems supporting reflinks. Returns True
+    if the file was copied. Raises FileExistsError if path exists.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if link:
+        try:
+            os.link(filename, path)
+            return False
+        except FileExistsError:
+            raise
+        except OSError:
+            pass
+
+    source = os.open(filename, os.O_RDONLY)
+    try:
+        target = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            copy_file(source, target, os.fstat(source).st_size)
+        finally:
+            os.close(target)
+    finally:
+        os.close(source)
+    return True
+
+
+def store_in_field(field_file: FieldFile, filename: str, link: bool | None = None) -> None:
+    """
+    Stores a local file in a file field, like FieldFile.save(save=False), but without passing the contents through python.
+    Unless told otherwise, files are hard linked if the DEMO-PROVIDER-HARDLINKS setting is on.
+    """
+    if link is None:
+        link = get_bool_setting("DEMO-PROVIDER-HARDLINKS")
+    name = field_file.field.generate_filename(field_file.instance, os.path.basename(filename))
+    field_file.name = store_file(field_file.storage, filename, name, link=link)
+    setattr(field_file.instance, field_file.field.attname, field_file.name)
+    field_file._committed = True
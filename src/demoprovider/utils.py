@@ -1,5 +1,20 @@
+import logging
+from itertools import islice
+from typing import Iterable, Iterator
+
+
+def configure_logging(verbose: bool = False) -> None:
+    """
+    Sets up logging for the management commands. Does nothing if the project has already configured logging.
+    """
+    logging.basicConfig(format="%(levelname)s:%(message)s", level=verbose and logging.DEBUG or logging.INFO)
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
 
 def filename_from_slug(slug: str, extension: str = ".png") -> str:
     return slug.replace("-", "_").replace(" ", "_") + extension
-
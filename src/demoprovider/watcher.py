@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+
+from redtoolbox.files import find_files
+
+from .catalog import file_signature
+from .config import SUPPORTED_IMAGE_FORMATS
+from .manifest import Manifests
+from .metrics import metrics
+
+# Time given a burst of file system events to settle before the folder is compared with its snapshot.
+SETTLE_TIME = 0.2
+
+
+@dataclass
+class Changes:
+    added: list[str] = field(default_factory=list)
+    modified: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.modified or self.removed)
+
+    def __str__(self) -> str:
+        return f"{len(self.added)} added, {len(self.modified)} modified, {len(self.removed)} removed"
+
+
+class FolderWatcher:
+    """
+    Watches a folder for images being added, modified and removed, including changes to their metadata.
+
+    The folder is compared with a snapshot of the mtime and size of every image and the revision of its metadata,
+    taken every interval seconds. If the watchdog package is installed, file system events are used instead, and
+    the folder is only compared when something happened in it. Only the files accepted by include are watched.
+    """
+
+    def __init__(self, folder: str, interval: float = 1.0, include: Callable[[str], bool] | None = None, use_events: bool = True):
+        self.folder = folder
+        self.interval = interval
+        self.include = include
+        self.use_events = use_events
+        self.snapshot: dict[str, tuple[float, int, float]] | None = None
+        self.dirty = threading.Event()
+
+    def take_snapshot(self) -> dict[str, tuple[float, int, float]]:
+        snapshot, manifests = {}, Manifests()
+        with metrics.timer("watch.snapshot"):
+            for filename in find_files(self.folder, extensions=SUPPORTED_IMAGE_FORMATS):
+                if self.include and not self.include(filename):
+                    continue
+                try:
+                    snapshot[filename] = file_signature(filename, manifests)
+                except OSError:
+                    continue
+        return snapshot
+
+    def start(self) -> None:
+        """
+        Takes the snapshot changes are reported against. Call it before reading the folder, so nothing changing meanwhile is missed.
+        """
+        self.snapshot = self.take_snapshot()
+
+    def poll(self) -> Changes:
+        """
+        Returns the changes since the last snapshot, taking a new one.
+        """
+        if self.snapshot is None:
+            self.start()
+        previous, current = self.snapshot or {}, self.take_snapshot()
+        self.snapshot = current
+        changes = Changes(
+            added=[filename for filename in current if filename not in previous],
+            modified=[filename for filename, signature in current.items() if filename in previous and previous[filename] != signature],
+            removed=[filename for filename in previous if filename not in current],
+        )
+        if changes:
+            metrics.count("watch.changes", len(changes.added) + len(changes.modified) + len(changes.removed))
+        return changes
+
+    def observe(self):
+        """
+        Starts watching the folder for file system events with watchdog, returning the observer, or None if it isn't installed.
+        """
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+
+        dirty = self.dirty
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event) -> None:
+                dirty.set()
+
+        observer = Observer()
+        observer.schedule(Handler(), self.folder, recursive=True)
+        observer.start()
+        return observer
+
+    def watch(self, stop: threading.Event | None = None) -> Iterator[Changes]:
+        """
+        Yields the changes to the folder as they happen, until stop is set.
+        """
+        stop = stop or threading.Event()
+        if self.snapshot is None:
+            self.start()
+        observer = self.use_events and self.observe() or None
+        logging.debug(f"Watching {self.folder} {observer and 'for file system events' or f'every {self.interval}s'}")
+        try:
+            while not stop.is_set():
+                if observer is not None:
+                    if not self.dirty.wait(self.interval):
+                        continue
+                    time.sleep(SETTLE_TIME)
+                    self.dirty.clear()
+                elif stop.wait(self.interval):
+                    break
+                if changes := self.poll():
+                    yield changes
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
@@ -0,0 +1,41 @@
+import json
+import os
+
+import pytest
+
+
+def make_image(filename: str, keywords: list[str] | None = None, size: tuple[int, int] = (32, 24), seed: int = 0, **metadata) -> str:
+    """
+    Writes a small png, with a json sidecar holding keywords and metadata unless both are empty.
+    """
+    from demoprovider.image_providers.synthetic import render_png
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "wb") as f:
+        f.write(render_png(*size, seed=seed))
+    if keywords or metadata:
+        with open(filename + ".json", "w") as f:
+            f.write(json.dumps({"keywords": keywords or [], **metadata}))
+    return filename
+
+
+@pytest.fixture
+def library(tmp_path):
+    """
+    A folder of twelve images in two subfolders, tagged with "nature", "people" or both.
+    """
+    folder = str(tmp_path / "library")
+    for i in range(12):
+        keywords = [("nature", "people", "nature")[i % 3]] + (["people"] if i % 3 == 2 else [])
+        make_image(os.path.join(folder, f"folder_{i % 2}", f"image_{i:02d}.png"), keywords, size=(32 + i, 24), seed=i, url=f"https://example.com/{i}")
+    return folder
+
+
+@pytest.fixture
+def root_collection():
+    """
+    The root collection, which transactional tests, starting with an empty database, have to create.
+    """
+    from wagtail.models import Collection
+
+    return Collection.get_first_root_node() or Collection.add_root(name="Root")
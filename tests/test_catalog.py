@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from demoprovider import catalog
+from demoprovider.catalog import ImageCatalog
+
+from .conftest import make_image
+
+
+def files(folder):
+    return sorted(os.path.join(path, name) for path, _, names in os.walk(folder) for name in names if name.endswith(".png"))
+
+
+def sync(folder, **kwargs):
+    with ImageCatalog.for_folder(folder) as image_catalog:
+        return dict(image_catalog.sync(files(folder), **kwargs))
+
+
+def fail(*args, **kwargs):
+    pytest.fail("read a file that didn't change")
+
+
+def test_first_sync_reads_everything(library):
+    synced = sync(library)
+    assert sorted(synced) == files(library)
+    for filename, metadata in synced.items():
+        with open(filename, "rb") as f:
+            assert metadata["sha1"] == hashlib.sha1(f.read()).hexdigest()
+        assert metadata["height"] == 24 and metadata["url"].startswith("https://example.com/")
+
+
+def test_unchanged_files_are_not_read(library, monkeypatch):
+    first = sync(library)
+    monkeypatch.setattr(catalog, "read_metadata", fail)
+    monkeypatch.setattr(catalog, "file_hash", fail)
+    assert sync(library) == first
+
+
+def test_changed_metadata_keeps_the_hash(library, monkeypatch):
+    first = sync(library)
+    filename = files(library)[0]
+    with open(filename + ".json", "w") as f:
+        f.write(json.dumps({"keywords": ["city"]}))
+    os.utime(filename + ".json", (0, 1))
+
+    monkeypatch.setattr(catalog, "file_hash", fail)
+    second = sync(library)
+    assert second[filename]["keywords"] == ["city"] and second[filename]["sha1"] == first[filename]["sha1"]
+    assert {name: metadata for name, metadata in second.items() if name != filename} == {name: metadata for name, metadata in first.items() if name != filename}
+
+
+def test_changed_images_are_hashed_again(library):
+    first = sync(library)
+    filename = files(library)[0]
+    with open(files(library)[1], "rb") as source, open(filename, "wb") as target:
+        target.write(source.read())
+
+    second = sync(library)
+    assert second[filename]["sha1"] == first[files(library)[1]]["sha1"] != first[filename]["sha1"]
+
+
+def test_removed_files_are_pruned(library):
+    sync(library)
+    removed = files(library)[0]
+    os.remove(removed)
+
+    with ImageCatalog.for_folder(library) as image_catalog:
+        assert dict(image_catalog.sync(files(library), prune=False)) and removed in image_catalog.entries()
+        assert removed not in dict(image_catalog.sync(files(library)))
+        assert removed not in image_catalog.entries() and len(image_catalog.entries()) == 11
+
+
+@pytest.mark.django_db
+def test_importing_keeps_skipped_files_in_the_catalog(library, monkeypatch):
+    from demoprovider.services import ImageService
+
+    private = make_image(os.path.join(library, "_private", "draft.png"), seed=100)
+    sync(library)
+    removed = os.path.join(library, "folder_0", "image_00.png")
+    os.remove(removed)
+
+    ImageService(folder=library).add_local_folder(library)
+    with ImageCatalog.for_folder(library) as image_catalog:
+        assert private in image_catalog.entries() and removed not in image_catalog.entries()
+
+    # Files done according to the journal aren't looked at, but aren't forgotten either.
+    monkeypatch.setattr(catalog, "file_hash", fail)
+    ImageService(folder=library).add_local_folder(library, resume=True)
+    with ImageCatalog.for_folder(library) as image_catalog:
+        assert sorted(image_catalog.entries()) == files(library)
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import threading
+
+import pytest
+
+from demoprovider.image_providers.downloader import Downloader, DownloadPool
+from demoprovider.image_providers.fake import FakeImageServer
+
+
+@pytest.fixture
+def server():
+    server = FakeImageServer(seed=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def jobs(server, folder, count):
+    return [(f"{server.url}/photos/test-{i}.png", os.path.join(folder, f"photo_{i}.png"), None) for i in range(count)]
+
+
+def sha1(filename):
+    with open(filename, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def test_downloads_every_file_and_reports_its_digest(server, tmp_path):
+    saved = {}
+    downloader = Downloader(workers=4, verbose=False)
+    stats = downloader.download_all((url, filename, lambda filename, digest: saved.update({filename: digest})) for url, filename, _ in jobs(server, str(tmp_path), 10))
+
+    assert stats.files == 10 and stats.failed == 0
+    assert sorted(saved) == sorted(str(tmp_path / f"photo_{i}.png") for i in range(10))
+    assert all(sha1(filename) == digest for filename, digest in saved.items())
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".part")]
+
+
+def test_retries_failed_requests(server, tmp_path):
+    server.error_rate = 0.5
+    stats = Downloader(workers=4, retries=8, backoff=0, verbose=False).download_all(jobs(server, str(tmp_path), 10))
+
+    assert stats.files == 10
+    assert len(os.listdir(tmp_path)) == 10
+
+
+def test_gives_up_without_leaving_partial_files(server, tmp_path):
+    server.error_rate = 1.0
+    stats = Downloader(workers=2, retries=1, backoff=0, verbose=False).download_all(jobs(server, str(tmp_path), 3))
+
+    assert stats.files == 0 and stats.failed == 3
+    assert os.listdir(tmp_path) == []
+
+
+def test_does_not_retry_missing_files(server, tmp_path):
+    downloader = Downloader(workers=1, retries=3, backoff=10, verbose=False)
+
+    assert downloader.download(f"{server.url}/missing", str(tmp_path / "missing.png")) is None
+    assert downloader.stats.failed == 1
+
+
+def test_discards_duplicates(server, tmp_path):
+    seen = set()
+
+    def is_duplicate(digest):
+        duplicate = digest in seen
+        seen.add(digest)
+        return duplicate
+
+    url = f"{server.url}/photos/same.png"
+    downloader = Downloader(workers=1, verbose=False, is_duplicate=is_duplicate)
+    stats = downloader.download_all([(url, str(tmp_path / "first.png"), None), (url, str(tmp_path / "second.png"), None)])
+
+    assert stats.files == 1 and stats.duplicates == 1
+    assert os.listdir(tmp_path) == ["first.png"]
+
+
+def test_downloaders_sharing_a_pool_stay_within_its_connections(server, tmp_path, caplog):
+    lock, active, peak = threading.Lock(), [0], [0]
+    handle = server.handle
+
+    def counting_handle(request):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            handle(request)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    server.handle = counting_handle
+    server.latency = 0.02
+    pool = DownloadPool(2)
+    downloaders = [Downloader(verbose=False, pool=pool) for _ in range(3)]
+    threads = [threading.Thread(target=downloader.download_all, args=(jobs(server, str(tmp_path / str(i)), 4),)) for i, downloader in enumerate(downloaders)]
+    for i, thread in enumerate(threads):
+        os.makedirs(tmp_path / str(i))
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.close()
+
+    assert sum(downloader.stats.files for downloader in downloaders) == 12
+    assert peak[0] <= 2
+    assert "Connection pool is full" not in caplog.text
@@ -0,0 +1,63 @@
+import os
+import threading
+
+import pytest
+from wagtail.images import get_image_model
+
+from demoprovider import config
+from demoprovider.catalog import CATALOG_FILENAME
+from demoprovider.importer import BulkImporter, upload_name
+from demoprovider.journal import JOURNAL_FILENAME
+from demoprovider.services import ImageService
+
+
+@pytest.mark.django_db(transaction=True)
+def test_read_only_folder_keeps_state_in_the_cache(library, root_collection, tmp_path, settings, monkeypatch):
+    setattr(settings, "DEMO-PROVIDER-CACHE-FOLDER", str(tmp_path / "cache"))
+    access = os.access
+    monkeypatch.setattr(config.os, "access", lambda path, mode: path != library and access(path, mode))
+
+    ImageService(folder=library).add_local_folder(library, workers=2, batch_size=5)
+    assert get_image_model().objects.count() == 12
+    assert not os.path.exists(os.path.join(library, CATALOG_FILENAME))
+    assert not os.path.exists(os.path.join(library, JOURNAL_FILENAME))
+    state_folder = config.get_state_folder(library)
+    assert os.path.dirname(state_folder) == str(tmp_path / "cache")
+    assert {CATALOG_FILENAME, JOURNAL_FILENAME} <= set(os.listdir(state_folder))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_failing_batch_is_saved_file_by_file(library, root_collection, monkeypatch):
+    existing = ImageService.create_wagtail_image(os.path.join(library, "folder_0", "image_00.png"))
+    prepare = BulkImporter.prepare
+
+    def clashing_prepare(self, filename, *args):
+        image = prepare(self, filename, *args)
+        if filename.endswith("image_03.png"):
+            image.pk = existing.pk
+        return image
+
+    monkeypatch.setattr(BulkImporter, "prepare", clashing_prepare)
+    files = [(os.path.join(library, f"folder_{i % 2}", f"image_{i:02d}.png"), None) for i in range(1, 12)]
+    assert BulkImporter(workers=2, batch_size=6).run(files) == 10
+    assert get_image_model().objects.count() == 11
+    assert not get_image_model().objects.filter(title__contains="03").exists()
+
+
+@pytest.mark.django_db
+def test_upload_name_does_not_query(django_assert_num_queries):
+    with django_assert_num_queries(0):
+        assert upload_name("/library/folder_0/photo.png", 1) == "original_images/photo.png"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_workers_do_not_open_database_connections(library, root_collection, monkeypatch):
+    from django.db.backends.base.base import BaseDatabaseWrapper
+
+    connected = []
+    connect = BaseDatabaseWrapper.connect
+    monkeypatch.setattr(BaseDatabaseWrapper, "connect", lambda self: connected.append(threading.current_thread().name) or connect(self))
+
+    ImageService(folder=library).add_local_folder(library, workers=3, batch_size=4)
+    assert get_image_model().objects.count() == 12
+    assert all(name == threading.current_thread().name for name in connected)
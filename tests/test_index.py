@@ -0,0 +1,68 @@
+from demoprovider.index import COMPACT_THRESHOLD, ImageIndex
+from demoprovider.services import DemoImage
+
+
+def image(name, keywords=("default",), **metadata):
+    return DemoImage(f"/library/{name}.png", {"keywords": list(keywords), **metadata})
+
+
+def test_queries_combine_keywords():
+    index = ImageIndex()
+    for name, keywords in (("a", ["people"]), ("b", ["people", "city"]), ("c", ["city"]), ("d", ["nature"])):
+        index.add(image(name, keywords))
+
+    def names(**query):
+        return [image.filename[len("/library/") : -len(".png")] for image in index.resolve(index.query(**query))]
+
+    assert names(all_of=["people", "city"]) == ["b"]
+    assert names(any_of=["people", "nature"]) == ["a", "b", "d"]
+    assert names(any_of=["city"], none_of=["people"]) == ["c"]
+    assert index.count("people") == 2 and index.count() == 4
+
+
+def test_adding_a_file_again_replaces_it():
+    index = ImageIndex()
+    index.add(image("a", ["people"]))
+    index.add(image("a", ["city"]))
+
+    assert len(index) == 1
+    assert index.count("people") == 0 and index.count("city") == 1
+
+
+def test_shared_hash_and_url_survive_removing_the_first_image():
+    index = ImageIndex()
+    for name in ("a", "b", "c"):
+        index.add(image(name, sha1="same", url="https://example.com/same"))
+
+    index.remove("/library/a.png")
+    assert index.find(content_hash="same").filename == "/library/b.png"
+    assert index.find(url="https://example.com/same").filename == "/library/b.png"
+
+    index.remove("/library/c.png")
+    index.remove("/library/b.png")
+    assert index.find(content_hash="same") is None
+    assert index.urls == {} and index.shared_urls == {} and index.shared_hashes == {}
+
+
+def test_removing_a_later_duplicate_keeps_the_first():
+    index = ImageIndex()
+    index.add(image("a", sha1="same"))
+    index.add(image("b", sha1="same"))
+    index.remove("/library/b.png")
+
+    assert index.find(content_hash="same").filename == "/library/a.png"
+    assert index.shared_hashes == {}
+
+
+def test_compacts_when_most_slots_are_empty():
+    index = ImageIndex()
+    count = COMPACT_THRESHOLD * 2
+    for i in range(count):
+        index.add(image(str(i), ["even" if i % 2 == 0 else "odd"], sha1=str(i)))
+    for i in range(count - 10):
+        index.remove(f"/library/{i}.png")
+
+    assert len(index.images) < COMPACT_THRESHOLD
+    assert len(index) == 10
+    assert [image.filename for image in index.resolve(index.query(any_of=["even"]))] == [f"/library/{i}.png" for i in range(count - 10, count, 2)]
+    assert index.find(content_hash=str(count - 1)).filename == f"/library/{count - 1}.png"
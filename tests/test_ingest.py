@@ -0,0 +1,35 @@
+import os
+
+from demoprovider.ingest import IngestOptions, IngestPipeline, ingest
+from tests.conftest import make_image
+
+
+def test_ingest_fixes_the_extension(tmp_path):
+    filename = make_image(str(tmp_path / "photo.jpg"))
+    target, digest = ingest(filename, IngestOptions())
+    assert target == str(tmp_path / "photo.png")
+    assert not os.path.exists(filename)
+    assert len(digest) == 40
+
+
+def test_ingest_keeps_existing_files(tmp_path):
+    existing = make_image(str(tmp_path / "photo.png"), seed=1)
+    with open(existing, "rb") as f:
+        data = f.read()
+    target, _ = ingest(make_image(str(tmp_path / "photo.jpg"), seed=2), IngestOptions())
+    assert target == str(tmp_path / "photo_1.png")
+    with open(existing, "rb") as f:
+        assert f.read() == data
+
+
+def test_pipeline_logs_callback_errors(tmp_path):
+    results = []
+
+    def callback(filename, digest):
+        results.append(filename)
+        raise ValueError(filename)
+
+    with IngestPipeline(IngestOptions()) as pipeline:
+        futures = [pipeline.submit(make_image(str(tmp_path / f"{i}.jpg"), seed=i), callback) for i in range(2)]
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert results == [str(tmp_path / "0.png"), str(tmp_path / "1.png")]
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+from wagtail.images import get_image_model
+
+from demoprovider.importer import BulkImporter
+from demoprovider.journal import Journal
+from demoprovider.services import ImageService
+
+
+class Interrupted(BaseException):
+    pass
+
+
+def stored_files(storage) -> list[str]:
+    return sorted(storage.listdir("original_images")[1]) if storage.exists("original_images") else []
+
+
+@pytest.fixture
+def storage(root_collection):
+    storage = get_image_model()._meta.get_field("file").storage
+    for name in stored_files(storage):
+        storage.delete(f"original_images/{name}")
+    return storage
+
+
+def test_journal_resume(tmp_path):
+    path = str(tmp_path / "journal.sqlite3")
+    with Journal(path, "job") as journal:
+        journal.start("a", "data")
+        journal.finish("b")
+    with Journal(path, "job", resume=True) as journal:
+        assert "b" in journal and "a" not in journal
+        assert journal.pending() == [("a", "data")]
+    with Journal(path, "job") as journal:
+        assert "b" not in journal
+        assert journal.recover(lambda data: None) == 1
+        assert journal.pending() == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_resume_removes_copies_of_an_interrupted_batch(library, storage, monkeypatch):
+    calls = []
+
+    def save_batch(self, images):
+        calls.append(len(images))
+        if len(calls) == 2:
+            raise Interrupted()
+        return original(self, images)
+
+    original = BulkImporter._save_batch
+    monkeypatch.setattr(BulkImporter, "_save_batch", save_batch)
+    with pytest.raises(Interrupted):
+        ImageService(folder=library).add_local_folder(library, workers=2, batch_size=5)
+    assert get_image_model().objects.count() == 5
+    assert len(stored_files(storage)) == 10
+
+    ImageService(folder=library).add_local_folder(library, workers=2, batch_size=5, resume=True)
+    assert get_image_model().objects.count() == 12
+    assert sorted(os.path.basename(image.file.name) for image in get_image_model().objects.all()) == stored_files(storage)
+    assert calls == [5, 5, 5, 2]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_resume_keeps_saved_batches(library, storage, monkeypatch):
+    def finish(self, key):
+        raise Interrupted()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Journal, "finish", finish)
+        with pytest.raises(Interrupted):
+            ImageService(folder=library).add_local_folder(library, workers=2, batch_size=5)
+    assert len(stored_files(storage)) == 5
+
+    with Journal.for_folder(library, "import", resume=True) as journal:
+        assert len(journal.pending()) == 5
+    ImageService(folder=library).add_local_folder(library, workers=2, batch_size=5, resume=True, skip_existing=False)
+    assert get_image_model().objects.count() == 12
+    assert sorted(os.path.basename(image.file.name) for image in get_image_model().objects.all()) == stored_files(storage)
@@ -0,0 +1,53 @@
+import os
+
+from django.core.management import call_command
+
+from demoprovider import manifest
+from demoprovider.catalog import read_metadata
+from demoprovider.manifest import MANIFESTS, Manifest
+
+
+def test_manifests_are_shared_and_refreshed(tmp_path):
+    first = Manifest.for_folder(str(tmp_path))
+    first.append("a.png", {"keywords": ["nature"]})
+    with open(os.path.join(tmp_path, manifest.MANIFEST_FILENAME), "ab") as f:
+        f.write(Manifest.line("b.png", {"keywords": ["people"]}))
+
+    second = Manifest.for_folder(str(tmp_path))
+    assert second is first
+    assert second.get("b.png") == {"keywords": ["people"]}
+
+
+def test_only_recently_used_manifests_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(manifest, "MANIFEST_CACHE_SIZE", 2)
+    MANIFESTS.clear()
+    folders = [str(tmp_path / str(i)) for i in range(3)]
+    first = Manifest.for_folder(folders[0])
+    Manifest.for_folder(folders[1])
+    assert Manifest.for_folder(folders[0]) is first
+    Manifest.for_folder(folders[2])
+
+    assert list(MANIFESTS) == [folders[0], folders[2]]
+    assert Manifest.for_folder(folders[0]) is first
+
+
+def test_fold_sidecars_command(library):
+    folder = os.path.join(library, "folder_0")
+    before = {name: read_metadata(os.path.join(folder, name)) for name in os.listdir(folder) if name.endswith(".png")}
+    broken = os.path.join(folder, "image_00.png.json")
+    with open(broken, "w") as f:
+        f.write("{broken")
+    orphan = os.path.join(folder, "gone.png.json")
+    with open(orphan, "w") as f:
+        f.write("{}")
+
+    call_command("fold_sidecars", library)
+    assert os.path.exists(os.path.join(folder, manifest.MANIFEST_FILENAME))
+    assert sorted(Manifest.for_folder(folder).entries) == sorted(set(before) - {"image_00.png"})
+    assert all(os.path.exists(os.path.join(folder, name + ".json")) for name in before)
+
+    call_command("fold_sidecars", library, "--remove-sidecars")
+    assert sorted(name for name in os.listdir(folder) if name.endswith(".json")) == ["gone.png.json", "image_00.png.json"]
+    for name, metadata in before.items():
+        if name != "image_00.png":
+            assert read_metadata(os.path.join(folder, name)) == metadata
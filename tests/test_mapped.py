@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from demoprovider.mapped import MappedIndex, mapped_index_path
+from demoprovider.services import DemoImage, ImageService
+from tests.conftest import make_image
+
+
+@pytest.fixture
+def scanned(library):
+    scanner = ImageService(folder=library, scan_on_creation=True, shared_index=True)
+    return scanner, ImageService(folder=library, scan_on_creation=True, shared_index=True)
+
+
+def images(index):
+    return {image.filename: (image.keywords, image.url, image.content_hash, image.width, image.height) for image in index.resolve(sorted(index.all_ids()))}
+
+
+def test_round_trip(scanned):
+    scanner, service = scanned
+    assert isinstance(service.index, MappedIndex)
+    assert images(service.index) == images(scanner.index)
+    assert service.index.counts() == scanner.index.counts()
+    assert service.index.count("people") == scanner.index.count("people") and service.index.count() == 12
+    assert {keyword: set(ids) for keyword, ids in service.index.keywords.items()} == {
+        keyword: {service.index.ids.get(scanner.index.images[i].filename) for i in ids} for keyword, ids in scanner.index.keywords.items()
+    }
+    image = service.index.get(os.path.join(service.folder, "folder_1", "image_05.png"))
+    assert image.get("url") == "https://example.com/5" and image.width == 37
+
+
+def test_lookups(scanned):
+    scanner, service = scanned
+    for image in scanner.index.resolve(scanner.index.all_ids()):
+        assert service.index.find(image.filename).filename == image.filename
+        assert service.index.find(url=image.url).filename == image.filename
+        assert service.index.find(content_hash=image.content_hash).filename == image.filename
+    assert service.index.find(os.path.join(service.folder, "missing.png")) is None
+    assert service.index.find(url="https://example.com/missing") is None
+    assert not service.file_exists(os.path.join(service.folder, "missing.png"))
+
+
+def test_thaw_keeps_ids_and_allows_changes(scanned, library):
+    _, service = scanned
+    before = images(service.index)
+    ids = {filename: service.index.ids.get(filename) for filename in before}
+    removed = os.path.join(library, "folder_0", "image_00.png")
+    assert service.index.remove(removed).filename == removed
+    assert not service.index.mapped
+
+    added = make_image(os.path.join(library, "folder_0", "image_12.png"), ["city"], seed=12)
+    service.add_file(added)
+    assert service.index.count("city") == 1 and len(service.index) == 12
+    assert all(service.index.ids.get(filename) == ids[filename] for filename in before if filename != removed)
+
+
+def test_changes_to_the_folder_make_it_stale(scanned, library):
+    make_image(os.path.join(library, "folder_0", "image_12.png"), ["city"], seed=12)
+    service = ImageService(folder=library, scan_on_creation=True, shared_index=True)
+    assert not isinstance(service.index, MappedIndex) and service.index.count("city") == 1
+
+    # The scan rewrote the file, so the next service maps it again.
+    assert isinstance(ImageService(folder=library, scan_on_creation=True, shared_index=True).index, MappedIndex)
+    with open(os.path.join(library, "folder_1", "image_01.png.json"), "w") as f:
+        f.write('{"keywords": ["city"]}')
+    os.utime(os.path.join(library, "folder_1", "image_01.png.json"), (0, 1))
+    assert ImageService(folder=library, scan_on_creation=True, shared_index=True).index.count("city") == 2
+
+
+def test_written_without_a_catalog(library):
+    ImageService(folder=library, scan_on_creation=True, shared_index=True, use_catalog=False)
+    assert os.path.exists(mapped_index_path(library))
+    assert isinstance(ImageService(folder=library, scan_on_creation=True, shared_index=True).index, MappedIndex)
+
+
+def test_metadata_decoded_on_demand(scanned):
+    _, service = scanned
+    image = service.index.images[0]
+    assert isinstance(image, DemoImage) and isinstance(image._metadata, bytes)
+    assert image.metadata["keywords"] == list(image.keywords)
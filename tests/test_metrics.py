@@ -0,0 +1,90 @@
+import json
+import threading
+
+import pytest
+from wagtail.models import Collection
+
+from demoprovider.metrics import Metrics, collect, metrics
+
+
+def test_counting_from_many_threads():
+    counter = Metrics()
+
+    def work():
+        for _ in range(1000):
+            counter.count("items")
+            counter.count("bytes", 2.5)
+            counter.record("step", 0.001)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    snapshot = counter.snapshot()
+    assert snapshot["counters"] == {"items": 8000, "bytes": 20000}
+    assert snapshot["timers"]["step"]["count"] == 8000
+    assert snapshot["timers"]["step"]["total"] == pytest.approx(8)
+
+
+def test_timer_records_failures_too():
+    counter = Metrics()
+    with pytest.raises(ValueError):
+        with counter.timer("fails"):
+            raise ValueError
+    assert counter.snapshot()["timers"]["fails"]["count"] == 1
+
+
+def sample() -> Metrics:
+    counter = Metrics(prefix="test")
+    counter.count("catalog.hits", 3)
+    counter.count("bytes-read", 1024)
+    counter.record("scan", 0.5)
+    counter.record("scan", 1.5)
+    return counter
+
+
+def test_text_report():
+    lines = sample().report("text").splitlines()
+    assert lines[0].startswith("Run took ")
+    assert lines[1].split() == ["scan", "2", "calls", "2.000s", "total", "1000.000ms", "avg"]
+    assert [line.split() for line in lines[2:]] == [["bytes-read", "1024"], ["catalog.hits", "3"]]
+
+
+def test_json_report():
+    report = json.loads(sample().report("json"))
+    assert report["counters"] == {"catalog.hits": 3, "bytes-read": 1024}
+    assert report["timers"] == {"scan": {"count": 2, "total": 2.0, "max": 1.5}}
+
+
+def test_prometheus_report():
+    assert sample().report("prometheus").splitlines() == [
+        "# TYPE test_bytes_read_total counter",
+        "test_bytes_read_total 1024",
+        "# TYPE test_catalog_hits_total counter",
+        "test_catalog_hits_total 3",
+        "# TYPE test_scan_seconds summary",
+        "test_scan_seconds_count 2",
+        "test_scan_seconds_sum 2.000000",
+    ]
+
+
+@pytest.mark.django_db
+def test_collect_resets_counts_queries_and_prints(capsys):
+    metrics.count("left.over")
+    with collect("json"):
+        list(Collection.objects.all())
+        metrics.count("items", 2)
+
+    report = json.loads(capsys.readouterr().out)
+    assert report["counters"] == {"items": 2}
+    assert report["timers"]["db.query"]["count"] == 1
+
+
+def test_collect_without_a_format_does_nothing(capsys):
+    metrics.reset()
+    with collect(None):
+        metrics.count("items")
+    assert capsys.readouterr().out == ""
+    assert metrics.snapshot()["counters"] == {"items": 1}
@@ -0,0 +1,83 @@
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from demoprovider.probe import image_size, probe_format, probe_size
+
+SIZE = (123, 45)
+NOISE = random.Random(0).randbytes(64)
+
+
+def encode(format: str, mode: str = "RGB", **options) -> bytes:
+    image = Image.new(mode, SIZE, "red")
+    f = io.BytesIO()
+    image.save(f, format, **options)
+    return f.getvalue()
+
+
+def exif() -> bytes:
+    data = Image.Exif()
+    data[0x010F] = "demoprovider"
+    return data.tobytes()
+
+
+FILES = {
+    "png": ("png", lambda: encode("PNG")),
+    "jpeg": ("jpeg", lambda: encode("JPEG")),
+    "progressive jpeg": ("jpeg", lambda: encode("JPEG", progressive=True)),
+    "exif jpeg": ("jpeg", lambda: encode("JPEG", exif=exif())),
+    "vp8 webp": ("webp", lambda: encode("WEBP", quality=80)),
+    "vp8l webp": ("webp", lambda: encode("WEBP", lossless=True)),
+    "vp8x webp": ("webp", lambda: encode("WEBP", "RGBA", quality=80, exif=exif())),
+}
+
+
+@pytest.mark.parametrize("name", FILES)
+def test_probes_pillow_files(name):
+    format, data = FILES[name][0], FILES[name][1]()
+    f = io.BytesIO(data)
+    assert probe_format(f) == format
+    assert probe_size(f) == SIZE
+
+
+def test_vp8x_webp_has_an_extended_header():
+    assert FILES["vp8x webp"][1]()[12:16] == b"VP8X"
+    assert FILES["vp8l webp"][1]()[12:16] == b"VP8L"
+    assert FILES["vp8 webp"][1]()[12:16] == b"VP8 "
+
+
+def test_gif_is_recognized_but_not_probed():
+    f = io.BytesIO(encode("GIF"))
+    assert probe_format(f) == "gif"
+    assert probe_size(f) is None
+
+
+@pytest.mark.parametrize("name", FILES)
+@pytest.mark.parametrize("length", [4, 14, 20])
+def test_truncated_files_return_none(name, length):
+    # Every format has its dimensions past the first 20 bytes.
+    data = FILES[name][1]()
+    assert probe_size(io.BytesIO(data[:length])) is None
+
+
+@pytest.mark.parametrize("name", ["jpeg", "progressive jpeg", "exif jpeg"])
+def test_jpeg_cut_before_its_frame_returns_none(name):
+    data = FILES[name][1]()
+    frame = data.index(b"\xff\xc2" if name.startswith("progressive") else b"\xff\xc0")
+    assert probe_size(io.BytesIO(data[:frame])) is None
+    assert probe_size(io.BytesIO(data[: frame + 6])) is None
+
+
+@pytest.mark.parametrize("data", [b"", b"not an image at all", NOISE, b"\xff\xd8" + NOISE, b"RIFF\x00\x00\x00\x00WEBPVP8 "])
+def test_garbage_returns_none(data):
+    f = io.BytesIO(data)
+    assert probe_size(f) is None
+
+
+def test_image_size_falls_back_to_willow(tmp_path):
+    filename = str(tmp_path / "image.gif")
+    with open(filename, "wb") as f:
+        f.write(encode("GIF"))
+    assert image_size(filename) == SIZE
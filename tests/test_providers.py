@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from demoprovider import image_providers
+from demoprovider.catalog import file_hash, read_metadata
+from demoprovider.image_providers import init_providers
+from demoprovider.image_providers.downloader import get_download_pool
+from demoprovider.image_providers.fake import FakeHTTPImageProvider
+from demoprovider.image_providers.local import LocalFolderProvider
+from demoprovider.image_providers.synthetic import SyntheticImageProvider
+from demoprovider.services import ImageService
+
+
+def saved_files(folder):
+    return sorted(os.path.join(path, name) for path, _, names in os.walk(folder) for name in names if name.endswith(".png"))
+
+
+def test_local_provider_selects_on_keywords_and_path(library, tmp_path):
+    provider = LocalFolderProvider(source_folder=library, target_folder=str(tmp_path / "target"), verbose=False)
+    assert len(provider.matches("people")) == 8
+    assert len(provider.matches("folder_1")) == 6
+    assert provider.matches("city") == []
+
+
+def test_local_provider_copies_images_with_their_metadata(library, tmp_path):
+    target = str(tmp_path / "target")
+    provider = LocalFolderProvider(source_folder=library, target_folder=target, verbose=False)
+    provider.query("people", count=3)
+
+    files = saved_files(target)
+    assert len(files) == 3 and all(os.path.dirname(filename) == os.path.join(target, "local", "people") for filename in files)
+    sources = {image.content_hash or file_hash(image.filename): image for image in provider.matches("people")}
+    for filename in files:
+        metadata = read_metadata(filename)
+        assert "people" in metadata["keywords"] and metadata["provider"] == "local"
+        assert metadata["url"] == sources[file_hash(filename)].url
+    assert provider.service.count() == 3
+
+    # Images already in the library are skipped, so asking again only adds the ones missing.
+    provider.query("people", count=8)
+    assert len(saved_files(target)) == 8
+    provider.query("people", count=8)
+    assert len(saved_files(target)) == 8
+
+
+def test_local_provider_refuses_a_target_inside_its_source(library):
+    with pytest.raises(ValueError):
+        LocalFolderProvider(source_folder=library, target_folder=os.path.join(library, "mirror"), verbose=False)
+
+
+def test_synthetic_provider_generates_repeatable_images(tmp_path):
+    provider = SyntheticImageProvider(target_folder=str(tmp_path / "first"), size=(64, 48), verbose=False)
+    provider.query("sea", count=3)
+    files = saved_files(tmp_path / "first")
+    assert [os.path.basename(filename) for filename in files] == ["sea_1.png", "sea_2.png", "sea_3.png"]
+    for filename in files:
+        metadata = read_metadata(filename)
+        assert metadata["keywords"] == ["sea"] and sorted((metadata["width"], metadata["height"])) in ([48, 64], [48, 48])
+
+    # Asking again numbers on from the images already there.
+    provider.query("sea", count=2)
+    assert len(saved_files(tmp_path / "first")) == 5
+
+    other = SyntheticImageProvider(target_folder=str(tmp_path / "second"), size=(64, 48), verbose=False)
+    other.query("sea", count=3)
+    assert [file_hash(filename) for filename in saved_files(tmp_path / "second")] == [file_hash(filename) for filename in files[:3]]
+
+
+def test_init_providers_share_the_service_and_the_download_pool(tmp_path, settings, monkeypatch):
+    setattr(settings, "DEMO-PROVIDER-TARGET-FOLDER", str(tmp_path))
+    created = []
+
+    def factory(resume=False, service=None):
+        created.append(FakeHTTPImageProvider(target_folder=str(tmp_path), verbose=False, service=service))
+        return created[-1]
+
+    monkeypatch.setitem(image_providers.PROVIDERS, "fake", factory)
+    monkeypatch.setitem(image_providers.PROVIDERS, "other", factory)
+    service = ImageService(folder=str(tmp_path))
+
+    assert init_providers(2, "sea", "forest", providers=["fake", "other"], service=service) == {}
+    assert len(created) == 2
+    assert created[0].downloader.pool is created[1].downloader.pool is get_download_pool()
+    assert created[0].service is created[1].service is service
+    assert service.count() == 8
@@ -0,0 +1,85 @@
+import threading
+from types import ModuleType
+
+import djclick as click
+import pytest
+from django.core.management import call_command
+
+from demoprovider.registry import DemoProvider, DemoScheduler
+
+
+def provider(label, calls, depends_on=(), fail=False, prepare=None):
+    module = ModuleType(f"{label}.demo")
+
+    def run(*args):
+        if fail:
+            raise ValueError(label)
+        calls.append((label, *args))
+
+    module.run = run
+    if prepare:
+        module.prepare = prepare
+    return DemoProvider(app_label=label, module=module, depends_on=depends_on)
+
+
+@pytest.mark.django_db
+def test_runs_providers_after_their_dependencies():
+    calls = []
+    providers = {label: provider(label, calls, depends_on) for label, depends_on in (("blog", ("home",)), ("home", ()), ("shop", ("blog", "home")))}
+
+    assert DemoScheduler(providers).run() == {}
+    assert [call[0] for call in calls] == ["home", "blog", "shop"]
+
+
+@pytest.mark.django_db
+def test_skips_providers_depending_on_a_failed_one():
+    calls = []
+    scheduler = DemoScheduler({"home": provider("home", calls, fail=True), "blog": provider("blog", calls, ("home",)), "other": provider("other", calls)})
+
+    errors = scheduler.run()
+
+    assert list(errors) == ["home"]
+    assert scheduler.skipped == {"blog"}
+    assert calls == [("other",)]
+
+
+@pytest.mark.django_db
+def test_prepares_in_the_background_and_passes_the_result_to_run():
+    calls, prepared_in = [], []
+
+    def prepare():
+        prepared_in.append(threading.current_thread().name)
+        return ["photo.png"]
+
+    assert DemoScheduler({"home": provider("home", calls, prepare=prepare)}).run() == {}
+    assert calls == [("home", ["photo.png"])]
+    assert prepared_in[0].startswith("prepare")
+
+
+@pytest.mark.django_db
+def test_a_failing_prepare_fails_its_provider():
+    calls = []
+
+    def prepare():
+        raise ValueError("no files")
+
+    errors = DemoScheduler({"home": provider("home", calls, prepare=prepare)}).run()
+
+    assert str(errors["home"]) == "no files"
+    assert calls == []
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("atomic", [False, True])
+def test_command_fails_when_a_provider_fails(monkeypatch, atomic):
+    from demoprovider.management.commands import run_demo_providers
+    from demoprovider.renditions import RenditionWarmer
+
+    calls, warmed = [], []
+    monkeypatch.setattr(run_demo_providers, "discover_providers", lambda: {"home": provider("home", calls, fail=True), "other": provider("other", calls)})
+    monkeypatch.setattr(RenditionWarmer, "warm_new", lambda self, last_image_id: warmed.append(last_image_id))
+
+    # Run from the command line, click exits with status 1 on a ClickException.
+    with pytest.raises(click.ClickException):
+        call_command("run_demo_providers", *(atomic and ["--atomic"] or []), "--renditions", "fill-10x10")
+    assert warmed == []
@@ -0,0 +1,21 @@
+import pytest
+from django.db import transaction
+
+from demoprovider import renditions
+from demoprovider.renditions import RenditionWarmer
+
+
+@pytest.mark.django_db
+def test_warm_in_transaction_skips_workers(monkeypatch):
+    handled = []
+    monkeypatch.setattr(renditions, "warm_images", lambda batch, specs: handled.append(list(batch)) or len(batch))
+    monkeypatch.setattr(renditions.connections, "close_all", lambda: pytest.fail("connections closed in a transaction"))
+
+    warmer = RenditionWarmer(["width-100"], workers=4, batch_size=2)
+    with transaction.atomic():
+        assert warmer.warm([1, 2, 3]) == 3
+    assert handled == [[1, 2], [3]]
+
+
+def test_warm_without_specs():
+    assert RenditionWarmer([], workers=4).warm([1, 2]) == 0
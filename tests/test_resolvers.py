@@ -0,0 +1,61 @@
+import pytest
+from wagtail.models import Collection
+
+from demoprovider.resolvers import CollectionResolver
+
+
+@pytest.mark.django_db
+def test_resolves_nested_paths_creating_missing_collections():
+    resolver = CollectionResolver()
+    norway = resolver.resolve(("Travel", "Europe", "Norway"))
+
+    assert [c.name for c in norway.get_ancestors()] == ["Root", "Travel", "Europe"]
+    assert resolver.resolve(("Travel", "Europe")) == norway.get_parent()
+    assert resolver.key(norway) == ("Travel", "Europe", "Norway")
+    assert Collection.objects.filter(name__in=["Travel", "Europe", "Norway"]).count() == 3
+
+
+@pytest.mark.django_db
+def test_lookups_are_cached(django_assert_num_queries):
+    resolver = CollectionResolver()
+    norway = resolver.resolve(("Travel", "Norway"))
+    root = Collection.get_first_root_node()
+    with django_assert_num_queries(0):
+        assert resolver.resolve(("Travel", "Norway")) is norway
+        assert resolver.resolve(()) == root
+        assert resolver.get("Norway") is norway
+
+    # Collections created later are cached as well.
+    resolver.resolve(("Travel", "Sweden"))
+    with django_assert_num_queries(0):
+        resolver.resolve(("Travel", "Sweden"))
+
+
+@pytest.mark.django_db
+def test_reuses_existing_collections_with_the_same_path():
+    root = Collection.get_first_root_node()
+    travel = root.add_child(name="Travel")
+    norway = travel.add_child(name="Norway")
+    # The same name under another parent is a different collection.
+    other = root.add_child(name="Norway")
+
+    resolver = CollectionResolver()
+    assert resolver.resolve(("Travel", "Norway")) == norway
+    assert resolver.resolve(("Norway",)) == other
+    assert resolver.resolve(("Norway", "Travel")).get_parent() == other
+    assert Collection.objects.filter(name="Norway").count() == 2
+    assert Collection.objects.filter(name="Travel").count() == 2
+
+
+@pytest.mark.django_db
+def test_loads_the_tree_with_one_query(django_assert_num_queries):
+    root = Collection.get_first_root_node()
+    for i in range(5):
+        root.add_child(name=f"Folder {i}").add_child(name="Nested")
+
+    resolver = CollectionResolver()
+    with django_assert_num_queries(2):
+        resolver.load()
+    with django_assert_num_queries(0):
+        for i in range(5):
+            assert resolver.resolve((f"Folder {i}", "Nested")).name == "Nested"
@@ -0,0 +1,101 @@
+import random
+from collections import Counter
+
+import pytest
+
+from demoprovider.index import ImageIndex
+from demoprovider.sampling import AliasTable, ImageSampler
+from demoprovider.services import SAMPLER_CACHE_SIZE, DemoImage, ImageService
+
+from .conftest import make_image
+
+
+@pytest.fixture
+def index():
+    index = ImageIndex()
+    for i in range(30):
+        index.add(DemoImage(f"/library/image_{i}.png", {"keywords": [i < 10 and "people" or "nature"]}))
+    return index
+
+
+def test_draws_every_image_once_before_repeating(index):
+    sampler = ImageSampler(index, replace=False, seed=1)
+
+    first, second = sampler.sample(30), sampler.sample(30)
+
+    assert len({image.filename for image in first}) == 30
+    assert len({image.filename for image in second}) == 30
+
+
+def test_is_repeatable_with_a_seed(index):
+    def draws(seed):
+        return [image.filename for image in ImageSampler(index, ("people", "nature"), seed=seed).sample(20)]
+
+    assert draws(7) == draws(7)
+    assert draws(7) != draws(8)
+
+
+def test_only_draws_matching_images(index):
+    images = ImageSampler(index, ("people",), seed=0).sample(50)
+
+    assert all("people" in image.keywords for image in images)
+
+
+def test_picks_keywords_by_weight(index):
+    images = ImageSampler(index, weights={"people": 3, "nature": 1}, seed=0).sample(4000)
+    counts = Counter(image.keywords[0] for image in images)
+
+    assert counts["people"] / len(images) == pytest.approx(0.75, abs=0.03)
+
+
+def test_weighted_draws_without_replacement_use_every_image(index):
+    images = ImageSampler(index, weights={"people": 1, "nature": 1}, replace=False, seed=0).sample(30)
+
+    assert len({image.filename for image in images}) == 30
+
+
+def test_rebuilds_when_the_index_changes(index):
+    sampler = ImageSampler(index, ("people",), replace=False, seed=0)
+    sampler.sample(5)
+    index.add(DemoImage("/library/new.png", {"keywords": ["people"]}))
+
+    assert len(sampler) == 11
+
+
+def test_alias_table_follows_the_weights():
+    table, rng = AliasTable([1, 0, 3]), random.Random(0)
+    counts = Counter(table.draw(rng) for _ in range(8000))
+
+    assert counts[1] == 0
+    assert counts[2] / counts[0] == pytest.approx(3, rel=0.1)
+
+
+def test_service_is_seeded_from_the_setting(library, settings):
+    settings.__setattr__("DEMO-PROVIDER-SEED", "42")
+
+    def draws():
+        return [image.filename for image in ImageService(library, scan_on_creation=True).get_random_images("people", count=5)]
+
+    assert draws() == draws()
+
+
+def test_service_keeps_a_bounded_number_of_samplers(library):
+    service = ImageService(library, scan_on_creation=True, seed=0)
+    first = service.sampler("people", seed=0)
+    for seed in range(1, SAMPLER_CACHE_SIZE + 1):
+        service.sampler("people", seed=seed)
+
+    assert len(service.samplers) == SAMPLER_CACHE_SIZE
+    assert service.sampler("people", seed=0) is not first
+
+
+def test_service_reuses_the_sampler_without_keywords(library, tmp_path):
+    service = ImageService(library, scan_on_creation=True, seed=0)
+    assert len({image.filename for image in service.get_random_images(count=200, unique=True)}) == 12
+    service.get_random_image()
+    assert len(service.samplers) == 2
+
+    added = make_image(str(tmp_path / "library" / "untagged.png"), seed=100)
+    service.add_file(added)
+    assert added in {image.filename for image in service.get_random_images(count=13, unique=True)}
+    assert len(service.samplers) == 2
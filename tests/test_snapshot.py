@@ -0,0 +1,44 @@
+import json
+import os
+
+import pytest
+from wagtail.images import get_image_model
+
+from demoprovider.services import ImageService
+from demoprovider.snapshot import MEDIA_FOLDER, MEDIA_MANIFEST_FILENAME, file_names, restore_snapshot, take_snapshot
+
+
+@pytest.fixture
+def image(library, root_collection):
+    return ImageService.create_wagtail_image(os.path.join(library, "folder_0", "image_00.png"))
+
+
+@pytest.mark.django_db
+def test_file_names(image):
+    assert list(file_names(image)) == [image.file.name]
+
+
+@pytest.mark.django_db
+def test_snapshot_and_restore(image, tmp_path):
+    Image = get_image_model()
+    folder = str(tmp_path / "snapshot")
+    name, size = image.file.name, image.file.size
+
+    rows, files = take_snapshot(folder)
+    assert rows >= 2 and files == 1
+    assert os.path.getsize(os.path.join(folder, MEDIA_FOLDER, name)) == size
+    with open(os.path.join(folder, MEDIA_MANIFEST_FILENAME)) as f:
+        assert [json.loads(line) for line in f] == [{"name": name, "size": size}]
+
+    image.delete()
+    image.file.storage.delete(name)
+    assert not Image.objects.exists()
+
+    assert restore_snapshot(folder) == (rows, 1)
+    restored = Image.objects.get()
+    assert restored.file.name == name and restored.file.storage.size(name) == size
+    assert [result.pk for result in Image.objects.search(restored.title)] == [restored.pk]
+
+    # Restoring again replaces the rows and skips the files already in storage.
+    assert restore_snapshot(folder) == (rows, 0)
+    assert Image.objects.count() == 1
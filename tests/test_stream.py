@@ -0,0 +1,62 @@
+import os
+import shutil
+
+import pytest
+from wagtail.images import get_image_model
+
+from demoprovider.services import DemoImage, ImageService
+
+from .conftest import make_image
+
+
+def test_iter_images_filters_on_keywords_and_filter(library):
+    service = ImageService(folder=library)
+    assert len(list(service.iter_images())) == 12
+    assert len(list(service.iter_images("people"))) == 8
+    odd = list(service.iter_images("nature", filter=lambda image: "folder_1" in image.filename))
+    assert sorted(os.path.basename(image.filename) for image in odd) == ["image_03.png", "image_05.png", "image_09.png", "image_11.png"]
+    assert service.count() == 0
+
+
+def test_iter_images_reads_changed_files(library):
+    service = ImageService(folder=library, scan_on_creation=True)
+    filename = make_image(os.path.join(library, "folder_0", "image_00.png"), ["city"], seed=100)
+    stat = os.stat(filename + ".json")
+    os.utime(filename + ".json", (stat.st_atime + 10, stat.st_mtime + 10))
+    assert [image.filename for image in service.iter_images("city")] == [filename]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_stream_skips_existing_and_repeated_images(library, root_collection):
+    # Copies of the first image, spread over later batches.
+    for name in ("folder_1/image_20.png", "folder_1/image_30.png"):
+        shutil.copy(os.path.join(library, "folder_0", "image_00.png"), os.path.join(library, name))
+    ImageService.create_wagtail_image(os.path.join(library, "folder_1", "image_11.png"))
+    service = ImageService(folder=library)
+
+    assert service.import_stream(service.iter_images(), batch_size=3, workers=2) == 11
+    hashes = list(get_image_model().objects.values_list("file_hash", flat=True))
+    assert len(hashes) == len(set(hashes)) == 12
+    assert service.import_stream(service.iter_images(), batch_size=3, workers=2) == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_stream_skips_copies_of_images_not_saved_yet(library, root_collection):
+    # The skipped image makes the importer's first batch take an image from the second, which is checked before the first is saved.
+    filenames = [os.path.join(library, "folder_0", f"image_{i:02d}.png") for i in (0, 2, 4, 6, 8)]
+    copy = shutil.copy(filenames[0], os.path.join(library, "folder_1", "copy.png"))
+    ImageService.create_wagtail_image(filenames[2])
+    service = ImageService(folder=library)
+
+    images = [DemoImage(filename) for filename in (filenames[0], filenames[1], filenames[2], copy, filenames[3], filenames[4])]
+    assert service.import_stream(images, batch_size=3, workers=2) == 4
+    assert get_image_model().objects.count() == 5
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_stream_imports_everything_without_skip_existing(library, root_collection):
+    service = ImageService(folder=library)
+    images = list(service.iter_images("people"))
+    assert service.import_stream(images, batch_size=5, workers=2) == 8
+    assert service.import_stream(images, batch_size=5, workers=2, skip_existing=False) == 8
+    assert get_image_model().objects.count() == 16
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+from django.core.files.storage import FileSystemStorage
+
+from demoprovider import transfer
+from demoprovider.transfer import place_file, store_file
+
+
+@pytest.fixture
+def source(tmp_path):
+    filename = str(tmp_path / "source.bin")
+    with open(filename, "wb") as f:
+        f.write(os.urandom(3 * transfer.CHUNK_SIZE + 123))
+    return filename
+
+
+def contents(filename: str) -> bytes:
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+def test_place_file_links(source, tmp_path):
+    path = str(tmp_path / "media" / "linked.bin")
+    assert place_file(source, path, link=True) is False
+    assert os.path.samefile(source, path)
+
+
+def test_place_file_copies_in_the_kernel(source, tmp_path, monkeypatch):
+    if not hasattr(os, "copy_file_range"):
+        pytest.skip("copy_file_range isn't available")
+    calls = []
+    copy_file_range = os.copy_file_range
+    monkeypatch.setattr(os, "copy_file_range", lambda *args: calls.append(args) or copy_file_range(*args))
+
+    path = str(tmp_path / "media" / "copied.bin")
+    assert place_file(source, path) is True
+    assert calls
+    assert not os.path.samefile(source, path)
+    assert contents(path) == contents(source)
+
+
+@pytest.mark.parametrize("supported", [0, 1])
+def test_place_file_falls_back_to_copying_chunks(source, tmp_path, monkeypatch, supported):
+    # The kernel copy fails right away, or after copying a chunk, and the copy continues where it stopped.
+    copied = []
+
+    def failing_copy(*args):
+        if len(copied) >= supported:
+            raise OSError("not supported")
+        copied.append(transfer.CHUNK_SIZE)
+        os.lseek(args[0], 0, os.SEEK_SET)
+        return os.write(args[1], os.read(args[0], transfer.CHUNK_SIZE))
+
+    monkeypatch.setattr(os, "copy_file_range", failing_copy, raising=False)
+    monkeypatch.setattr(os, "sendfile", failing_copy, raising=False)
+    path = str(tmp_path / "media" / "chunked.bin")
+    assert place_file(source, path) is True
+    assert contents(path) == contents(source)
+
+
+def test_place_file_refuses_existing_files(source, tmp_path):
+    path = str(tmp_path / "media" / "taken.bin")
+    place_file(source, path)
+    for link in (False, True):
+        with pytest.raises(FileExistsError):
+            place_file(source, path, link=link)
+
+
+@pytest.mark.parametrize("link", [False, True])
+def test_store_file_retries_names_taken_meanwhile(source, tmp_path, monkeypatch, link):
+    storage = FileSystemStorage(location=str(tmp_path / "media"))
+    taken = store_file(storage, source, "images/photo.bin")
+    get_available_name = storage.get_available_name
+    returned = []
+
+    def racing_get_available_name(name, max_length=None):
+        # The first time, another process takes the name between this check and the file being created.
+        returned.append(taken if not returned else get_available_name(name, max_length))
+        return returned[-1]
+
+    monkeypatch.setattr(storage, "get_available_name", racing_get_available_name)
+    name = store_file(storage, source, "images/photo.bin", link=link)
+    assert len(returned) == 2
+    assert name not in (taken, "images/photo.bin")
+    assert contents(storage.path(name)) == contents(source)
+    assert os.path.samefile(storage.path(name), source) == link
@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from demoprovider.image_providers.unsplash import UnsplashImageProvider
+from demoprovider.services import ImageService
+
+
+class Page:
+    """
+    A page of results like pyunsplash returns, fetching the next one from the client.
+    """
+
+    def __init__(self, client, items, per_page, start=0):
+        self.client, self.items, self.per_page, self.start = client, items, per_page, start
+        self.body = items[start : start + per_page]
+        self.has_next = start + per_page < len(items)
+
+    @property
+    def entries(self):
+        return iter(self.body)
+
+    def get_next_page(self):
+        return self.client.request(Page, self.client, self.items, self.per_page, self.start + self.per_page)
+
+
+class Photo:
+    def __init__(self, collection_id, i):
+        self.id = f"{collection_id}-{i}"
+        self.url = f"https://unsplash.com/photos/{self.id}"
+        self.link_download = f"https://unsplash.com/photos/{self.id}/download"
+        self.body = {"slug": f"photo-{self.id}", "user": {"username": "someone"}}
+
+    def get_attribution(self):
+        return "Photo by someone on Unsplash"
+
+
+class Collection:
+    def __init__(self, client, i, size):
+        self.client, self.id, self.title = client, i, f"Collection {i}"
+        self.body = {"total_photos": size}
+        self.all_photos = [Photo(i, j) for j in range(size)]
+
+    def photos(self, per_page):
+        self.client.listed.append(self.id)
+        return self.client.request(Page, self.client, self.all_photos, per_page)
+
+
+class Client:
+    """
+    Stands in for PyUnsplash, counting the requests made outside the rate limiter.
+    """
+
+    def __init__(self, collections=10, size=10):
+        self.all_collections = [Collection(self, i, size) for i in range(collections)]
+        self.requests, self.unlimited, self.listed = 0, 0, []
+        self.allowed = threading.local()
+
+    def request(self, page, *args):
+        self.requests += 1
+        if not getattr(self.allowed, "value", False):
+            self.unlimited += 1
+        self.allowed.value = False
+        return page(*args)
+
+    def collections(self, per_page):
+        return self.request(Page, self, self.all_collections, per_page)
+
+
+@pytest.fixture
+def provider(tmp_path):
+    provider = UnsplashImageProvider(api_key="key", target_folder=str(tmp_path), verbose=False, service=ImageService(folder=str(tmp_path)))
+    provider.api = Client()
+    provider.downloaded = []
+    provider.downloader.download_all = lambda jobs: provider.downloaded.extend(jobs)
+    provider.limiter.interval = 0.001
+    wait = provider.limiter.wait
+
+    def allow():
+        wait()
+        provider.api.allowed.value = True
+
+    provider.limiter.wait = allow
+    yield provider
+    provider.close()
+
+
+def test_collections_only_lists_the_collections_needed(provider):
+    assert provider.collections(per_page=5, max_items=15, workers=8) == 15
+    assert len(provider.downloaded) == 15
+    assert sorted(provider.api.listed) == [0, 1]
+
+
+def test_collections_list_more_when_photos_are_skipped(provider):
+    for photo in provider.api.all_collections[0].all_photos[:4]:
+        provider.journal.finish(photo.id)
+
+    assert provider.collections(per_page=5, max_items=15, workers=8) == 15
+    assert sorted(provider.api.listed) == [0, 1, 2]
+
+
+def test_collections_without_a_limit_list_every_collection(provider):
+    assert provider.collections(per_page=3, workers=4) == 100
+    assert sorted(provider.api.listed) == list(range(10))
+
+
+def test_every_request_is_rate_limited(provider):
+    provider.collections(per_page=3, max_items=25, workers=4)
+    assert provider.api.requests > 10
+    assert provider.api.unlimited == 0
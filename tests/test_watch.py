@@ -0,0 +1,179 @@
+import os
+import shutil
+import threading
+
+import pytest
+from wagtail.images import get_image_model
+
+from demoprovider.catalog import ImageCatalog
+from demoprovider.services import ImageService
+from demoprovider.watcher import FolderWatcher
+
+from .conftest import make_image
+
+
+def touch(filename: str, delta: float = 10) -> None:
+    stat = os.stat(filename)
+    os.utime(filename, (stat.st_atime + delta, stat.st_mtime + delta))
+
+
+def image_of(folder: str, filename: str):
+    with ImageCatalog.for_folder(folder) as catalog:
+        image_id = catalog.imported([filename]).get(filename, (None,))[0]
+    return image_id and get_image_model().objects.filter(pk=image_id).first()
+
+
+def import_folder(folder: str) -> tuple[ImageService, FolderWatcher]:
+    service = ImageService(folder=folder)
+    watcher = FolderWatcher(folder, include=lambda filename: service.is_local_folder_file(folder, filename))
+    watcher.start()
+    service.add_local_folder(folder)
+    return service, watcher
+
+
+def test_poll_reports_added_modified_and_removed_files(library):
+    watcher = FolderWatcher(library)
+    watcher.start()
+    assert not watcher.poll()
+
+    added = make_image(os.path.join(library, "folder_0", "new.png"), seed=100)
+    modified = os.path.join(library, "folder_1", "image_01.png")
+    touch(modified)
+    metadata_changed = os.path.join(library, "folder_0", "image_02.png")
+    touch(metadata_changed + ".json")
+    removed = os.path.join(library, "folder_1", "image_03.png")
+    os.remove(removed)
+
+    changes = watcher.poll()
+    assert changes.added == [added]
+    assert sorted(changes.modified) == sorted([modified, metadata_changed])
+    assert changes.removed == [removed]
+    assert not watcher.poll()
+
+
+@pytest.mark.django_db
+def test_removed_file_deletes_only_its_own_image(library, tmp_path):
+    # An image with the same contents as a file in the folder, added by something else, such as a provider.
+    provider_file = str(tmp_path / "provider.png")
+    shutil.copy(os.path.join(library, "folder_1", "image_05.png"), provider_file)
+    provider_image = ImageService.create_wagtail_image(provider_file)
+
+    service, watcher = import_folder(library)
+    Image = get_image_model()
+    assert Image.objects.count() == 12
+    removed = image_of(library, os.path.join(library, "folder_0", "image_00.png"))
+
+    os.remove(os.path.join(library, "folder_0", "image_00.png"))
+    os.remove(os.path.join(library, "folder_1", "image_05.png"))
+    service.sync_local_changes(library, watcher.poll())
+    assert Image.objects.count() == 11
+    assert not Image.objects.filter(pk=removed.pk).exists()
+    assert Image.objects.filter(pk=provider_image.pk).exists()
+
+
+@pytest.mark.django_db
+def test_replaced_file_updates_its_own_image(library):
+    service, watcher = import_folder(library)
+    filename = os.path.join(library, "folder_0", "image_02.png")
+    image = image_of(library, filename)
+
+    make_image(filename, seed=100)
+    touch(filename)
+    service.sync_local_changes(library, watcher.poll())
+    image.refresh_from_db()
+    assert image_of(library, filename) == image
+    with ImageCatalog.for_folder(library) as catalog:
+        assert image.file_hash == catalog.cached([filename])[filename]["sha1"]
+    assert get_image_model().objects.count() == 12
+
+
+@pytest.mark.django_db
+def test_duplicate_file_keeps_the_image(library):
+    original = os.path.join(library, "folder_0", "image_00.png")
+    duplicate = os.path.join(library, "folder_1", "copy.png")
+    shutil.copy(original, duplicate)
+    service, watcher = import_folder(library)
+    Image = get_image_model()
+    image = image_of(library, original)
+    assert image_of(library, duplicate) is None
+    old_hash = image.file_hash
+
+    # Replacing the original leaves the image to the duplicate, which still has its contents.
+    make_image(original, seed=100)
+    touch(original)
+    service.sync_local_changes(library, watcher.poll())
+    assert image_of(library, duplicate) == image
+    assert Image.objects.get(pk=image.pk).file_hash == old_hash
+    assert image_of(library, original) not in (None, image)
+    assert Image.objects.count() == 13
+
+    # Once the duplicate goes as well, the image has no file left.
+    os.remove(duplicate)
+    service.sync_local_changes(library, watcher.poll())
+    assert not Image.objects.filter(pk=image.pk).exists()
+    assert Image.objects.count() == 12
+
+
+@pytest.mark.django_db
+def test_moved_file_changes_collection(library):
+    service, watcher = import_folder(library)
+    source = os.path.join(library, "folder_0", "image_00.png")
+    image = image_of(library, source)
+    destination = os.path.join(library, "folder_1", "image_00.png")
+    os.rename(source, destination)
+    os.rename(source + ".json", destination + ".json")
+
+    service.sync_local_changes(library, watcher.poll())
+    assert image_of(library, destination) == image
+    assert get_image_model().objects.get(pk=image.pk).collection.name == "folder_1"
+    assert get_image_model().objects.count() == 12
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bulk_import_records_images(library, root_collection):
+    ImageService(folder=library).add_local_folder(library, workers=2, batch_size=5)
+    with ImageCatalog.for_folder(library) as catalog:
+        imported = catalog.imported()
+    assert len(imported) == 12
+    assert {image_id for image_id, _ in imported.values()} == set(get_image_model().objects.values_list("pk", flat=True))
+
+
+@pytest.mark.django_db
+def test_watch_local_folder_syncs_changes_since_the_last_import(library):
+    ImageService(folder=library).add_local_folder(library)
+    removed = image_of(library, os.path.join(library, "folder_0", "image_00.png"))
+    os.remove(os.path.join(library, "folder_0", "image_00.png"))
+    modified = os.path.join(library, "folder_1", "image_01.png")
+    image = image_of(library, modified)
+    make_image(modified, seed=100)
+    touch(modified)
+
+    stop = threading.Event()
+    stop.set()
+    ImageService(folder=library).watch_local_folder(library, stop=stop)
+    Image = get_image_model()
+    assert not Image.objects.filter(pk=removed.pk).exists()
+    assert image_of(library, modified) == image
+    assert Image.objects.get(pk=image.pk).file_hash != image.file_hash
+    assert Image.objects.count() == 11
+
+
+def test_watch_picks_up_changes_since_the_scan(library):
+    service = ImageService(folder=library, scan_on_creation=True)
+    added = make_image(os.path.join(library, "folder_0", "new.png"), ["nature"], seed=100)
+    modified = os.path.join(library, "folder_1", "image_01.png")
+    make_image(modified, ["city"], seed=101)
+    touch(modified)
+    removed = os.path.join(library, "folder_1", "image_03.png")
+    os.remove(removed)
+
+    stop = threading.Event()
+    watch = service.watch(stop=stop)
+    changes = next(watch)
+    stop.set()
+    watch.close()
+    assert changes.added == [added]
+    assert changes.modified == [modified]
+    assert changes.removed == [removed]
+    assert service.count() == 12
+    assert modified in {image.filename for image in service.get_images_by_keywords("city")}
@@ -1,13 +1,13 @@
 from django.utils.lorem_ipsum import words
 from wagtail.models import Page
 
-from demoprovider.services import ImageService
+from demoprovider.services import get_image_service
 from home.models import HomePage
 
-srv = ImageService(init=True)
-
 
 def run(*args, **kwargs):
+    srv = get_image_service()
+
     home_page = HomePage(
         title=words(count=5),
         cover_image=srv.create_wagtail_image(srv.get_random_image().filename),